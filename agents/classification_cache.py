@@ -0,0 +1,88 @@
+# classification_cache.py
+# Persistent Agent 1 Classification Cache
+# Purpose:
+# Stores Agent 1 results in SQLite, keyed on a hash of:
+# - the normalized feedback text
+# - the model name
+# - the prompt version
+# so repeated feedback ("App crashes on upload") skips the LLM entirely.
+# The normalized text is kept next to each result, so the cache doubles as
+# training data for the local pre-classifier (agents/preclassifier.py).
+
+import hashlib
+import json
+import os
+import re
+
+from agents.sqlite_cache import SQLiteCache
+
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "agent1_classifications.sqlite")
+
+# Results that describe a failed call, not the feedback itself
+UNCACHEABLE_PROBLEMS = {"API Failure", "Parsing Error"}
+
+
+def normalize_feedback(feedback_text):
+    """
+    Lowercases, trims and collapses whitespace so trivially different
+    copies of the same feedback share one cache entry.
+    """
+    return re.sub(r"\s+", " ", str(feedback_text)).strip().lower()
+
+
+class ClassificationCache(SQLiteCache):
+    """
+    SQLite-backed cache of Agent 1 results (see agents/sqlite_cache.py for
+    expiry and LRU eviction).
+    """
+
+    table = "classifications"
+    columns = "result TEXT NOT NULL, feedback TEXT"
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=200_000, max_age_seconds=30 * 24 * 3600):
+        super().__init__(path, max_entries, max_age_seconds)
+
+    def _migrate(self):
+        # Caches created before the feedback column existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(classifications)")}
+        if "feedback" not in columns:
+            self._conn.execute("ALTER TABLE classifications ADD COLUMN feedback TEXT")
+
+    @staticmethod
+    def make_key(feedback_text, model, prompt_version):
+        payload = "\0".join([normalize_feedback(feedback_text), model, str(prompt_version)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, feedback_text, model, prompt_version):
+        """
+        Returns the cached result dict, or None on a miss.
+        """
+        row = self._lookup(self.make_key(feedback_text, model, prompt_version), "result")
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, feedback_text, model, prompt_version, result):
+        """
+        Stores a result (dict or FeedbackRecord). Failure records are never cached.
+        """
+        if result.get("problem") in UNCACHEABLE_PROBLEMS:
+            return
+
+        self._store(
+            self.make_key(feedback_text, model, prompt_version),
+            {"result": json.dumps(dict(result)), "feedback": normalize_feedback(feedback_text)}
+        )
+
+    def training_examples(self, limit=None):
+        """
+        Returns (normalized feedback, result) pairs for every entry that
+        recorded its feedback text, most recently used first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT feedback, result FROM classifications WHERE feedback IS NOT NULL "
+                "ORDER BY last_used DESC LIMIT ?",
+                (-1 if limit is None else limit,)
+            ).fetchall()
+
+        return [(feedback, json.loads(result)) for feedback, result in rows]
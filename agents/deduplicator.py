@@ -0,0 +1,167 @@
+# deduplicator.py
+# Near-Duplicate Collapsing (runs ahead of Agent 1)
+# Purpose:
+# Groups feedback lines that differ only by case, punctuation or small
+# wording changes so one representative per group is sent to the LLM:
+# - Normalizes text
+# - Builds character 3-gram MinHash signatures (vectorized with NumPy)
+# - Finds candidate pairs with LSH banding
+# - Confirms each candidate against its group representative with
+#   exact shingle Jaccard similarity
+
+import re
+import zlib
+
+import numpy as np
+
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 8
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.85
+
+# Upper bound on representatives compared against a single line
+MAX_CANDIDATES = 32
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 2 ** 31, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 2 ** 31, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_for_dedup(text):
+    """
+    Lowercases, drops punctuation and collapses whitespace.
+    """
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _shingles(text):
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _minhash(shingles):
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def group_near_duplicates(texts, threshold=DEFAULT_THRESHOLD):
+    """
+    Groups near-identical feedback lines.
+
+    Each line is compared only against existing group representatives that
+    share an LSH band with it, so the cost grows with the number of groups
+    rather than with the number of pairs.
+
+    Parameters:
+        texts (list[str]): Raw feedback lines.
+        threshold (float): Minimum character 3-gram Jaccard similarity
+            between a line and its group representative.
+
+    Returns:
+        list[int]: For each line, the index of its group representative
+                   (the first line of the group in input order).
+    """
+    # Exact matches after normalization collapse without any hashing.
+    # Lines with nothing left after normalization ("", "???") only match
+    # their own exact text.
+    first_seen = {}
+    group_of = []
+    normalized_texts = {}
+
+    for index, text in enumerate(texts):
+        normalized = normalize_for_dedup(text)
+        key = normalized if normalized else ("\0" + str(text).strip().lower())
+        rep = first_seen.setdefault(key, index)
+        group_of.append(rep)
+        if rep == index and normalized:
+            normalized_texts[index] = normalized
+
+    shingle_sets = {}
+    near_rep = {}
+    buckets = {}
+
+    for index, normalized in normalized_texts.items():
+        shingles = _shingles(normalized)
+        signature = _minhash(shingles)
+        band_keys = [
+            (band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes())
+            for band in range(LSH_BANDS)
+        ]
+
+        candidates = {}
+        for key in band_keys:
+            for rep in buckets.get(key, ()):
+                candidates[rep] = None
+
+        match = None
+        for rep in list(candidates)[:MAX_CANDIDATES]:
+            other = shingle_sets[rep]
+            if len(shingles & other) / len(shingles | other) >= threshold:
+                match = rep
+                break
+
+        if match is None:
+            shingle_sets[index] = shingles
+            for key in band_keys:
+                buckets.setdefault(key, []).append(index)
+            near_rep[index] = index
+        else:
+            near_rep[index] = match
+
+    return [near_rep.get(rep, rep) for rep in group_of]
+
+
+def collapse_near_duplicates(texts, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns the representatives to analyze and how to expand their results.
+
+    Returns:
+        tuple:
+            - list[str]: one representative line per group, in input order
+            - list[int]: for each input line, its position in the representatives list
+            - list[int]: multiplicity (group size) of each representative
+    """
+    group_of = group_near_duplicates(texts, threshold)
+
+    position_of_rep = {}
+    representatives = []
+    multiplicities = []
+    positions = []
+
+    for index, rep in enumerate(group_of):
+        if rep not in position_of_rep:
+            position_of_rep[rep] = len(representatives)
+            representatives.append(texts[rep])
+            multiplicities.append(0)
+        positions.append(position_of_rep[rep])
+        multiplicities[position_of_rep[rep]] += 1
+
+    return representatives, positions, multiplicities
+
+
+if __name__ == "__main__":
+
+    sample_feedback = [
+        "Upload fails for large PDF files.",
+        "upload fails for large pdf file",
+        "Upload fails for large PDF files!!",
+        "Dashboard takes too long to load.",
+        "Dashboard takes too long to load",
+        "Please add dark mode.",
+        "",
+        "???"
+    ]
+
+    representatives, positions, multiplicities = collapse_near_duplicates(sample_feedback)
+
+    for text, count in zip(representatives, multiplicities):
+        print(f"{count} x {text!r}")
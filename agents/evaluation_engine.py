@@ -2,19 +2,24 @@
 # Deterministic System Evaluation Layer
 
 
-def evaluate_system(agent2_output):
+def evaluate_system(agent2_output, trend_flags=None):
     """
     Takes Agent 2 structured output and produces
     a human-readable system health summary.
+
+    trend_flags: optional spike descriptions from a TrendStore
+    (agents/trend_store.py), listed under "Trend Alerts".
     """
 
     category_distribution = agent2_output.get("category_distribution", {})
     priority_distribution = agent2_output.get("priority_distribution", {})
     high_priority_count = agent2_output.get("high_priority_count", 0)
+    failed_count = agent2_output.get("failed_count", 0)
     themes = agent2_output.get("detected_themes", [])
 
     total_themes = len(themes)
-    total_problems = sum(len(theme.get("related_problems", [])) for theme in themes)
+    # Clustered themes list a capped sample of problems but count all of them
+    total_problems = sum(theme.get("problem_count", len(theme.get("related_problems", []))) for theme in themes)
 
     # ---- Risk Level Assessment ----
     if high_priority_count >= 8:
@@ -63,6 +68,15 @@ Interpretation:
 - Signal strength reflects severity based on bug dominance and priority load.
 """
 
+    if failed_count:
+        summary += (
+            f"\nFailed Lines: {failed_count} (model unavailable or unparseable; "
+            "excluded from the counts above and queued for retry)\n"
+        )
+
+    if trend_flags:
+        summary += "\nTrend Alerts:\n" + "".join(f"- {flag}\n" for flag in trend_flags)
+
     return summary
 
 
@@ -80,6 +94,9 @@ if __name__ == "__main__":
         ]
     }
 
-    result = evaluate_system(sample_agent2_output)
+    result = evaluate_system(
+        sample_agent2_output,
+        trend_flags=["Upload Issues up 4.0× vs 7-day baseline (12 vs 3.0 per day)"]
+    )
 
     print(result)
\ No newline at end of file
@@ -0,0 +1,268 @@
+# fake_llm.py
+# Deterministic Stand-in for the Local LLM
+# Purpose:
+# Lets the pipeline and its benchmarks run without a live Ollama model:
+# - Answers every prompt the agents send (Agent 1 single and batched,
+#   theme grouping, cluster naming, insight memo, sentiment) with
+#   well-formed output in the format that prompt asks for
+# - Classifies feedback with keyword rules, so answers are reproducible
+# - Simulates per-call latency, jitter, malformed answers and failed requests
+# - Optionally simulates prompt prefill time with an Ollama-style prefix cache
+# - Reports prompt/completion token estimates the way Ollama does, so
+#   instrumentation works unchanged
+# It implements the backend interface of agents/llm_backend.py.
+#
+# Usage:
+#   with installed(FakeLLM(latency=0.05, malformed_rate=0.1)):
+#       run_pipeline(feedback_list)
+
+import ast
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import ollama
+
+from agents.llm_backend import using_backend
+
+
+# Keyword rules: (words, problem?, sentiment, category, priority)
+CLASSIFICATION_RULES = [
+    (("crash", "crashes", "freeze", "freezes", "broken", "error", "fails", "failed"),
+     True, "Negative", "Bug", "High"),
+    (("slow", "lag", "laggy", "loading", "timeout", "takes forever"),
+     True, "Negative", "Performance", "Medium"),
+    (("confusing", "hard to find", "cluttered", "unclear", "can't find"),
+     True, "Negative", "UX Issue", "Medium"),
+    (("please add", "would love", "wish", "feature", "support for"),
+     False, "Neutral", "Feature Request", "Low"),
+    (("love", "great", "awesome", "nice", "smooth", "easy"),
+     False, "Positive", "Other", "Low"),
+]
+
+MEMO_TEMPLATE = """Executive Summary:
+Feedback volume is dominated by {top_theme}. High priority issues need attention.
+
+Key Risk Areas:
+- {top_theme}
+
+Dominant Themes:
+- {top_theme}
+
+Recommended Actions:
+- Investigate and fix {top_theme} first."""
+
+
+def classify(feedback_text):
+    """
+    Keyword-rule Agent 1 result for one feedback line.
+    """
+    lowered = feedback_text.lower()
+    for words, has_problem, sentiment, category, priority in CLASSIFICATION_RULES:
+        if any(word in lowered for word in words):
+            problem = feedback_text.strip().rstrip(".!?")[:80] if has_problem else "None"
+            return {"problem": problem, "sentiment": sentiment, "category": category, "priority": priority}
+    return {"problem": "None", "sentiment": "Neutral", "category": "Other", "priority": "Low"}
+
+
+class FakeLLM:
+    """
+    Drop-in LLM backend that never leaves the process.
+
+    Parameters:
+        latency (float): Seconds each call sleeps before answering.
+        jitter (float): Extra uniform random latency in [0, jitter) seconds.
+        malformed_rate (float): Share of answers returned as broken JSON
+            (batched answers drop items instead).
+        error_rate (float): Share of calls that raise ConnectionError.
+        seed (int): Seed for the jitter/malformed/error draws.
+        prefill_per_token (float): Extra seconds per prompt token that is
+            not served from the simulated prefix cache. Like Ollama, the
+            fake keeps the last prompt of each of `cache_slots` slots and
+            only re-reads what follows the longest shared prefix; a request
+            with keep_alive=0 unloads the model and empties the cache.
+        keep_alive (str | float, optional): Sent with every request unless
+            the call sets its own, like OllamaBackend's keep_alive.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, malformed_rate=0.0, error_rate=0.0, seed=0,
+                 prefill_per_token=0.0, cache_slots=4, keep_alive=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.malformed_rate = malformed_rate
+        self.error_rate = error_rate
+        self.prefill_per_token = prefill_per_token
+        self.keep_alive = keep_alive
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self._slots = [""] * cache_slots
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random(), self._random.random(), self._random.random()
+
+    def _prefill_seconds(self, messages, keep_alive):
+        """
+        Simulated prompt processing time, reusing the longest cached prefix.
+        """
+        prompt = "\n".join(message["content"] for message in messages)
+
+        with self._lock:
+            shared = [len(os.path.commonprefix([prompt, cached])) for cached in self._slots]
+            slot = max(range(len(shared)), key=shared.__getitem__) if shared else None
+            reused = shared[slot] if shared else 0
+
+            if slot is not None:
+                # The best-matching slot is reused; with no shared prefix the oldest slot is
+                if not reused:
+                    slot = 0
+                self._slots.pop(slot)
+                self._slots.append(prompt)
+            if keep_alive in (0, "0", "0s", "0m"):
+                self._slots = [""] * len(self._slots)
+
+            self.prompt_tokens += len(prompt) // 4
+            self.cached_prompt_tokens += reused // 4
+
+        return (len(prompt) - reused) // 4 * self.prefill_per_token
+
+    def chat(self, model=None, messages=None, stream=False, **kwargs):
+        jitter_draw, malformed_draw, error_draw = self._draw()
+
+        delay = self.latency + self.jitter * jitter_draw
+        if self.prefill_per_token:
+            delay += self._prefill_seconds(messages or [], kwargs.get("keep_alive", self.keep_alive))
+        if delay:
+            time.sleep(delay)
+
+        if error_draw < self.error_rate:
+            raise ConnectionError("fake LLM request failed")
+
+        # A retry conversation is answered from its original prompt
+        prompt_messages = []
+        for message in messages or []:
+            if message["role"] == "assistant":
+                break
+            prompt_messages.append(message["content"])
+        prompt = "\n".join(prompt_messages)
+        content = self._answer(prompt, malformed_draw < self.malformed_rate)
+
+        if stream:
+            chunks = [{"message": {"content": word}, "done": False} for word in re.split(r"(?<= )", content)]
+            chunks.append({
+                "message": {"content": ""},
+                "done": True,
+                "prompt_eval_count": len(prompt) // 4,
+                "eval_count": len(content) // 4
+            })
+            return iter(chunks)
+
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": content},
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": len(content) // 4,
+            "total_duration": int(delay * 1e9)
+        }
+
+    def embed(self, model=None, input=None, **kwargs):
+        # No embedding model (answered like Ollama's "model not found"),
+        # so theme clustering uses its hashed fallback
+        raise ollama.ResponseError("fake LLM has no embedding model", 404)
+
+    def with_timeout(self, timeout):
+        return self
+
+    def _answer(self, prompt, malformed):
+        if "Feedback items:" in prompt:
+            return self._answer_batch(prompt.split("Feedback items:")[-1], malformed)
+
+        if malformed:
+            return '{"problem": "unterminated'
+
+        if "product feedback analyzer" in prompt:
+            return json.dumps(classify(_last_quoted(prompt.split("Feedback:")[-1])))
+
+        if "sentiment analysis tool" in prompt:
+            return json.dumps({"sentiment": classify(_last_quoted(prompt))["sentiment"]})
+
+        if "clustering engine" in prompt:
+            problems = _literal_list(prompt.split("Problems:")[-1])
+            return json.dumps({"themes": _group_by_keyword(problems)})
+
+        if "Name the product issue theme" in prompt:
+            problems = json.loads(prompt.split("Problems:")[-1].strip() or "[]")
+            return json.dumps({"theme": _keyword_theme(problems[0] if problems else "")})
+
+        if "Summarize each product issue theme" in prompt:
+            items = [json.loads(line) for line in prompt.split("Themes:")[-1].strip().splitlines()]
+            return json.dumps({"digests": [
+                {"theme": item["theme"], "digest": f"Users report problems such as {item['problems'][0]!r}." if item["problems"] else "No problems listed."}
+                for item in items
+            ]})
+
+        if "Product Strategy Analyst" in prompt:
+            match = re.search(r"'theme': '([^']+)'", prompt)
+            return MEMO_TEMPLATE.format(top_theme=match.group(1) if match else "General Issues")
+
+        return "{}"
+
+    def _answer_batch(self, numbered_items, malformed):
+        answers = []
+        for line in numbered_items.strip().splitlines():
+            index, _, text = line.partition("] ")
+            # Malformed batch answers leave items out, like a truncated reply
+            if malformed and len(answers) % 3 == 2:
+                continue
+            answers.append({"index": int(index.strip("[")), **classify(json.loads(text))})
+        return json.dumps(answers)
+
+
+def _last_quoted(text):
+    text = text.strip()
+    return text[1:-1] if text.startswith('"') and text.endswith('"') else text
+
+
+def _literal_list(text):
+    # Problems are interpolated into the prompt as a Python list repr
+    try:
+        return list(ast.literal_eval(text.strip()))
+    except (ValueError, SyntaxError):
+        return []
+
+
+def _keyword_theme(problem):
+    words = [word for word in re.findall(r"[a-z]+", problem.lower()) if len(word) > 3]
+    return f"{words[0].title()} Issues" if words else "General Issues"
+
+
+def _group_by_keyword(problems):
+    groups = {}
+    for problem in problems:
+        groups.setdefault(_keyword_theme(problem), []).append(problem)
+    return [{"theme": theme, "related_problems": members} for theme, members in groups.items()]
+
+
+@contextmanager
+def installed(fake):
+    """
+    Routes every agent's LLM calls to `fake` inside the block.
+    """
+    with using_backend(fake):
+        yield fake
+
+
+if __name__ == "__main__":
+    fake = FakeLLM()
+    with installed(fake):
+        from agents.feedback_analyzer import analyze_feedback
+        print(analyze_feedback("The app crashes every time I upload a file."))
+        print(analyze_feedback("Please add dark mode."))
@@ -9,30 +9,51 @@
 #- Priority assignment
 #This file acts as the orchestration layer between:
 #- Python control logic
-#- LLM reasoning (via Ollama)
-import ollama
+#- LLM reasoning (via Ollama, see agents/llm_backend.py)
 import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from agents.classification_cache import ClassificationCache, normalize_feedback
+from agents.deduplicator import collapse_near_duplicates
+from agents.feedback_record import API_FAILURE_RECORD, PARSING_ERROR_RECORD, FeedbackRecord, as_record
+from agents.instrumentation import record_event, submit_in_context
+from agents.llm_backend import get_backend, stage_model
+from agents.preclassifier import open_preclassifier
+from agents.retry_queue import retry_failures
+from agents.run_journal import RunJournal, iter_journaled_chunks
+from agents.structured_output import (
+    FEEDBACK_BATCH_SCHEMA,
+    FEEDBACK_SCHEMA,
+    parse_json,
+    retry_messages,
+    schema_chat,
+)
 
-def analyze_feedback(feedback_text):
-    """
-    Analyze user feedback using LLM reasoning.
 
-    Parameters:
-        feedback_text (str): Raw user feedback text.
+# Bump whenever the Agent 1 prompts change so cached classifications are not reused
+PROMPT_VERSION = "3"
 
-    Returns:
-        dict: Structured dictionary containing:
-              - problem
-              - sentiment
-              - category
-              - priority
-    """
-# Construct structured prompt to enforce JSON output
-    prompt = f"""
-You are a strict product feedback analyzer.
+# Feedback lines looked up in the cache per round trip to the analyzer
+CACHE_WINDOW = 256
+
+# Default number of feedback lines the near-duplicate and pre-classifier
+# steps take at a time; their results come back once per window
+DEDUP_WINDOW = 10_000
+
+VALID_SENTIMENTS = {"Positive", "Neutral", "Negative"}
+VALID_CATEGORIES = {"Bug", "Feature Request", "UX Issue", "Performance", "Other"}
+VALID_PRIORITIES = {"High", "Medium", "Low"}
 
-Analyze the feedback and respond ONLY in valid JSON.
+
+# Static Agent 1 instructions, sent as the system message of every single
+# call. Keeping them byte-identical and ahead of the feedback lets Ollama
+# reuse the processed prefix (its KV cache) instead of re-reading the rules
+# on every request.
+AGENT1_SYSTEM_PROMPT = """You are a strict product feedback analyzer.
+
+Analyze the feedback you are given and respond ONLY in valid JSON.
 Do NOT include explanations.
 Do NOT include markdown.
 Do NOT include extra text.
@@ -46,91 +67,112 @@ Rules:
 
 Return JSON in this exact structure:
 
-{{
+{
   "problem": "string",
   "sentiment": "Positive/Neutral/Negative",
   "category": "Bug/Feature Request/UX Issue/Performance/Other",
   "priority": "High/Medium/Low"
-}}
+}"""
+
+# Batched calls extend the single-call prompt, so the two still share its
+# cached prefix while single calls never see the batch instructions
+AGENT1_BATCH_SYSTEM_PROMPT = AGENT1_SYSTEM_PROMPT + """
+
+You are given numbered "Feedback items" instead of a single feedback.
+Apply the rules to each item and return exactly one object per item, using
+the item's number as "index", as a JSON array in this exact structure:
+
+[
+  {
+    "index": 0,
+    "problem": "string",
+    "sentiment": "Positive/Neutral/Negative",
+    "category": "Bug/Feature Request/UX Issue/Performance/Other",
+    "priority": "High/Medium/Low"
+  }
+]"""
+
+
+def agent1_messages(feedback_text):
+    """
+    Chat messages for one feedback line: the shared system prompt and a
+    short user message with only the feedback.
+    """
+    return [
+        {"role": "system", "content": AGENT1_SYSTEM_PROMPT},
+        {"role": "user", "content": f'Feedback:\n"{feedback_text}"'}
+    ]
+
 
-Feedback:
-"{feedback_text}"
-"""
+def agent1_batch_messages(feedback_batch):
+    """
+    Chat messages for a batch: the batch system prompt and the numbered items.
+    """
+    numbered_items = "\n".join(
+        f"[{index}] {json.dumps(text)}" for index, text in enumerate(feedback_batch)
+    )
+    return [
+        {"role": "system", "content": AGENT1_BATCH_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Feedback items:\n{numbered_items}"}
+    ]
+
+
+def analyze_feedback(feedback_text, client=None, usage=None):
+    """
+    Analyze user feedback using LLM reasoning.
+
+    Parameters:
+        feedback_text (str): Raw user feedback text.
+        client (optional): Backend to send the request with (see agents/llm_backend.py).
+            Defaults to the Agent 1 backend.
+        usage (dict, optional): Accumulates call and token counts (see _record_usage).
+
+    Returns:
+        FeedbackRecord: Structured record containing:
+              - problem
+              - sentiment
+              - category
+              - priority
+    """
+    messages = agent1_messages(feedback_text)
 
     try:
-        response = ollama.chat(               # Send prompt to LLM via Ollama
-            model="llama3",
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        # Send prompt to the Agent 1 model, with decoding constrained to the schema
+        response = schema_chat("agent1", FEEDBACK_SCHEMA, messages, client)
+        _record_usage(usage, response, items=1)
+        content = response["message"]["content"]
+        parsed = parse_json("agent1", content)
+
+        parsed = _normalize_result(parsed) if parsed is not None else None
+
+        # One targeted retry when the answer is unusable
+        if parsed is None or not _is_valid_result(parsed):
+            record_event("agent1", "parse_retry")
+            response = schema_chat("agent1", FEEDBACK_SCHEMA, retry_messages(messages, content), client)
+            _record_usage(usage, response, items=0)
+            content = response["message"]["content"]
+            parsed = parse_json("agent1", content)
+            parsed = _normalize_result(parsed) if parsed is not None else None
+
     except Exception as e:
         print("⚠️ API call failed:", e)
-        return {
-            "problem": "API Failure",
-            "sentiment": "Unknown",
-            "category": "Other",
-            "priority": "Low"
-        }
+        record_event("agent1", "api_fallback")
+        return API_FAILURE_RECORD
 
-    content = response["message"]["content"]
+    if parsed is None or not _is_valid_result(parsed):
+        print("⚠️ JSON parsing failed.")
+        record_event("agent1", "parse_fallback")
+        print("Raw model output:")
+        print(content)
+        return PARSING_ERROR_RECORD
 
-    # -------------------------
-    # Robust JSON Extraction
-    # -------------------------
+    return FeedbackRecord.from_dict(parsed)
 
-    content = content.strip()
 
-    # Attempt 1: Direct parse (best case)
-    try:
-        parsed = json.loads(content)
-    except Exception:
-        # Attempt 2: Extract JSON between first { and last }
-        start = content.find("{")
-        end = content.rfind("}")
-
-        if start != -1 and end != -1:
-            json_string = content[start:end + 1]
-        else:
-            json_string = content
-
-        # Clean common model formatting issues
-        json_string = json_string.replace("\n", " ")
-        json_string = json_string.replace(", }", " }")
-        json_string = json_string.replace(",}", "}")
-        json_string = json_string.replace(": None", ': "None"')
-        json_string = json_string.replace(": Positive", ': "Positive"')
-        json_string = json_string.replace(": Neutral", ': "Neutral"')
-        json_string = json_string.replace(": Negative", ': "Negative"')
-        json_string = json_string.replace(": High", ': "High"')
-        json_string = json_string.replace(": Medium", ': "Medium"')
-        json_string = json_string.replace(": Low", ': "Low"')
-        json_string = json_string.replace(": Bug", ': "Bug"')
-        json_string = json_string.replace(": Feature Request", ': "Feature Request"')
-        json_string = json_string.replace(": UX Issue", ': "UX Issue"')
-        json_string = json_string.replace(": Performance", ': "Performance"')
-        json_string = json_string.replace(": Other", ': "Other"')
-
-        # Ensure closing brace exists
-        if not json_string.strip().endswith("}"):
-            json_string = json_string.strip() + "}"
-
-        try:
-            parsed = json.loads(json_string)
-        except Exception:
-            print("⚠️ JSON parsing failed.")
-            print("Raw model output:")
-            print(content)
-            return {
-                "problem": "Parsing Error",
-                "sentiment": "Unknown",
-                "category": "Other",
-                "priority": "Low"
-            }
-
-    # -------------------------
-    # Post-Processing Cleanup
-    # -------------------------
+def _normalize_result(parsed):
+    """
+    Post-processing cleanup shared by the single and batched analyzers.
+    """
 
     # Normalize invalid categorical values
     if parsed.get("category") == "None":
@@ -154,6 +196,435 @@ Feedback:
     return parsed
 
 
+def _record_usage(usage, response, items):
+    """
+    Adds call, item and token counts from an Ollama response to `usage`.
+    """
+    if usage is None:
+        return
+
+    usage["calls"] = usage.get("calls", 0) + 1
+    usage["items"] = usage.get("items", 0) + items
+    usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (response.get("prompt_eval_count") or 0)
+    usage["completion_tokens"] = usage.get("completion_tokens", 0) + (response.get("eval_count") or 0)
+
+
+def _is_valid_result(item):
+    """
+    True when a batched item has every field with an allowed value.
+    """
+    if not isinstance(item, dict):
+        return False
+
+    problem = item.get("problem")
+    if not isinstance(problem, str) or not problem.strip():
+        return False
+
+    return (
+        item.get("sentiment") in VALID_SENTIMENTS
+        and item.get("category") in VALID_CATEGORIES
+        and item.get("priority") in VALID_PRIORITIES
+    )
+
+
+def analyze_feedback_batch(feedback_batch, client=None, usage=None):
+    """
+    Analyze several feedback lines with a single LLM call.
+
+    The rules and JSON schema are sent once for the whole batch and the
+    model answers with a JSON array keyed by item index. Items that are
+    missing or malformed in the answer are re-run one at a time through
+    analyze_feedback.
+
+    Parameters:
+        feedback_batch (list[str]): Raw feedback lines.
+        client (optional): Backend to send the request with. Defaults to the Agent 1 backend.
+        usage (dict, optional): Accumulates call and token counts.
+
+    Returns:
+        list[FeedbackRecord]: Agent 1 results in the same order as feedback_batch.
+    """
+    if not feedback_batch:
+        return []
+
+    if len(feedback_batch) == 1:
+        return [analyze_feedback(feedback_batch[0], client, usage)]
+
+    messages = agent1_batch_messages(feedback_batch)
+
+    results = [None] * len(feedback_batch)
+
+    try:
+        response = schema_chat("agent1_batch", FEEDBACK_BATCH_SCHEMA, messages, client)
+        _record_usage(usage, response, items=len(feedback_batch))
+        # A truncated array still yields its complete items
+        parsed = parse_json("agent1_batch", response["message"]["content"], list) or []
+    except Exception as e:
+        print("⚠️ Batched API call failed:", e)
+        parsed = []
+
+    for item in parsed:
+        if not isinstance(item, dict):
+            continue
+
+        index = item.pop("index", None)
+        if not isinstance(index, int) or not 0 <= index < len(results):
+            continue
+
+        item = _normalize_result(item)
+        if _is_valid_result(item):
+            results[index] = FeedbackRecord.from_dict(item)
+
+    # Re-run only the items the batched answer did not cover
+    missing = results.count(None)
+    if missing:
+        record_event("agent1_batch", "item_retry", missing)
+
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = analyze_feedback(feedback_batch[index], client, usage)
+
+    return results
+
+
+def _chunks(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_analyze_feedback(feedback_iterable, max_workers=1, item_timeout=None, max_in_flight=None,
+                          batch_size=1, cache=None, dedup=False, preclassifier=None, window=DEDUP_WINDOW):
+    """
+    Run Agent 1 over feedback lines, optionally with a bounded worker pool.
+
+    With max_workers=1 this is the plain sequential loop. Otherwise requests
+    are fanned out to a thread pool and results are still yielded in input
+    order. At most `max_in_flight` items are submitted but not yet consumed,
+    so a slow model server pushes back on the reader instead of the whole
+    input being queued in memory.
+
+    Parameters:
+        feedback_iterable (iterable[str]): Raw feedback lines (may be a generator).
+        max_workers (int): Number of concurrent Ollama requests, up to the
+            backend's max_in_flight (default 4, see agents/llm_backend.py).
+        item_timeout (float, optional): Per-request timeout in seconds.
+            Requests with a timeout are not retried, so a timed out item is
+            recorded as an "API Failure" result after one timeout.
+        max_in_flight (int, optional): Back-pressure limit in batches. Defaults to 2 * max_workers.
+        batch_size (int): Feedback lines packed into one prompt (see analyze_feedback_batch).
+        cache (ClassificationCache, optional): Persistent cache consulted before the LLM.
+        dedup (bool): Collapse near-duplicate lines and analyze one representative per group.
+        preclassifier (PreClassifier, optional): Local tier that answers trivial
+            lines without the LLM (see agents/preclassifier.py).
+        window (int): Lines grouped by the dedup and preclassifier steps at a
+            time. Near-duplicates are only collapsed within a window; results
+            are still yielded as soon as their line's answer is in.
+
+    Yields:
+        FeedbackRecord: Agent 1 result for each feedback line, in order.
+    """
+    if preclassifier is not None:
+        yield from _iter_with_preclassifier(
+            feedback_iterable, preclassifier, cache, dedup, max_workers, item_timeout, max_in_flight, batch_size,
+            window
+        )
+        return
+
+    if dedup:
+        yield from _iter_with_dedup(
+            feedback_iterable, cache, max_workers, item_timeout, max_in_flight, batch_size, window
+        )
+        return
+
+    if cache is not None:
+        yield from _iter_with_cache(feedback_iterable, cache, max_workers, item_timeout, max_in_flight, batch_size)
+        return
+
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    client = get_backend("agent1").with_timeout(item_timeout) if item_timeout is not None else None
+
+    if max_workers == 1:
+        for batch in _chunks(feedback_iterable, batch_size):
+            yield from analyze_feedback_batch(batch, client)
+        return
+
+    _warn_if_capped(max_workers)
+    max_in_flight = max_in_flight or 2 * max_workers
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+
+        for batch in _chunks(feedback_iterable, batch_size):
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().result()
+            pending.append(submit_in_context(executor, analyze_feedback_batch, batch, client))
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+_capped_warnings = set()
+
+
+def _warn_if_capped(max_workers):
+    """
+    Warns once per backend setting when the backend's in-flight cap is
+    below max_workers: the extra workers would only wait for a slot.
+    """
+    backend_cap = getattr(get_backend("agent1"), "max_in_flight", None)
+    if backend_cap is None or max_workers <= backend_cap:
+        return
+
+    key = (getattr(get_backend("agent1"), "host", None), backend_cap, max_workers)
+    if key not in _capped_warnings:
+        _capped_warnings.add(key)
+        print(
+            f"⚠️ max_workers={max_workers} but the LLM backend sends at most {backend_cap} requests at once "
+            f"(max_in_flight); raise it with configure_llm(backend=OllamaBackend(max_in_flight={max_workers}))."
+        )
+
+
+def _iter_with_cache(feedback_iterable, cache, max_workers, item_timeout, max_in_flight, batch_size):
+    """
+    Serves cached results directly and sends each distinct miss in a
+    window to the LLM once, keeping the input order.
+    """
+    # Cached results are keyed on the model that produced them
+    model = stage_model("agent1")
+
+    for window in _chunks(feedback_iterable, CACHE_WINDOW):
+        results = [cache.get(feedback, model, PROMPT_VERSION) for feedback in window]
+        results = [as_record(result) if result is not None else None for result in results]
+
+        # Identical misses inside a window share one LLM call
+        miss_texts = {}
+        for feedback, result in zip(window, results):
+            if result is None:
+                miss_texts.setdefault(normalize_feedback(feedback), feedback)
+
+        fresh_results = iter_analyze_feedback(
+            list(miss_texts.values()), max_workers, item_timeout, max_in_flight, batch_size
+        )
+        fresh = {}
+        for normalized, result in zip(miss_texts, fresh_results):
+            fresh[normalized] = result
+            cache.put(miss_texts[normalized], model, PROMPT_VERSION, result)
+
+        for feedback, result in zip(window, results):
+            yield result if result is not None else fresh[normalize_feedback(feedback)]
+
+
+def _iter_with_dedup(feedback_iterable, cache, max_workers, item_timeout, max_in_flight, batch_size, window):
+    """
+    Analyzes one representative per near-duplicate group and yields its
+    (immutable, shared) record for every member, so downstream counts
+    still see one record per line. Groups are numbered by first appearance,
+    so each line is yielded once its representative has been answered.
+    """
+    for lines in _chunks(feedback_iterable, window):
+        representatives, positions, multiplicities = collapse_near_duplicates(lines)
+
+        # Lines answered by their group's representative instead of a call of their own
+        collapsed = sum(multiplicities) - len(multiplicities)
+        if collapsed:
+            record_event("dedup", "collapsed", collapsed)
+            print(f"Collapsed {len(lines)} lines into {len(representatives)} near-duplicate groups")
+
+        rep_results = iter_analyze_feedback(
+            representatives, max_workers, item_timeout, max_in_flight, batch_size, cache=cache
+        )
+        answered = []
+        try:
+            for position in positions:
+                while len(answered) <= position:
+                    answered.append(next(rep_results))
+                yield answered[position]
+        finally:
+            rep_results.close()
+
+
+def _iter_with_preclassifier(feedback_iterable, preclassifier, cache, dedup, max_workers, item_timeout,
+                             max_in_flight, batch_size, window):
+    """
+    Answers confidently classifiable lines locally and sends the rest
+    through the remaining Agent 1 steps, keeping the input order.
+    In agreement mode every line goes to the LLM and its answer is used.
+    """
+    for lines in _chunks(feedback_iterable, window):
+        local_answers = preclassifier.predict(lines)
+
+        if preclassifier.agreement:
+            escalated = lines
+        else:
+            escalated = [text for text, answer in zip(lines, local_answers) if answer is None]
+
+        llm_results = iter_analyze_feedback(
+            escalated, max_workers, item_timeout, max_in_flight, batch_size, cache=cache, dedup=dedup,
+            window=len(lines)
+        )
+
+        if preclassifier.agreement:
+            llm_results = list(llm_results)
+            preclassifier.record_agreement(local_answers, llm_results)
+            yield from llm_results
+            continue
+
+        try:
+            for answer in local_answers:
+                yield answer if answer is not None else next(llm_results)
+        finally:
+            llm_results.close()
+
+
+def open_cache(use_cache=True, path=None):
+    """
+    Returns a ClassificationCache, or None when use_cache is False.
+    """
+    if not use_cache:
+        return None
+    return ClassificationCache(path) if path else ClassificationCache()
+
+
+def analyze_feedback_list(feedback_list, max_workers=1, item_timeout=None, batch_size=1, cache=None,
+                          dedup=False, preclassifier=None):
+    """
+    Run Agent 1 over a list of feedback lines.
+
+    Parameters:
+        feedback_list (list[str]): Raw feedback lines.
+        max_workers (int): Number of concurrent Ollama requests.
+        item_timeout (float, optional): Per-request timeout in seconds.
+        batch_size (int): Feedback lines packed into one prompt.
+        cache (ClassificationCache, optional): Persistent cache consulted before the LLM.
+        dedup (bool): Collapse near-duplicate lines before calling the LLM.
+        preclassifier (PreClassifier, optional): Local tier for trivial lines.
+
+    Returns:
+        list[FeedbackRecord]: Agent 1 results in the same order as feedback_list.
+    """
+    return list(iter_analyze_feedback(
+        feedback_list, max_workers, item_timeout, batch_size=batch_size, cache=cache, dedup=dedup,
+        preclassifier=preclassifier
+    ))
+
+
+def iter_agent1_stage(feedback_list, max_workers=1, item_timeout=None, batch_size=1, use_cache=True,
+                      dedup=False, run_id=None, preclassify=True):
+    """
+    Agent 1 stage shared by the pipeline entry points.
+
+    Opens the classification cache (unless use_cache is False) and, when a
+    run_id is given, checkpoints every chunk to that run's journal so a
+    re-run with the same run_id resumes where the previous one stopped.
+    preclassify (True, False or "agreement") controls the local tier that
+    answers trivial lines without the LLM (see open_preclassifier).
+
+    Yields:
+        FeedbackRecord: Agent 1 result for each feedback line, in order.
+    """
+    cache = open_cache(use_cache)
+    preclassifier = open_preclassifier(preclassify)
+    try:
+        if run_id is None:
+            yield from iter_analyze_feedback(
+                feedback_list, max_workers, item_timeout, batch_size=batch_size, cache=cache, dedup=dedup,
+                preclassifier=preclassifier
+            )
+            return
+
+        journal = RunJournal(run_id)
+        if journal.completed_items:
+            print(f"Resuming run {run_id!r}: {journal.completed_items} items already analyzed")
+
+        def analyze_chunk(lines):
+            return analyze_feedback_list(lines, max_workers, item_timeout, batch_size, cache, dedup, preclassifier)
+
+        for results, _, _ in iter_journaled_chunks(feedback_list, journal, analyze_chunk):
+            yield from results
+    finally:
+        if preclassifier is not None:
+            print("Pre-classifier:", preclassifier.stats())
+        if cache is not None:
+            print("Cache:", cache.stats())
+            cache.close()
+
+
+def run_agent1_stage(feedback_list, max_workers=1, item_timeout=None, batch_size=1, use_cache=True,
+                     dedup=False, run_id=None, preclassify=True, retry_queue=None, on_result=None):
+    """
+    iter_agent1_stage collected into a list, followed by one deferred retry
+    of the failed lines (see agents/retry_queue.py). Lines that fail again
+    stay failure records, which aggregation skips, and go to retry_queue.
+    on_result, when given, is called with each result as it arrives
+    (before the retry), e.g. to report progress.
+
+    Returns:
+        list[FeedbackRecord]: Agent 1 results in the same order as feedback_list.
+    """
+    feedback_list = list(feedback_list)
+    results = []
+    for result in iter_agent1_stage(
+        feedback_list, max_workers, item_timeout, batch_size, use_cache, dedup, run_id, preclassify
+    ):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    # The retry goes through the same cache, dedup and pre-classifier options;
+    # iter_agent1_stage has closed its own by now
+    def analyze_lines(lines):
+        cache = open_cache(use_cache)
+        try:
+            return analyze_feedback_list(
+                lines, max_workers, item_timeout, batch_size, cache, dedup, open_preclassifier(preclassify)
+            )
+        finally:
+            if cache is not None:
+                cache.close()
+
+    return retry_failures(feedback_list, results, analyze_lines, retry_queue, run_id)
+
+
+def benchmark_batching(feedback_list, batch_size=10):
+    """
+    Runs feedback_list through the one-at-a-time and the batched analyzer
+    and reports tokens per item and items per second for each.
+
+    Returns:
+        dict: {"single": stats, "batched": stats} where stats holds
+              calls, items, prompt_tokens, completion_tokens,
+              tokens_per_item, items_per_second and seconds.
+    """
+    report = {}
+
+    for label, size in [("single", 1), ("batched", batch_size)]:
+        usage = {}
+        started = time.perf_counter()
+        for batch in _chunks(feedback_list, size):
+            analyze_feedback_batch(batch, usage=usage)
+        seconds = time.perf_counter() - started
+
+        items = len(feedback_list) or 1
+        usage["seconds"] = round(seconds, 3)
+        usage["tokens_per_item"] = round(
+            (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)) / items, 1
+        )
+        usage["items_per_second"] = round(len(feedback_list) / seconds, 2) if seconds else 0.0
+        report[label] = usage
+
+    return report
+
+
 if __name__ == "__main__":
 
     test_feedbacks = [
@@ -174,3 +645,7 @@ if __name__ == "__main__":
         print("Feedback:", feedback)
         result = analyze_feedback(feedback)
         print(result)
+
+    print("\n=== Batching Benchmark (batch_size=10) ===")
+    for label, stats in benchmark_batching(test_feedbacks, batch_size=10).items():
+        print(label, stats)
@@ -0,0 +1,232 @@
+# feedback_record.py
+# Typed Agent 1 Result Record
+# Purpose:
+# One compact, immutable record per analyzed feedback line instead of a
+# free-form dict:
+# - sentiment, category and priority are StrEnum members, so every record
+#   shares the same few label objects (and they still compare equal to,
+#   and serialize as, their plain strings)
+# - __slots__ storage and interned problem statements
+# - optional source ID and timestamp
+# - the fallback records ("API Failure", "Parsing Error") are shared constants;
+#   they mark failed lines, which aggregation skips
+# Records also support read-only dict-style access (record["category"],
+# record.get("problem")), so code written against the dict results still works.
+#
+# Usage:
+#   record = FeedbackRecord.from_dict({"problem": "Upload fails", "sentiment": "Negative",
+#                                      "category": "Bug", "priority": "High"})
+#   dump_jsonl(records, handle);  records = list(load_jsonl(handle))
+#   python -m agents.feedback_record            # memory per million records
+
+import json
+import sys
+from dataclasses import dataclass
+from enum import StrEnum
+
+
+class Sentiment(StrEnum):
+    POSITIVE = "Positive"
+    NEUTRAL = "Neutral"
+    NEGATIVE = "Negative"
+    UNKNOWN = "Unknown"
+
+
+class Category(StrEnum):
+    BUG = "Bug"
+    FEATURE_REQUEST = "Feature Request"
+    UX_ISSUE = "UX Issue"
+    PERFORMANCE = "Performance"
+    OTHER = "Other"
+
+
+class Priority(StrEnum):
+    HIGH = "High"
+    MEDIUM = "Medium"
+    LOW = "Low"
+
+
+NO_PROBLEM = "None"
+
+# Problems of the fallback records: the line was not analyzed
+FAILURE_PROBLEMS = ("API Failure", "Parsing Error")
+
+# Keys of the dict form, in the order Agent 1 has always produced them
+RESULT_FIELDS = ("problem", "sentiment", "category", "priority")
+OPTIONAL_FIELDS = ("source_id", "timestamp")
+
+
+@dataclass(frozen=True, slots=True)
+class FeedbackRecord:
+    """
+    Agent 1 result for one feedback line.
+
+    Records are immutable, so one record can safely be shared by every
+    line it describes (cache hits, near-duplicates).
+    """
+
+    problem: str
+    sentiment: Sentiment
+    category: Category
+    priority: Priority
+    source_id: str | None = None
+    timestamp: float | None = None
+
+    @classmethod
+    def from_dict(cls, data, source_id=None, timestamp=None):
+        """
+        Builds a record from an Agent 1 result dict.
+
+        Raises:
+            ValueError: If a label is not one of the allowed values.
+            KeyError: If a field is missing.
+        """
+        return cls(
+            sys.intern(str(data["problem"])),
+            Sentiment(data["sentiment"]),
+            Category(data["category"]),
+            Priority(data["priority"]),
+            data.get("source_id", source_id),
+            data.get("timestamp", timestamp)
+        )
+
+    def to_dict(self):
+        """
+        The plain dict form; source_id and timestamp only when set.
+        """
+        result = {
+            "problem": self.problem,
+            "sentiment": self.sentiment.value,
+            "category": self.category.value,
+            "priority": self.priority.value
+        }
+        if self.source_id is not None:
+            result["source_id"] = self.source_id
+        if self.timestamp is not None:
+            result["timestamp"] = self.timestamp
+        return result
+
+    @property
+    def has_problem(self):
+        return self.problem != NO_PROBLEM and not self.failed
+
+    @property
+    def failed(self):
+        return self.problem in FAILURE_PROBLEMS
+
+    # Read-only mapping interface over the dict form
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __getitem__(self, key):
+        if key in RESULT_FIELDS or (key in OPTIONAL_FIELDS and getattr(self, key) is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+API_FAILURE_RECORD = FeedbackRecord("API Failure", Sentiment.UNKNOWN, Category.OTHER, Priority.LOW)
+PARSING_ERROR_RECORD = FeedbackRecord("Parsing Error", Sentiment.UNKNOWN, Category.OTHER, Priority.LOW)
+
+
+def as_record(result):
+    """
+    Returns result as a FeedbackRecord (records pass through unchanged).
+    """
+    if isinstance(result, FeedbackRecord):
+        return result
+    return FeedbackRecord.from_dict(result)
+
+
+def dump_jsonl(records, handle):
+    """
+    Writes one JSON object per record to a text file handle.
+    """
+    for record in records:
+        handle.write(json.dumps(record.to_dict()) + "\n")
+
+
+def load_jsonl(handle):
+    """
+    Yields records from a file written by dump_jsonl.
+    """
+    for line in handle:
+        if line.strip():
+            yield FeedbackRecord.from_dict(json.loads(line))
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("msgpack serialization needs the msgpack package (pip install msgpack)") from e
+    return msgpack
+
+
+def to_msgpack(records):
+    """
+    Packs records as one msgpack array of
+    [problem, sentiment, category, priority, source_id, timestamp] rows.
+    """
+    rows = [
+        [record.problem, record.sentiment.value, record.category.value, record.priority.value,
+         record.source_id, record.timestamp]
+        for record in records
+    ]
+    return _msgpack().packb(rows, use_bin_type=True)
+
+
+def from_msgpack(data):
+    return [
+        FeedbackRecord(sys.intern(problem), Sentiment(sentiment), Category(category), Priority(priority),
+                       source_id, timestamp)
+        for problem, sentiment, category, priority, source_id, timestamp in _msgpack().unpackb(data, raw=False)
+    ]
+
+
+def measure_memory(n=200_000, distinct_problems=5_000):
+    """
+    Peak traced memory of n Agent 1 results held as dicts (as parsed from
+    LLM JSON) versus as FeedbackRecords.
+
+    Returns:
+        dict: bytes per million results for each form.
+    """
+    import tracemalloc
+
+    answers = [
+        json.dumps({"problem": f"Upload fails for file type {index}", "sentiment": "Negative",
+                    "category": "Bug", "priority": "High"})
+        for index in range(distinct_problems)
+    ]
+
+    def peak(build):
+        tracemalloc.start()
+        held = build()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del held
+        return peak_bytes * 1_000_000 // n
+
+    return {
+        "dict_bytes_per_million": peak(lambda: [json.loads(answers[i % distinct_problems]) for i in range(n)]),
+        "record_bytes_per_million": peak(
+            lambda: [FeedbackRecord.from_dict(json.loads(answers[i % distinct_problems])) for i in range(n)]
+        )
+    }
+
+
+if __name__ == "__main__":
+    usage = measure_memory()
+    saved = 1 - usage["record_bytes_per_million"] / usage["dict_bytes_per_million"]
+    print(f"dicts:   {usage['dict_bytes_per_million'] / 1e6:8.1f} MB per million results")
+    print(f"records: {usage['record_bytes_per_million'] / 1e6:8.1f} MB per million results ({saved:.0%} less)")
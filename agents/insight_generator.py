@@ -1,13 +1,21 @@
-import ollama
+from agents.instrumentation import record_event
+from agents.llm_backend import llm_chat, stage_model
+from agents.memo_digest import digest_analytics, needs_digest
 
 
-def generate_insights(agent2_output):
+# Bump whenever the memo or digest prompts change so cached memos are not reused
+MEMO_PROMPT_VERSION = "1"
+
+# "auto" switches to map-reduce digests only for inputs too large to send whole
+MEMO_MODES = ("auto", "direct", "map_reduce")
+
+
+def build_memo_prompt(agent2_output):
     """
-    Takes structured analytics from Agent 2
-    and generates a structured executive product memo.
+    The Agent 3 prompt for a structured analytics summary from Agent 2.
     """
 
-    prompt = f"""
+    return f"""
 You are a senior Product Strategy Analyst.
 
 Based on the following analytics summary, generate a structured product memo.
@@ -40,12 +48,96 @@ Recommended Actions:
 Keep it concise, strategic, and suitable for leadership review.
 """
 
-    response = ollama.chat(
-        model="llama3",
-        messages=[{"role": "user", "content": prompt}]
+
+def generate_insights(agent2_output, stream=False, mode="auto", cache=None):
+    """
+    Takes structured analytics from Agent 2
+    and generates a structured executive product memo.
+
+    Parameters:
+        agent2_output (dict): Output of detect_patterns.
+        stream (bool): Return an iterator of memo text chunks, yielded as
+            the model produces them, instead of the finished memo.
+        mode (str): "direct" sends agent2_output whole; "map_reduce" first
+            condenses its themes into digests (see agents/memo_digest.py);
+            "auto" does so only when agent2_output is too large.
+        cache (MemoCache, optional): Memos for unchanged pattern analyses
+            are returned from it without an LLM call; placeholder and
+            interrupted memos are never stored.
+
+    Returns:
+        str | Iterator[str]: The memo, or its chunks when streaming.
+    """
+    if mode not in MEMO_MODES:
+        raise ValueError(f"mode must be one of {MEMO_MODES}")
+
+    # The mode is part of the version: direct and digested memos differ
+    cache_args = (agent2_output, stage_model("agent3"), f"{MEMO_PROMPT_VERSION}:{mode}")
+    if cache is not None:
+        memo = cache.get(*cache_args)
+        if memo is not None:
+            record_event("agent3_memo", "cache_hit")
+            return iter([memo]) if stream else memo
+
+    if stream:
+        return _iter_memo_chunks(agent2_output, mode, cache, cache_args)
+
+    messages = memo_messages(agent2_output, mode)
+
+    try:
+        response = llm_chat("agent3_memo", messages=messages)
+    except Exception as e:
+        print("⚠️ Memo generation failed:", e)
+        record_event("agent3_memo", "api_fallback")
+        return memo_unavailable(e)
+
+    memo = response["message"]["content"]
+    if cache is not None and memo.strip():
+        cache.put(*cache_args, memo)
+    return memo
+
+
+def memo_messages(agent2_output, mode="auto"):
+    """
+    The memo conversation, with agent2_output digested first if mode asks.
+    """
+    if mode == "map_reduce" or (mode == "auto" and needs_digest(agent2_output)):
+        agent2_output = digest_analytics(agent2_output)
+    return [{"role": "user", "content": build_memo_prompt(agent2_output)}]
+
+
+def memo_unavailable(error):
+    """
+    Placeholder memo used when the model cannot be reached.
+    """
+    return (
+        "Executive Summary:\n"
+        f"The insight memo could not be generated because the model server failed ({error}). "
+        "The pattern analysis and system evaluation are unaffected; re-run Agent 3 once the server recovers.\n"
     )
 
-    return response["message"]["content"]
+
+def _iter_memo_chunks(agent2_output, mode, cache=None, cache_args=None):
+    # Digests are built on first iteration, so callers get the iterator at once.
+    # A failure before the first chunk yields the placeholder memo instead;
+    # a failure mid-stream ends the memo with a note
+    messages = memo_messages(agent2_output, mode)
+    chunks = []
+    try:
+        for chunk in llm_chat("agent3_memo", messages=messages, stream=True):
+            content = chunk["message"]["content"]
+            if content:
+                chunks.append(content)
+                yield content
+    except Exception as e:
+        print("⚠️ Memo generation failed:", e)
+        record_event("agent3_memo", "api_fallback")
+        yield f"\n\n[Memo interrupted: {e}]" if chunks else memo_unavailable(e)
+        return
+
+    # Only memos streamed to the end are cached
+    if cache is not None and chunks:
+        cache.put(*cache_args, "".join(chunks))
 
 
 if __name__ == "__main__":
@@ -62,7 +154,7 @@ if __name__ == "__main__":
         ]
     }
 
-    result = generate_insights(sample_agent2_output)
-
     print("\n=== PRODUCT INSIGHT MEMO ===\n")
-    print(result)
+    for text in generate_insights(sample_agent2_output, stream=True):
+        print(text, end="", flush=True)
+    print()
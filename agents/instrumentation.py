@@ -0,0 +1,328 @@
+# instrumentation.py
+# Pipeline Timing and LLM Latency Instrumentation
+# Purpose:
+# Records, for every LLM call site and every pipeline stage:
+# - per-call latency (with p50/p95/p99 from a bounded sample)
+# - prompt and completion token counts from the Ollama response metadata
+# - parse repairs, retries and fallbacks, and the time spent repairing output
+# - per-stage wall-clock totals
+# Reports export as JSON (with OpenTelemetry-style spans) or Prometheus text.
+#
+# Every call is recorded into the process-wide GLOBAL_REPORT and, inside a
+# `with recording():` block, into that run's own report as well.
+
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+import ollama
+
+
+# Latencies kept per call site for percentile estimates (reservoir sample)
+LATENCY_SAMPLE_SIZE = 2048
+
+# Stage spans kept per report (the oldest are dropped first)
+MAX_SPANS = 10_000
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RunReport:
+    """
+    Thread-safe collection of LLM call, event and stage measurements.
+    At most max_spans stage spans are kept; 0 keeps none.
+    """
+
+    def __init__(self, run_id=None, max_spans=MAX_SPANS):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.finished_at = None
+        self.llm_calls = {}
+        self.events = Counter()
+        self.durations = Counter()
+        self.stages = {}
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def record_llm_call(self, call_site, seconds, prompt_tokens=0, completion_tokens=0, error=False):
+        with self._lock:
+            site = self.llm_calls.setdefault(call_site, {
+                "calls": 0,
+                "errors": 0,
+                "latency_seconds_total": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "_latencies": []
+            })
+            site["calls"] += 1
+            site["errors"] += int(error)
+            site["latency_seconds_total"] += seconds
+            site["prompt_tokens"] += prompt_tokens
+            site["completion_tokens"] += completion_tokens
+
+            sample = site["_latencies"]
+            if len(sample) < LATENCY_SAMPLE_SIZE:
+                sample.append(seconds)
+            else:
+                slot = random.randrange(site["calls"])
+                if slot < LATENCY_SAMPLE_SIZE:
+                    sample[slot] = seconds
+
+    def record_event(self, call_site, event, count=1):
+        with self._lock:
+            self.events[f"{call_site}.{event}"] += count
+
+    def record_duration(self, call_site, name, seconds):
+        with self._lock:
+            self.durations[f"{call_site}.{name}"] += seconds
+
+    def record_stage(self, name, started_at, finished_at):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+            stage["calls"] += 1
+            stage["seconds"] += finished_at - started_at
+            self.spans.append({
+                "name": name,
+                "start_time_unix_nano": int(started_at * 1e9),
+                "end_time_unix_nano": int(finished_at * 1e9),
+                "attributes": {"run_id": self.run_id}
+            })
+
+    def to_dict(self):
+        with self._lock:
+            llm_calls = {}
+            for call_site, site in self.llm_calls.items():
+                latencies = sorted(site["_latencies"])
+                stats = {key: value for key, value in site.items() if not key.startswith("_")}
+                stats["latency_seconds_total"] = round(stats["latency_seconds_total"], 4)
+                stats["latency_p50"] = round(_percentile(latencies, 0.50), 4)
+                stats["latency_p95"] = round(_percentile(latencies, 0.95), 4)
+                stats["latency_p99"] = round(_percentile(latencies, 0.99), 4)
+                stats["parse_failure_rate"] = round(
+                    self.events[f"{call_site}.parse_failure"] / stats["calls"], 4
+                ) if stats["calls"] else 0.0
+                llm_calls[call_site] = stats
+
+            return {
+                "run_id": self.run_id,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "wall_seconds": round((self.finished_at or time.time()) - self.started_at, 4),
+                "stages": {
+                    name: {"calls": stage["calls"], "seconds": round(stage["seconds"], 4)}
+                    for name, stage in self.stages.items()
+                },
+                "llm_calls": llm_calls,
+                "events": dict(self.events),
+                "durations": {key: round(seconds, 6) for key, seconds in self.durations.items()},
+                "spans": list(self.spans)
+            }
+
+    def to_json(self, path=None):
+        """
+        Returns the report as JSON, also writing it to `path` when given.
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(text)
+        return text
+
+    def to_prometheus(self, prefix="feedback_engine"):
+        """
+        Returns the report in the Prometheus text exposition format.
+        """
+        return prometheus_text(self.to_dict(), prefix)
+
+
+def prometheus_text(report, prefix="feedback_engine"):
+    """
+    Renders a RunReport.to_dict() result (e.g. a pipeline's "run_report")
+    in the Prometheus text exposition format.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{prefix}_{name}{{{label_text}}} {value}")
+
+    sites = report["llm_calls"]
+    metric("llm_calls_total", "counter", "LLM calls per call site",
+           [({"call_site": site}, stats["calls"]) for site, stats in sites.items()])
+    metric("llm_errors_total", "counter", "Failed LLM calls per call site",
+           [({"call_site": site}, stats["errors"]) for site, stats in sites.items()])
+    metric("llm_latency_seconds_total", "counter", "Summed LLM call latency",
+           [({"call_site": site}, stats["latency_seconds_total"]) for site, stats in sites.items()])
+    metric("llm_tokens_total", "counter", "Prompt and completion tokens",
+           [({"call_site": site, "kind": kind}, stats[f"{kind}_tokens"])
+            for site, stats in sites.items() for kind in ("prompt", "completion")])
+    metric("llm_latency_seconds", "summary", "LLM call latency quantiles",
+           [({"call_site": site, "quantile": q}, stats[f"latency_p{int(float(q) * 100)}"])
+            for site, stats in sites.items() for q in ("0.5", "0.95", "0.99")])
+    metric("llm_parse_failure_ratio", "gauge", "Share of calls whose output could not be parsed",
+           [({"call_site": site}, stats["parse_failure_rate"]) for site, stats in sites.items()])
+    metric("events_total", "counter", "Parse repairs, retries and fallbacks",
+           [({"event": event}, count) for event, count in report["events"].items()])
+    metric("duration_seconds_total", "counter", "Time spent outside LLM calls, e.g. repairing output",
+           [({"name": name}, seconds) for name, seconds in report.get("durations", {}).items()])
+    metric("stage_seconds_total", "counter", "Wall-clock seconds per pipeline stage",
+           [({"stage": name}, stage["seconds"]) for name, stage in report["stages"].items()])
+
+    return "\n".join(lines) + "\n"
+
+
+# Lives as long as the process (e.g. the HTTP service), so it keeps
+# counters and latency samples but no per-stage spans
+GLOBAL_REPORT = RunReport("process", max_spans=0)
+
+_active_report = ContextVar("active_report", default=None)
+
+
+def _reports():
+    active = _active_report.get()
+    return (GLOBAL_REPORT,) if active is None else (GLOBAL_REPORT, active)
+
+
+def current_report():
+    """
+    The report of the enclosing recording() block, or GLOBAL_REPORT.
+    """
+    return _active_report.get() or GLOBAL_REPORT
+
+
+@contextmanager
+def recording(run_id=None):
+    """
+    Collects a fresh RunReport for everything run inside the block.
+    """
+    report = RunReport(run_id)
+    token = _active_report.set(report)
+    try:
+        yield report
+    finally:
+        report.finished_at = time.time()
+        _active_report.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a pipeline stage.
+    """
+    started_at = time.time()
+    try:
+        yield
+    finally:
+        finished_at = time.time()
+        for report in _reports():
+            report.record_stage(name, started_at, finished_at)
+
+
+def record_event(call_site, event, count=1):
+    for report in _reports():
+        report.record_event(call_site, event, count)
+
+
+def record_duration(call_site, name, seconds):
+    for report in _reports():
+        report.record_duration(call_site, name, seconds)
+
+
+def instrumented_chat(call_site, chat=None, **chat_kwargs):
+    """
+    Calls chat(**chat_kwargs) (default: ollama.chat) and records latency
+    and token counts under call_site. Exceptions are recorded and re-raised.
+
+    With stream=True the returned chunk iterator is wrapped so the call is
+    recorded once it is exhausted, plus a "first_token_seconds" duration.
+    """
+    chat = chat or ollama.chat
+    started = time.perf_counter()
+
+    try:
+        response = chat(**chat_kwargs)
+    except Exception:
+        seconds = time.perf_counter() - started
+        for report in _reports():
+            report.record_llm_call(call_site, seconds, error=True)
+        raise
+
+    if chat_kwargs.get("stream"):
+        return _instrumented_stream(call_site, response, started, _reports())
+
+    seconds = time.perf_counter() - started
+    prompt_tokens = response.get("prompt_eval_count") or 0
+    completion_tokens = response.get("eval_count") or 0
+    for report in _reports():
+        report.record_llm_call(call_site, seconds, prompt_tokens, completion_tokens)
+
+    return response
+
+
+def _instrumented_stream(call_site, chunks, started, reports):
+    # Reports are captured up front: the consumer may iterate in another context
+    prompt_tokens = completion_tokens = 0
+    first = True
+
+    try:
+        for chunk in chunks:
+            if first:
+                first = False
+                for report in reports:
+                    report.record_duration(call_site, "first_token_seconds", time.perf_counter() - started)
+            # Ollama puts the token counts on the final (done) chunk
+            prompt_tokens = chunk.get("prompt_eval_count") or prompt_tokens
+            completion_tokens = chunk.get("eval_count") or completion_tokens
+            yield chunk
+    except Exception:
+        for report in reports:
+            report.record_llm_call(call_site, time.perf_counter() - started, error=True)
+        raise
+
+    seconds = time.perf_counter() - started
+    for report in reports:
+        report.record_llm_call(call_site, seconds, prompt_tokens, completion_tokens)
+
+
+def critical_path(stages, dependencies):
+    """
+    The slowest chain of dependent stages in a run.
+
+    Parameters:
+        stages (dict): RunReport.to_dict()["stages"].
+        dependencies (dict): stage -> list of stages it waits for.
+
+    Returns:
+        dict: {"path": [stage, ...], "seconds": total seconds along the path}
+    """
+    finish = {}
+
+    def longest(name):
+        if name not in finish:
+            upstream = [longest(parent) for parent in dependencies.get(name, [])]
+            seconds, path = max(upstream, default=(0.0, []))
+            finish[name] = (seconds + stages.get(name, {}).get("seconds", 0.0), path + [name])
+        return finish[name]
+
+    seconds, path = max((longest(name) for name in dependencies), default=(0.0, []))
+    return {"path": path, "seconds": round(seconds, 4)}
+
+
+def submit_in_context(executor, fn, *args):
+    """
+    executor.submit that keeps the caller's active report for the worker thread.
+    """
+    return executor.submit(copy_context().run, fn, *args)
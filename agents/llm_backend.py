@@ -0,0 +1,245 @@
+# llm_backend.py
+# Shared LLM Backend Layer
+# Purpose:
+# One place through which every agent talks to the model:
+# - OllamaBackend keeps persistent, pooled HTTP clients (connections are
+#   reused across calls and threads instead of reopened per request)
+# - Each backend caps its in-flight requests; extra callers wait in line
+# - Per-stage model routing, e.g. a small fast model for Agent 1 and a
+#   larger one for the Agent 3 memo
+# - Any object with chat()/embed() methods (such as agents/fake_llm.FakeLLM)
+#   can be swapped in as the backend
+# - Every call is retried, circuit-broken and (for Ollama) concurrency-limited
+#   by the backend's Resilience (see agents/resilience.py)
+#
+# Usage:
+#   configure_llm(stage_models={"agent1": "llama3.2:3b", "agent3": "llama3:70b"})
+#   configure_llm(backend=OllamaBackend(host="http://gpu-box:11434", max_in_flight=8))
+
+import copy
+import threading
+from contextlib import contextmanager
+
+import httpx
+import ollama
+
+from agents.instrumentation import instrumented_chat
+from agents.resilience import Resilience
+
+
+DEFAULT_MODEL = "llama3"
+
+# Concurrent requests per backend. Ollama serves OLLAMA_NUM_PARALLEL requests
+# per loaded model at once and queues the rest server-side.
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# Seconds an idle pooled connection is kept open for reuse
+KEEPALIVE_SECONDS = 60
+
+# How long Ollama keeps a model (and its cached prompt prefix) loaded after
+# a request; Ollama's own default is 5 minutes
+DEFAULT_KEEP_ALIVE = "30m"
+
+# Stages are the call-site prefixes: "agent1_batch" runs in stage "agent1"
+STAGES = ("agent1", "agent2", "agent3", "sentiment")
+
+
+class OllamaBackend:
+    """
+    An Ollama server behind persistent, pooled HTTP clients.
+
+    Parameters:
+        host (str, optional): Server URL. Defaults to $OLLAMA_HOST or localhost.
+        timeout (float, optional): Per-request timeout in seconds.
+        max_in_flight (int): Requests sent concurrently; further calls block
+            until a slot frees up. The adaptive limiter (see resilience)
+            lowers this while the server is overloaded.
+        keep_alive (str | float, optional): Sent with every request so the
+            model and its cached prompt prefix stay loaded between bursts.
+            None leaves it to the server.
+    """
+
+    def __init__(self, host=None, timeout=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, keep_alive=DEFAULT_KEEP_ALIVE):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+
+        self.host = host
+        self.timeout = timeout
+        self.item_timeout = None
+        self.max_in_flight = max_in_flight
+        self.keep_alive = keep_alive
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.resilience = Resilience(max_concurrency=max_in_flight)
+
+    def with_timeout(self, timeout):
+        """
+        The same backend (shared pool and in-flight cap) with a per-item
+        timeout. Calls through the view are not retried, so each one ends
+        within `timeout` (see llm_chat).
+        """
+        view = copy.copy(self)
+        view.timeout = view.item_timeout = timeout
+        return view
+
+    def _client(self):
+        # httpx clients are thread-safe; one per timeout value is kept for reuse
+        with self._lock:
+            client = self._clients.get(self.timeout)
+            if client is None:
+                client = ollama.Client(
+                    host=self.host,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_in_flight,
+                        max_keepalive_connections=self.max_in_flight,
+                        keepalive_expiry=KEEPALIVE_SECONDS
+                    )
+                )
+                self._clients[self.timeout] = client
+            return client
+
+    def chat(self, **chat_kwargs):
+        if self.keep_alive is not None:
+            chat_kwargs.setdefault("keep_alive", self.keep_alive)
+        if chat_kwargs.get("stream"):
+            return self._stream_chat(chat_kwargs)
+        with self._slots:
+            return self._client().chat(**chat_kwargs)
+
+    def _stream_chat(self, chat_kwargs):
+        # A streamed answer holds its slot until the last chunk is read
+        with self._slots:
+            yield from self._client().chat(**chat_kwargs)
+
+    def embed(self, **embed_kwargs):
+        if self.keep_alive is not None:
+            embed_kwargs.setdefault("keep_alive", self.keep_alive)
+        with self._slots:
+            return self._client().embed(**embed_kwargs)
+
+
+_default_backend = None
+_stage_backends = {}
+_stage_models = {stage: DEFAULT_MODEL for stage in STAGES}
+_config_lock = threading.Lock()
+
+
+def _stage_of(call_site):
+    return call_site.split("_")[0]
+
+
+def configure_llm(backend=None, stage_models=None, stage_backends=None):
+    """
+    Sets the default backend, per-stage models and per-stage backends.
+    Arguments left as None keep their current setting.
+
+    Parameters:
+        backend: Object with chat()/embed() used by every stage without its own backend.
+        stage_models (dict, optional): stage -> model name, e.g. {"agent1": "llama3.2:3b"}.
+        stage_backends (dict, optional): stage -> backend, e.g. a second Ollama host for Agent 3.
+    """
+    global _default_backend
+
+    unknown = set(stage_models or {}) | set(stage_backends or {})
+    unknown -= set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}; expected some of {STAGES}")
+
+    with _config_lock:
+        if backend is not None:
+            _default_backend = backend
+        _stage_models.update(stage_models or {})
+        _stage_backends.update(stage_backends or {})
+
+
+def get_backend(stage=None):
+    """
+    The backend for a stage, creating the default OllamaBackend on first use.
+    """
+    global _default_backend
+
+    with _config_lock:
+        if stage in _stage_backends:
+            return _stage_backends[stage]
+        if _default_backend is None:
+            _default_backend = OllamaBackend()
+        return _default_backend
+
+
+def stage_model(stage):
+    return _stage_models.get(stage, DEFAULT_MODEL)
+
+
+@contextmanager
+def using_backend(backend, stage_models=None):
+    """
+    Routes every stage to `backend` inside the block, then restores the
+    previous configuration.
+    """
+    global _default_backend
+
+    with _config_lock:
+        saved = _default_backend, dict(_stage_backends), dict(_stage_models)
+        _default_backend = backend
+        _stage_backends.clear()
+        _stage_models.update(stage_models or {})
+    try:
+        yield backend
+    finally:
+        with _config_lock:
+            _default_backend = saved[0]
+            _stage_backends.clear()
+            _stage_backends.update(saved[1])
+            _stage_models.clear()
+            _stage_models.update(saved[2])
+
+
+def resilience_of(backend):
+    """
+    The backend's Resilience, attaching one (retries and circuit breaker,
+    no concurrency limit) to backends that do not bring their own.
+    """
+    resilience = getattr(backend, "resilience", None)
+    if resilience is None:
+        with _config_lock:
+            resilience = getattr(backend, "resilience", None)
+            if resilience is None:
+                resilience = backend.resilience = Resilience()
+    return resilience
+
+
+def llm_chat(call_site, client=None, **chat_kwargs):
+    """
+    Instrumented, resilient chat call routed by call site.
+
+    The stage is the call-site prefix ("agent1_batch" -> "agent1"). Unless
+    given, `model` is the stage's model and `client` the stage's backend.
+    Transient errors are retried; the last one is raised. A client with an
+    item_timeout (see OllamaBackend.with_timeout) gets a single attempt, so
+    retries and their backoff never stretch the call past that timeout.
+    """
+    stage = _stage_of(call_site)
+    if chat_kwargs.get("model") is None:
+        chat_kwargs["model"] = stage_model(stage)
+    client = client if client is not None else get_backend(stage)
+
+    def attempt():
+        return instrumented_chat(call_site, client.chat, **chat_kwargs)
+
+    if chat_kwargs.get("stream"):
+        return resilience_of(client).stream(call_site, attempt)
+    max_attempts = 1 if getattr(client, "item_timeout", None) is not None else None
+    return resilience_of(client).call(call_site, attempt, max_attempts)
+
+
+def llm_embed(call_site, model, texts):
+    """
+    Instrumented, resilient embedding call on the call site's stage backend.
+    """
+    backend = get_backend(_stage_of(call_site))
+    texts = list(texts)
+    return resilience_of(backend).call(
+        call_site, lambda: instrumented_chat(call_site, backend.embed, model=model, input=texts)
+    )
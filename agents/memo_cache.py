@@ -0,0 +1,85 @@
+# memo_cache.py
+# Persistent Cache of Agent 3 Insight Memos
+# Purpose:
+# The memo is the slowest call of a run, and re-analyzing the same input
+# (a second click in the app, a scheduled job whose aggregate has not
+# changed) produces the same Agent 2 output. Memos are stored in SQLite,
+# keyed on a hash of:
+# - a canonical fingerprint of the pattern analysis: distributions with
+#   sorted keys, themes sorted by name with their problems sorted
+# - the Agent 3 model name
+# - the memo prompt version
+# Entries expire after max_age_seconds (a day by default), so memos are
+# refreshed regularly even when nothing changed.
+#
+# Usage:
+#   cache = MemoCache()
+#   memo = generate_insights(pattern_output, cache=cache)   # hit: no LLM call
+
+import hashlib
+import json
+import os
+
+from agents.sqlite_cache import SQLiteCache
+
+
+DEFAULT_MEMO_CACHE_PATH = os.path.join(".cache", "insight_memos.sqlite")
+
+DEFAULT_MEMO_MAX_AGE_SECONDS = 24 * 3600
+
+
+def analytics_fingerprint(pattern_analysis):
+    """
+    Hash of a pattern analysis that ignores dict and list ordering, so
+    equal aggregates from differently ordered input share one fingerprint.
+    """
+    canonical = dict(pattern_analysis)
+    canonical["detected_themes"] = sorted(
+        (
+            {**theme, "related_problems": sorted(map(str, theme.get("related_problems", [])))}
+            for theme in pattern_analysis.get("detected_themes", [])
+        ),
+        key=lambda theme: (str(theme.get("theme", "")), theme["related_problems"])
+    )
+    payload = json.dumps(canonical, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoCache(SQLiteCache):
+    """
+    SQLite-backed cache of insight memos (see agents/sqlite_cache.py for
+    expiry and LRU eviction).
+    """
+
+    table = "memos"
+    columns = "memo TEXT NOT NULL"
+    # Memo lookups are rare and the file is shared with other processes,
+    # so a hit does not hold the write lock until the next store
+    commit_touches = True
+
+    def __init__(self, path=DEFAULT_MEMO_CACHE_PATH, max_entries=10_000, max_age_seconds=DEFAULT_MEMO_MAX_AGE_SECONDS):
+        super().__init__(path, max_entries, max_age_seconds)
+
+    @staticmethod
+    def make_key(pattern_analysis, model, prompt_version):
+        payload = "\0".join([analytics_fingerprint(pattern_analysis), model, str(prompt_version)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, pattern_analysis, model, prompt_version):
+        """
+        Returns the cached memo, or None on a miss.
+        """
+        row = self._lookup(self.make_key(pattern_analysis, model, prompt_version), "memo")
+        return row[0] if row is not None else None
+
+    def put(self, pattern_analysis, model, prompt_version, memo):
+        self._store(self.make_key(pattern_analysis, model, prompt_version), {"memo": memo})
+
+
+def open_memo_cache(use_cache=True, path=None):
+    """
+    Returns a MemoCache, or None when use_cache is False.
+    """
+    if not use_cache:
+        return None
+    return MemoCache(path) if path else MemoCache()
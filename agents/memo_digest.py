@@ -0,0 +1,244 @@
+# memo_digest.py
+# Map-Reduce Digests of Agent 2 Output for the Agent 3 Memo
+# Purpose:
+# On a large run, agent2_output carries every theme's related_problems and
+# the memo prompt grows without bound. This module shrinks it to a
+# bounded "analytics input":
+# - map: themes are packed into chunks of at most MAP_CHUNK_CHARS (each
+#   theme with a capped sample of its problems), and each chunk is
+#   summarized into one-sentence digests by a parallel LLM call
+# - reduce: the memo gets the distributions plus one digest per theme;
+#   while that is still over MEMO_INPUT_CHAR_LIMIT, the digests of the
+#   smaller themes are condensed again in groups, so the memo prompt stays
+#   capped however many themes and problems the run produced
+# A chunk whose call fails gets extractive digests (its first problems),
+# so one failed call does not lose its themes.
+#
+# Usage:
+#   if needs_digest(agent2_output):
+#       analytics_input = digest_analytics(agent2_output)
+#   generate_insights(agent2_output, mode="map_reduce")    # does both
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.instrumentation import record_event, submit_in_context
+from agents.structured_output import THEME_DIGESTS_SCHEMA, parse_json, schema_chat
+
+
+# Largest analytics input (characters of its repr) sent to the memo prompt
+MEMO_INPUT_CHAR_LIMIT = 6000
+
+# Largest themes section of one map prompt
+MAP_CHUNK_CHARS = 6000
+
+# Per-theme caps in a map prompt, so one huge theme still fits a chunk
+MAX_PROBLEMS_PER_THEME = 25
+MAX_PROBLEM_CHARS = 160
+MAX_THEME_CHARS = 80
+
+# Longest digest kept from an answer
+MAX_DIGEST_CHARS = 240
+
+# Smaller themes merged into one digest per reduce round
+CONDENSE_GROUP_SIZE = 5
+
+# Concurrent map calls; the backend's own in-flight cap still applies
+MAP_WORKERS = 4
+
+# Condense rounds before the remaining digests are cut to fit
+MAX_REDUCE_LEVELS = 4
+
+
+def needs_digest(agent2_output, limit=MEMO_INPUT_CHAR_LIMIT):
+    """
+    True when agent2_output is too large to interpolate into the memo prompt.
+    """
+    return len(str(agent2_output)) > limit
+
+
+def _truncate(text, limit):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _map_item(theme, problems):
+    return {
+        "theme": _truncate(theme, MAX_THEME_CHARS),
+        "problems": [_truncate(problem, MAX_PROBLEM_CHARS) for problem in problems[:MAX_PROBLEMS_PER_THEME]]
+    }
+
+
+def _chunks(items, max_chars=MAP_CHUNK_CHARS):
+    """
+    Packs items greedily into chunks whose rendered lines fit max_chars;
+    an item larger than max_chars gets a chunk of its own.
+    """
+    chunk, size = [], 0
+    for item in items:
+        line = json.dumps(item)
+        if chunk and size + len(line) > max_chars:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(item)
+        size += len(line) + 1
+    if chunk:
+        yield chunk
+
+
+def _extractive_digest(item):
+    return _truncate("Reported problems include: " + "; ".join(item["problems"][:3]), MAX_DIGEST_CHARS)
+
+
+def summarize_chunk(items):
+    """
+    One map call: a one-sentence digest per {"theme", "problems"} item.
+
+    Returns:
+        tuple[list[str], Exception | None]: Digests in the order of items
+            (extractive where the answer lacks them) and the call's error.
+    """
+    themes = "\n".join(json.dumps(item) for item in items)
+
+    prompt = f"""
+You are a senior Product Analyst.
+
+Summarize each product issue theme below for a leadership memo.
+
+Rules:
+1. Return exactly one digest per theme, using the theme name exactly as given.
+2. Each digest is ONE sentence (at most 30 words) on what users report and its impact.
+3. Do NOT calculate totals, counts, ratios or percentages.
+4. Avoid speculative language.
+
+Return ONLY valid JSON in this format:
+
+{{
+  "digests": [
+    {{"theme": "Theme Name", "digest": "One sentence."}}
+  ]
+}}
+
+Themes:
+{themes}
+"""
+
+    messages = [{"role": "user", "content": prompt}]
+
+    error = None
+    try:
+        response = schema_chat("agent3_digest", THEME_DIGESTS_SCHEMA, messages)
+        parsed = parse_json("agent3_digest", response["message"]["content"])
+    except Exception as e:
+        record_event("agent3_digest", "api_fallback")
+        error, parsed = e, None
+
+    by_theme = {}
+    if parsed is not None and isinstance(parsed.get("digests"), list):
+        for entry in parsed["digests"]:
+            if isinstance(entry, dict) and entry.get("digest"):
+                by_theme[str(entry.get("theme", "")).strip()] = _truncate(entry["digest"], MAX_DIGEST_CHARS)
+
+    digests = []
+    for item in items:
+        digest = by_theme.get(item["theme"])
+        if digest is None:
+            record_event("agent3_digest", "extractive_fallback")
+            digest = _extractive_digest(item)
+        digests.append(digest)
+    return digests, error
+
+
+def _summarize_all(items, max_workers=MAP_WORKERS):
+    chunks = list(_chunks(items))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        futures = [submit_in_context(executor, summarize_chunk, chunk) for chunk in chunks]
+        answers = [future.result() for future in futures]
+
+    errors = [error for _, error in answers if error is not None]
+    if errors:
+        print(f"⚠️ {len(errors)} of {len(chunks)} theme digest call(s) failed ({errors[-1]}); using extractive digests.")
+    return [digest for digests, _ in answers for digest in digests]
+
+
+def _problem_count(theme):
+    # Clustered themes list a capped sample of problems but count all of them
+    return theme.get("problem_count", len(theme.get("related_problems", [])))
+
+
+def digest_analytics(agent2_output, limit=MEMO_INPUT_CHAR_LIMIT, max_workers=MAP_WORKERS):
+    """
+    The bounded analytics input for the memo prompt: agent2_output with
+    detected_themes replaced by {"theme", "problem_count", "digest"}
+    entries, the smaller themes condensed level by level until it fits
+    `limit`.
+
+    Parameters:
+        agent2_output (dict): Output of detect_patterns.
+        limit (int): Largest repr of the result, in characters.
+        max_workers (int): Concurrent map calls.
+
+    Returns:
+        dict: The compact analytics input.
+    """
+    themes = agent2_output.get("detected_themes") or []
+    analytics = {key: value for key, value in agent2_output.items() if key != "detected_themes"}
+
+    record_event("agent3_memo", "map_reduce")
+    print(f"Summarizing {len(themes)} theme(s) for the memo...")
+
+    # Map: one digest per theme, largest themes first
+    themes = sorted(themes, key=_problem_count, reverse=True)
+    items = [_map_item(theme.get("theme", "Unnamed Theme"), theme.get("related_problems", [])) for theme in themes]
+    digests = _summarize_all(items, max_workers)
+    entries = [
+        {"theme": item["theme"], "problem_count": _problem_count(theme), "digest": digest}
+        for item, theme, digest in zip(items, themes, digests)
+    ]
+
+    # Reduce: condense groups of digests until the input fits
+    for _ in range(MAX_REDUCE_LEVELS):
+        if len(str({**analytics, "detected_themes": entries})) <= limit or len(entries) <= 1:
+            break
+
+        # The larger half keeps its own digests; the smaller themes are merged in groups
+        keep = max(1, len(entries) // 2)
+        tail = entries[keep:]
+        groups = [tail[index:index + CONDENSE_GROUP_SIZE] for index in range(0, len(tail), CONDENSE_GROUP_SIZE)]
+        print(f"Condensing {len(tail)} smaller theme digest(s) into {len(groups)}...")
+
+        items = [
+            _map_item(" / ".join(entry["theme"] for entry in group), [entry["digest"] for entry in group])
+            for group in groups
+        ]
+        digests = _summarize_all(items, max_workers)
+        entries = entries[:keep] + [
+            {"theme": item["theme"], "problem_count": sum(entry["problem_count"] for entry in group), "digest": digest}
+            for item, group, digest in zip(items, groups, digests)
+        ]
+
+    # A last resort cap: keep the largest themes that fit
+    while len(entries) > 1 and len(str({**analytics, "detected_themes": entries})) > limit:
+        entries.pop()
+
+    analytics["detected_themes"] = entries
+    return analytics
+
+
+if __name__ == "__main__":
+    from agents.fake_llm import FakeLLM, installed
+
+    sample_agent2_output = {
+        "category_distribution": {"Bug": 600, "Performance": 300},
+        "priority_distribution": {"High": 500, "Medium": 250, "Low": 150},
+        "high_priority_count": 500,
+        "detected_themes": [
+            {"theme": f"Area {number} Issues", "related_problems": [f"Area {number} fails on step {step}" for step in range(40)]}
+            for number in range(60)
+        ]
+    }
+
+    with installed(FakeLLM()):
+        analytics = digest_analytics(sample_agent2_output)
+    print(len(str(sample_agent2_output)), "->", len(str(analytics)), "characters")
+    print(analytics["detected_themes"][:2])
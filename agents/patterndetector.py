@@ -6,61 +6,228 @@
 # - Aggregates priority distribution
 # - Counts high priority issues
 # - Collects valid problem statements
+# - Counts failed lines separately (they are excluded from every count)
+# - Groups problems into semantic themes
+# Counting runs vectorized over columnar results (agents/result_columns.py).
 
-import ollama
-import json
 from collections import Counter
 
+from agents.instrumentation import record_event
+from agents.result_columns import ResultColumns
+from agents.structured_output import THEMES_SCHEMA, parse_json, retry_messages, schema_chat
+from agents.theme_clustering import cluster_themes
 
-def detect_patterns(agent1_results):
+
+# Above this many distinct problems, themes come from embedding clustering
+# instead of a single prompt that would outgrow the context window
+SINGLE_PROMPT_MAX_PROBLEMS = 50
+
+# Distinct problems a PatternAccumulator keeps before pruning one-off entries
+MAX_TRACKED_PROBLEMS = 100_000
+
+
+def detect_patterns(agent1_results, theme_method="auto", theme_index=None):
     """
-    agent1_results: list of dictionaries from Agent 1
+    agent1_results: list of dictionaries from Agent 1, or the same
+                    results as ResultColumns
+    theme_method: "auto", "llm" or "clustering" (see detect_semantic_themes)
+    theme_index: optional ThemeIndex; when given, problems are assigned to
+                 known themes and only unmatched ones are clustered
 
     Returns:
         dict containing deterministic aggregation results
     """
 
     # Validate input
-    if not isinstance(agent1_results, list):
+    if isinstance(agent1_results, list):
+        columns = ResultColumns.from_records(agent1_results)
+    elif isinstance(agent1_results, ResultColumns):
+        columns = agent1_results
+    else:
         raise ValueError("Input must be a list of Agent 1 results")
 
-    category_counter = Counter()
-    priority_counter = Counter()
-    high_priority_count = 0
-    problems = []
-
-    for item in agent1_results:
-        category = item.get("category")
-        priority = item.get("priority")
-        problem = item.get("problem")
-
-        if category:
-            category_counter[category] += 1
-
-        if priority:
-            priority_counter[priority] += 1
-            if priority == "High":
-                high_priority_count += 1
-
-        if problem and problem != "None":
-            problems.append(problem)
-    themes = detect_semantic_themes(problems) if problems else []
-    return {
-        "category_distribution": dict(category_counter),
-        "priority_distribution": dict(priority_counter),
-        "high_priority_count": high_priority_count,
-        "detected_themes": themes
-    }
- 
-def detect_semantic_themes(problems):
+    # Themes see each distinct problem once, with its occurrence count
+    result = columns.aggregate()
+    result["detected_themes"] = _resolve_themes(columns.problem_counts(), theme_method, theme_index)
+    return result
+
+
+def _resolve_themes(problems, theme_method, theme_index):
+    if not problems:
+        return []
+    if theme_index is not None:
+        return theme_index.update(problems)
+    return detect_semantic_themes(problems, theme_method)
+
+
+class PatternAccumulator:
     """
-    Uses LLM to group similar problems into semantic themes.
+    Online version of detect_patterns for streamed Agent 1 results.
+
+    Category/priority counters are exact and memory stays flat: problems
+    are kept as a Counter of distinct statements, and once more than
+    max_tracked_problems are held, statements seen only once are dropped.
+    Themes are computed once, in finalize().
+    """
+
+    def __init__(self, max_tracked_problems=MAX_TRACKED_PROBLEMS):
+        self.category_counter = Counter()
+        self.priority_counter = Counter()
+        self.high_priority_count = 0
+        self.failed_count = 0
+        self.problem_counts = Counter()
+        self.items = 0
+        self.max_tracked_problems = max_tracked_problems
+
+    def update(self, agent1_results):
+        if not isinstance(agent1_results, ResultColumns):
+            agent1_results = ResultColumns.from_records(agent1_results)
+
+        self.items += len(agent1_results)
+        self.category_counter.update(agent1_results.distribution("category"))
+        self.priority_counter.update(agent1_results.distribution("priority"))
+        self.high_priority_count += agent1_results.count("priority", "High")
+        self.failed_count += agent1_results.failed
+        self.problem_counts.update(agent1_results.problem_counts())
+
+        self._prune()
+
+    def update_retried(self, agent1_results):
+        """
+        Folds in the new results of lines that were already counted as
+        failed (see agents/retry_queue.py): recovered lines move from
+        failed_count into the counts, and items stays unchanged.
+        """
+        self.update(agent1_results)
+        self.items -= len(agent1_results)
+        self.failed_count -= len(agent1_results)
+
+    def _prune(self):
+        if len(self.problem_counts) > self.max_tracked_problems:
+            self.problem_counts = Counter(
+                {problem: count for problem, count in self.problem_counts.items() if count > 1}
+            )
+
+    def to_state(self):
+        """
+        JSON-serializable counter state (see from_state / merge).
+        """
+        return {
+            "items": self.items,
+            "category_distribution": dict(self.category_counter),
+            "priority_distribution": dict(self.priority_counter),
+            "high_priority_count": self.high_priority_count,
+            "failed_count": self.failed_count,
+            "problem_counts": dict(self.problem_counts)
+        }
+
+    @classmethod
+    def from_state(cls, state, max_tracked_problems=MAX_TRACKED_PROBLEMS):
+        accumulator = cls(max_tracked_problems)
+        accumulator.items = state.get("items", 0)
+        accumulator.category_counter = Counter(state.get("category_distribution", {}))
+        accumulator.priority_counter = Counter(state.get("priority_distribution", {}))
+        accumulator.high_priority_count = state.get("high_priority_count", 0)
+        accumulator.failed_count = state.get("failed_count", 0)
+        accumulator.problem_counts = Counter(state.get("problem_counts", {}))
+        return accumulator
+
+    def merge(self, other, prune=True):
+        """
+        Adds another accumulator's counts into this one.
+        prune=False skips pruning one-off problems, which keeps a sequence
+        of merges independent of their grouping (see merge_states).
+        """
+        self.items += other.items
+        self.category_counter.update(other.category_counter)
+        self.priority_counter.update(other.priority_counter)
+        self.high_priority_count += other.high_priority_count
+        self.failed_count += other.failed_count
+        self.problem_counts.update(other.problem_counts)
+        if prune:
+            self._prune()
+        return self
+
+    def snapshot(self):
+        """
+        Partial aggregate in the detect_patterns format, without themes.
+        """
+        return {
+            "category_distribution": dict(self.category_counter),
+            "priority_distribution": dict(self.priority_counter),
+            "high_priority_count": self.high_priority_count,
+            "failed_count": self.failed_count,
+            "detected_themes": []
+        }
+
+    def finalize(self, theme_method="auto", theme_index=None):
+        """
+        Full aggregate in the detect_patterns format, including themes.
+        """
+        result = self.snapshot()
+        result["detected_themes"] = _resolve_themes(self.problem_counts, theme_method, theme_index)
+        return result
+
+
+def merge_states(states, max_tracked_problems=MAX_TRACKED_PROBLEMS):
+    """
+    Merges PatternAccumulator states (to_state() dicts) into one accumulator.
+
+    The counters are summed, which is associative and commutative, and
+    one-off problems are pruned once at the end, so the result does not
+    depend on the order in which shards finished or were re-run.
+    """
+    merged = PatternAccumulator(max_tracked_problems)
+    for state in states:
+        merged.merge(PatternAccumulator.from_state(state, max_tracked_problems), prune=False)
+    merged._prune()
+    return merged
+
+
+def detect_semantic_themes(problems, method="auto"):
+    """
+    Groups similar problems into semantic themes.
     Returns structured JSON themes list.
+
+    method:
+        "llm"        - one prompt containing every problem
+        "clustering" - embedding clusters named with one short call each
+        "auto"       - "llm" while the distinct problems fit in one prompt,
+                       "clustering" above that or when the prompt's JSON
+                       cannot be parsed
     """
 
     if not problems:
         return []
 
+    if method == "clustering":
+        return cluster_themes(problems)
+
+    if method == "auto" and len(set(problems)) > SINGLE_PROMPT_MAX_PROBLEMS:
+        return cluster_themes(problems)
+
+    themes = _detect_themes_single_prompt(problems)
+
+    if themes is None:
+        if method == "auto":
+            print("⚠️ Theme prompt could not be parsed; falling back to embedding clustering.")
+            record_event("agent2_themes", "clustering_fallback")
+            return cluster_themes(problems)
+        return []
+
+    return themes
+
+
+def _detect_themes_single_prompt(problems):
+    """
+    Uses one LLM prompt to group every problem into themes.
+    Returns None when the call fails or the JSON cannot be parsed.
+    """
+
+    # A Counter of problem occurrences is listed once per distinct problem
+    if isinstance(problems, Counter):
+        problems = list(problems)
+
     prompt = f"""
 You are a precise product issue clustering engine.
 
@@ -91,41 +258,27 @@ Problems:
 {problems}
 """
 
+    messages = [{"role": "user", "content": prompt}]
+
     try:
-        response = ollama.chat(
-            model="llama3",
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        content = response["message"]["content"].strip()
-
-        try:
-            parsed = json.loads(content)
-            return parsed.get("themes", [])
-        except Exception:
-            start = content.find("{")
-            end = content.rfind("}")
-
-            if start != -1 and end != -1:
-                json_string = content[start:end + 1]
-            else:
-                return []
-
-            json_string = json_string.replace("\n", " ")
-            json_string = json_string.replace(", }", " }")
-            json_string = json_string.replace(",}", "}")
-
-            if not json_string.strip().endswith("}"):
-                json_string += "}"
-
-            try:
-                parsed = json.loads(json_string)
-                return parsed.get("themes", [])
-            except Exception:
-                return []
+        response = schema_chat("agent2_themes", THEMES_SCHEMA, messages)
+        content = response["message"]["content"]
+        parsed = parse_json("agent2_themes", content)
+
+        # One targeted retry when the answer is unusable
+        if parsed is None or not isinstance(parsed.get("themes"), list):
+            record_event("agent2_themes", "parse_retry")
+            response = schema_chat("agent2_themes", THEMES_SCHEMA, retry_messages(messages, content))
+            parsed = parse_json("agent2_themes", response["message"]["content"])
 
     except Exception:
-        return []
+        return None
+
+    if parsed is None or not isinstance(parsed.get("themes"), list):
+        return None
+    return parsed["themes"]
+
+
 if __name__ == "__main__":
     sample_input = [
         {"problem": "App crashes on upload", "sentiment": "Negative", "category": "Bug", "priority": "High"},
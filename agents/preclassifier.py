@@ -0,0 +1,298 @@
+# preclassifier.py
+# Local Pre-Classifier for Agent 1
+# Purpose:
+# Handles feedback that is obviously classifiable without an LLM call:
+# - Rules: empty or punctuation-only lines ("", "???") and short pure
+#   praise ("Great job on the latest update")
+# - Model: a small softmax regression over hashed bag-of-words features,
+#   trained on Agent 1 results stored in the classification cache
+# Only confident "no problem" answers are handled locally; anything that
+# may describe a problem is escalated, since only the LLM can phrase it.
+# In agreement mode locally handled items are still sent to the LLM and
+# the two answers are compared.
+#
+# Usage:
+#   python -m agents.preclassifier train        # fit on .cache/agent1_classifications.sqlite
+
+import argparse
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from agents.classification_cache import ClassificationCache, normalize_feedback
+from agents.feedback_record import Category, FeedbackRecord, Priority, Sentiment
+from agents.instrumentation import record_event
+
+
+DEFAULT_MODEL_PATH = os.path.join(".cache", "preclassifier.npz")
+
+FEATURE_DIM = 2 ** 13
+
+# Rows turned into dense feature vectors at once (bounds memory to ~32 MB)
+FEATURE_BATCH_SIZE = 1024
+
+# Minimum predicted probability for the model to answer without the LLM
+DEFAULT_CONFIDENCE = 0.95
+
+# Label of every example whose Agent 1 result names a problem
+ESCALATE = "escalate"
+
+# Result for lines with no words at all
+EMPTY_RESULT = FeedbackRecord("None", Sentiment.NEUTRAL, Category.OTHER, Priority.LOW)
+PRAISE_RESULT = FeedbackRecord("None", Sentiment.POSITIVE, Category.OTHER, Priority.LOW)
+
+PRAISE_WORDS = {
+    "great", "love", "loving", "awesome", "amazing", "excellent", "nice", "good", "perfect",
+    "fantastic", "thanks", "thank", "wonderful", "helpful", "brilliant", "best", "cool"
+}
+
+# Words allowed next to praise. Anything else (e.g. "but", "crash") escalates.
+PRAISE_CONTEXT_WORDS = {
+    "a", "an", "the", "on", "of", "for", "to", "this", "it", "is", "so", "very", "really", "much",
+    "job", "work", "update", "latest", "new", "app", "ui", "team", "you", "guys", "feature",
+    "features", "keep", "up", "release", "design", "version", "i", "we", "my", "and", "all",
+    "just", "lot", "product", "experience", "interface", "what", "thing", "stuff"
+}
+
+
+def _words(normalized_text):
+    return re.findall(r"[a-z0-9']+", normalized_text)
+
+
+def rule_classify(feedback_text):
+    """
+    Returns an Agent 1 result for trivially classifiable feedback, else None.
+    """
+    words = _words(normalize_feedback(feedback_text))
+
+    if not words:
+        return EMPTY_RESULT
+
+    vocabulary = set(words)
+    if len(words) <= 12 and vocabulary & PRAISE_WORDS and vocabulary <= PRAISE_WORDS | PRAISE_CONTEXT_WORDS:
+        return PRAISE_RESULT
+
+    return None
+
+
+def feature_indices(text):
+    """
+    Hashed unigram + bigram indices of one feedback line.
+    """
+    words = _words(normalize_feedback(text))
+    tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return np.asarray([zlib.crc32(token.encode("utf-8")) % FEATURE_DIM for token in tokens], dtype=np.int64)
+
+
+def _densify(index_rows):
+    """
+    L2-normalized hashed count vectors, shape (len(index_rows), FEATURE_DIM).
+    """
+    features = np.zeros((len(index_rows), FEATURE_DIM), dtype=np.float32)
+    for row, indices in enumerate(index_rows):
+        np.add.at(features[row], indices, 1.0)
+
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return features / norms
+
+
+def _label(result):
+    if result.get("problem", "None") != "None":
+        return ESCALATE
+    return "|".join([result.get("sentiment", ""), result.get("category", ""), result.get("priority", "")])
+
+
+def _result(label):
+    sentiment, category, priority = label.split("|")
+    return FeedbackRecord("None", Sentiment(sentiment), Category(category), Priority(priority))
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class PreClassifier:
+    """
+    Rules plus an optional trained model in front of the Agent 1 LLM.
+
+    Parameters:
+        weights, bias, labels: Trained softmax regression (see train());
+            without them only the rules apply.
+        confidence (float): Minimum model probability for a local answer.
+        agreement (bool): Still send locally handled items to the LLM,
+            use the LLM answer, and count how often both agree.
+    """
+
+    def __init__(self, weights=None, bias=None, labels=None, confidence=DEFAULT_CONFIDENCE, agreement=False):
+        self.weights = weights
+        self.bias = bias
+        self.labels = labels or []
+        self.confidence = confidence
+        self.agreement = agreement
+        self.local = 0
+        self.escalated = 0
+        self.compared = 0
+        self.agreed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def train(cls, examples, epochs=30, learning_rate=5.0, l2=1e-4, batch_size=256, seed=0, **options):
+        """
+        Fits the model on (feedback, Agent 1 result) pairs, e.g.
+        ClassificationCache.training_examples().
+        """
+        texts = [feedback for feedback, _ in examples]
+        label_names = [_label(result) for _, result in examples]
+        labels = sorted(set(label_names))
+        if len(labels) < 2:
+            raise ValueError("Training needs examples of at least two different results")
+
+        targets = np.asarray([labels.index(name) for name in label_names])
+        index_rows = [feature_indices(text) for text in texts]
+        weights = np.zeros((FEATURE_DIM, len(labels)), dtype=np.float32)
+        bias = np.zeros(len(labels), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            for start in range(0, len(order), batch_size):
+                rows = order[start:start + batch_size]
+                features = _densify([index_rows[row] for row in rows])
+                probabilities = _softmax(features @ weights + bias)
+                probabilities[np.arange(len(rows)), targets[rows]] -= 1.0
+                probabilities /= len(rows)
+                weights -= learning_rate * (features.T @ probabilities + l2 * weights)
+                bias -= learning_rate * probabilities.sum(axis=0)
+
+        return cls(weights, bias, labels, **options)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH, **options):
+        """
+        Loads a trained model, or returns a rules-only PreClassifier when
+        no model has been trained yet.
+        """
+        if not os.path.exists(path):
+            return cls(**options)
+
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"], [str(label) for label in data["labels"]], **options)
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, weights=self.weights, bias=self.bias, labels=np.asarray(self.labels, dtype=str))
+        os.replace(temp_path, path)
+
+    def predict(self, feedback_batch):
+        """
+        Local answers for a batch of feedback lines.
+
+        Returns:
+            list[FeedbackRecord | None]: Agent 1 result per line, or None where the
+                               line should go to the LLM.
+        """
+        answers = [rule_classify(text) for text in feedback_batch]
+
+        if self.weights is not None:
+            open_rows = [row for row, answer in enumerate(answers) if answer is None]
+            for start in range(0, len(open_rows), FEATURE_BATCH_SIZE):
+                rows = open_rows[start:start + FEATURE_BATCH_SIZE]
+                features = _densify([feature_indices(feedback_batch[row]) for row in rows])
+                probabilities = _softmax(features @ self.weights + self.bias)
+                best = probabilities.argmax(axis=1)
+                for row, label_index, probability in zip(rows, best, probabilities.max(axis=1)):
+                    label = self.labels[label_index]
+                    if label != ESCALATE and probability >= self.confidence:
+                        answers[row] = _result(label)
+
+        local = sum(answer is not None for answer in answers)
+        with self._lock:
+            self.local += local
+            self.escalated += len(answers) - local
+        record_event("preclassifier", "local", local)
+        record_event("preclassifier", "escalated", len(answers) - local)
+
+        return answers
+
+    def record_agreement(self, local_answers, llm_results):
+        """
+        Compares local answers with LLM results for the same lines.
+        """
+        compared = agreed = 0
+        for local, llm in zip(local_answers, llm_results):
+            if local is None or llm.get("problem") in ("API Failure", "Parsing Error"):
+                continue
+            compared += 1
+            agreed += _label(local) == _label(llm)
+
+        with self._lock:
+            self.compared += compared
+            self.agreed += agreed
+        record_event("preclassifier", "compared", compared)
+        record_event("preclassifier", "agreed", agreed)
+
+    def stats(self):
+        with self._lock:
+            total = self.local + self.escalated
+            stats = {
+                "model": "trained" if self.weights is not None else "rules only",
+                "local": self.local,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / total, 3) if total else 0.0
+            }
+            if self.agreement:
+                stats["compared"] = self.compared
+                stats["agreement_rate"] = round(self.agreed / self.compared, 3) if self.compared else 0.0
+            return stats
+
+
+def open_preclassifier(preclassify=True, path=DEFAULT_MODEL_PATH):
+    """
+    Returns a PreClassifier for the pipeline, or None when disabled.
+
+    preclassify: False disables the local tier, True enables it, and
+                 "agreement" enables it in agreement-measuring mode.
+    """
+    if not preclassify:
+        return None
+    return PreClassifier.load(path, agreement=preclassify == "agreement")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the Agent 1 pre-classifier on cached results.")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--cache", default=None, help="classification cache to train on")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    args = parser.parse_args()
+
+    cache = ClassificationCache(args.cache) if args.cache else ClassificationCache()
+    examples = cache.training_examples()
+    cache.close()
+
+    # Hold out every fifth example to estimate agreement with the LLM
+    train_examples = [example for index, example in enumerate(examples) if index % 5]
+    holdout = [example for index, example in enumerate(examples) if not index % 5]
+
+    model = PreClassifier.train(train_examples, confidence=args.confidence)
+    answers = model.predict([feedback for feedback, _ in holdout])
+    model.agreement = True
+    model.record_agreement(answers, [result for _, result in holdout])
+    print(f"Trained on {len(train_examples)} cached results; holdout: {model.stats()}")
+
+    model.save(args.output)
+    print(f"Saved pre-classifier to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
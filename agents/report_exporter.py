@@ -0,0 +1,35 @@
+# report_exporter.py
+# Executive Memo PDF Export
+
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+
+def generate_pdf(memo_text):
+    """
+    Renders the Agent 3 memo as a PDF report.
+
+    The memo is plain text: Paragraph reads its input as markup, so "<" and
+    "&" are escaped, and blank lines separate paragraphs.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    elements.append(Paragraph("AI Feedback Intelligence Report", styles["Heading1"]))
+    elements.append(Spacer(1, 0.3 * inch))
+    for block in str(memo_text).split("\n\n"):
+        if block.strip():
+            elements.append(Paragraph(escape(block.strip()).replace("\n", "<br/>"), styles["Normal"]))
+            elements.append(Spacer(1, 0.1 * inch))
+
+    doc.build(elements)
+    return buffer.getvalue()
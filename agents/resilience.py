@@ -0,0 +1,327 @@
+# resilience.py
+# Retry, Circuit Breaker and Adaptive Concurrency for LLM Calls
+# Purpose:
+# Wraps every LLM call (see llm_chat / llm_embed in agents/llm_backend.py)
+# so a briefly saturated model server slows the pipeline down instead of
+# turning requests into "API Failure" records:
+# - transient errors (connection errors, timeouts, 429/5xx) are retried
+#   with exponential backoff and full jitter
+# - a circuit breaker per backend fails calls fast after repeated
+#   failures, then lets one probe call through after a cool-down
+# - an AIMD limiter adapts the backend's concurrency: +1/limit per good
+#   call, halved on errors or when latency rises well above its baseline
+#
+# Usage:
+#   resilience = Resilience(max_concurrency=4)
+#   response = resilience.call("agent1", lambda: backend.chat(**kwargs))
+#   resilience.stats()          # limit, circuit state, retries
+
+import random
+import threading
+import time
+
+import httpx
+import ollama
+
+from agents.instrumentation import record_event
+
+
+# HTTP statuses worth retrying: timeouts, rate limiting, server errors
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised instead of calling a backend whose circuit is open.
+    """
+
+
+def is_retryable(error):
+    """
+    True for errors a later attempt may not hit again.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt n waits a uniform random
+    time in [0, min(max_delay, base_delay * 2**n)).
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=10.0):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open, calls
+    raise CircuitOpenError; after reset_seconds one probe call is let
+    through ("half-open") and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probing = False
+
+            if self.state == "open" or (self.state == "half_open" and self._probing):
+                raise CircuitOpenError(
+                    f"LLM circuit open after {self.failures} consecutive failures; "
+                    f"retrying in {max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at)):.0f}s"
+                )
+            if self.state == "half_open":
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_answer(self, error):
+        """
+        Outcome of a call that failed with a non-retryable error. An error
+        answer from the server (e.g. 404 for a missing model) shows it is
+        up, so it counts as a success; anything else only frees the probe
+        slot, so a half-open circuit lets the next call probe again.
+        """
+        if isinstance(error, ollama.ResponseError):
+            self.record_success()
+            return
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"⚠️ LLM circuit opened after {self.failures} consecutive failures.")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit between min_limit and max_limit.
+
+    Each successful call raises the limit by 1/limit (about +1 per round of
+    calls). An error, or a latency above latency_tolerance times the call
+    site's baseline, halves it, at most once per baseline latency so one
+    burst of slow calls counts as one congestion signal.
+    """
+
+    def __init__(self, max_limit, min_limit=1, latency_tolerance=2.0):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("need 1 <= min_limit <= max_limit")
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._baselines = {}
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, call_site, seconds=None, overloaded=False):
+        """
+        Frees a slot and adjusts the limit. seconds is the call's latency
+        (None for calls whose latency says nothing, e.g. streams).
+        """
+        with self._condition:
+            self.in_flight -= 1
+            baseline = self._baselines.get(call_site)
+
+            if seconds is not None:
+                if baseline is None:
+                    self._baselines[call_site] = baseline = seconds
+                elif seconds > self.latency_tolerance * baseline:
+                    overloaded = True
+                    # The baseline drifts up slowly, so a slower model is eventually the norm
+                    self._baselines[call_site] = 0.99 * baseline + 0.01 * seconds
+                else:
+                    self._baselines[call_site] = 0.9 * baseline + 0.1 * seconds
+
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= (baseline or 0.0):
+                    self.limit = max(float(self.min_limit), self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
+
+
+class Resilience:
+    """
+    Retry policy, circuit breaker and (optionally) adaptive limiter for
+    one backend.
+
+    Parameters:
+        max_concurrency (int, optional): Upper bound for the AIMD limiter;
+            None disables the limiter.
+    """
+
+    def __init__(self, max_concurrency=None, retry=None, breaker=None):
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = AdaptiveLimiter(max_concurrency) if max_concurrency else None
+        self.retries = 0
+
+    def call(self, call_site, attempt, max_attempts=None):
+        """
+        Runs attempt() with retries, the circuit breaker and the limiter.
+        max_attempts overrides the retry policy's, e.g. 1 for a call with
+        its own deadline.
+        """
+        max_attempts = max_attempts or self.retry.max_attempts
+        for number in range(max_attempts):
+            self.breaker.before_call()
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            started = time.perf_counter()
+            try:
+                response = attempt()
+            except Exception as e:
+                retryable = is_retryable(e)
+                if self.limiter is not None:
+                    self.limiter.release(call_site, overloaded=retryable)
+                if not retryable:
+                    self.breaker.record_answer(e)
+                    raise
+                self.breaker.record_failure()
+                if number + 1 == max_attempts:
+                    raise
+                self._wait_before_retry(call_site, number)
+                continue
+
+            if self.limiter is not None:
+                self.limiter.release(call_site, time.perf_counter() - started)
+            self.breaker.record_success()
+            return response
+
+    def stream(self, call_site, attempt):
+        """
+        Like call() for a streamed answer. Only the request and its first
+        chunk are retried; the limiter slot is held until the last chunk.
+        """
+        for number in range(self.retry.max_attempts):
+            self.breaker.before_call()
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            try:
+                chunks = iter(attempt())
+                first = next(chunks, None)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if self.limiter is not None:
+                    self.limiter.release(call_site, overloaded=retryable)
+                if not retryable:
+                    self.breaker.record_answer(e)
+                    raise
+                self.breaker.record_failure()
+                if number + 1 == self.retry.max_attempts:
+                    raise
+                self._wait_before_retry(call_site, number)
+                continue
+
+            self.breaker.record_success()
+            return self._held_stream(call_site, first, chunks)
+
+    def _held_stream(self, call_site, first, chunks):
+        if self.limiter is None:
+            return _prepend(first, chunks)
+        return HeldStream(self.limiter, call_site, first, chunks)
+
+    def _wait_before_retry(self, call_site, number):
+        self.retries += 1
+        record_event(call_site, "retry")
+        time.sleep(self.retry.delay(number))
+
+    def stats(self):
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "concurrency_limit": round(self.limiter.limit, 2) if self.limiter else None,
+            "retries": self.retries
+        }
+
+
+def _prepend(first, chunks):
+    if first is not None:
+        yield first
+    yield from chunks
+
+
+class HeldStream:
+    """
+    Chunks of a streamed answer that hold a limiter slot until the last
+    chunk, an error, close() or garbage collection, whichever comes first,
+    so a stream the caller drops unread still frees its slot.
+    """
+
+    def __init__(self, limiter, call_site, first, chunks):
+        self._limiter = limiter
+        self._call_site = call_site
+        self._chunks = _prepend(first, chunks)
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self._release()
+            raise
+        except Exception:
+            self._release(overloaded=True)
+            raise
+
+    def close(self):
+        self._chunks.close()
+        self._release()
+
+    def __del__(self):
+        self._release()
+
+    def _release(self, overloaded=False):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._limiter.release(self._call_site, overloaded=overloaded)
@@ -0,0 +1,283 @@
+# result_columns.py
+# Columnar Agent 1 Results
+# Purpose:
+# Stores Agent 1 results as NumPy columns instead of a list of dicts:
+# - sentiment, category and priority as small integer codes into a
+#   per-column vocabulary (unknown labels extend the vocabulary)
+# - problem statements interned once, referenced by integer code
+# - an optional float timestamp (Unix seconds) per result
+# Failed lines ("API Failure" / "Parsing Error" records) are not data: their
+# rows keep no labels and are only counted in `failed`.
+# Aggregations (distributions, group-bys, time windows) are bincounts over
+# these arrays, so millions of results cost a few bytes each.
+#
+# Usage:
+#   columns = ResultColumns.from_records(agent1_results, timestamps)
+#   columns.distribution("category")                # {"Bug": 6, ...}
+#   columns.group_by("sentiment", "category", "priority")
+#   columns.window_counts(3600, "priority")         # hourly priority counts
+
+from collections import Counter
+from operator import attrgetter
+
+import numpy as np
+
+from agents.feedback_record import FAILURE_PROBLEMS, FeedbackRecord
+from agents.structured_output import CATEGORIES, PRIORITIES, SENTIMENTS
+
+
+LABEL_COLUMNS = ("sentiment", "category", "priority")
+
+INITIAL_VOCABULARY = {"sentiment": SENTIMENTS, "category": CATEGORIES, "priority": PRIORITIES}
+
+# Code of a missing or empty label / a "None" problem; such rows are not counted
+MISSING = -1
+
+CODE_DTYPE = np.int16
+PROBLEM_DTYPE = np.int32
+
+# Rows counted per np.bincount call; bincount widens codes to int64,
+# so counting in blocks keeps that copy small
+COUNT_BLOCK_ROWS = 1 << 18
+
+
+def _bincount(codes, size):
+    counts = np.zeros(size, dtype=np.int64)
+    for start in range(0, len(codes), COUNT_BLOCK_ROWS):
+        block = codes[start:start + COUNT_BLOCK_ROWS]
+        counts += np.bincount(block[block != MISSING], minlength=size)
+    return counts
+
+
+class _Vocabulary(dict):
+    """
+    Label -> code map that assigns the next code to each new label
+    (and MISSING to empty ones) on lookup.
+    """
+
+    def __init__(self, values, missing=("",)):
+        super().__init__((value, code) for code, value in enumerate(values))
+        self.values = list(values)
+        self.missing = set(missing)
+
+    def __missing__(self, value):
+        if not value or value in self.missing:
+            code = MISSING
+        else:
+            code = len(self.values)
+            self.values.append(value)
+        self[value] = code
+        return code
+
+    def encode(self, values, count, dtype):
+        return np.fromiter(map(self.__getitem__, values), dtype=dtype, count=count)
+
+
+class ResultColumns:
+    """
+    Agent 1 results in columnar form.
+
+    Rows are appended in chunks with extend(); the chunks are joined into
+    one array per column the first time a column is read.
+    """
+
+    def __init__(self):
+        self._vocabularies = {name: _Vocabulary(values) for name, values in INITIAL_VOCABULARY.items()}
+        # The failure problems take the first problem codes, so failed rows are code < len(FAILURE_PROBLEMS)
+        self._problems = _Vocabulary(FAILURE_PROBLEMS, missing=("None",))
+        self.vocabularies = {name: vocabulary.values for name, vocabulary in self._vocabularies.items()}
+        self.problems = self._problems.values
+        self._chunks = {name: [] for name in LABEL_COLUMNS + ("problem", "timestamp")}
+        self._columns = None
+        self.failed = 0
+
+    @classmethod
+    def from_records(cls, agent1_results, timestamps=None):
+        columns = cls()
+        columns.extend(agent1_results, timestamps)
+        return columns
+
+    def __len__(self):
+        return len(self.column("priority"))
+
+    def extend(self, agent1_results, timestamps=None):
+        """
+        Appends Agent 1 results (FeedbackRecords or dicts), with optional
+        per-result timestamps (Unix seconds; rows without one are left out
+        of window_counts). Timestamps default to those on the records.
+        """
+        results = agent1_results if isinstance(agent1_results, list) else list(agent1_results)
+
+        # Records are read by attribute, which is much faster than record.get()
+        if all(type(item) is FeedbackRecord for item in results):
+            def values(name):
+                return map(attrgetter(name), results)
+
+            # Without explicit timestamps, the records' own timestamps are used
+            if timestamps is None and any(item.timestamp is not None for item in results):
+                timestamps = [np.nan if item.timestamp is None else item.timestamp for item in results]
+        else:
+            def values(name):
+                return (item.get(name) for item in results)
+
+        label_codes = [
+            self._vocabularies[name].encode(values(name), len(results), CODE_DTYPE) for name in LABEL_COLUMNS
+        ]
+        problem_codes = self._problems.encode(values("problem"), len(results), PROBLEM_DTYPE)
+
+        # Failed rows are blanked out, so no aggregation counts them
+        failed = (problem_codes >= 0) & (problem_codes < len(FAILURE_PROBLEMS))
+        if failed.any():
+            self.failed += int(np.count_nonzero(failed))
+            problem_codes[failed] = MISSING
+            for codes in label_codes:
+                codes[failed] = MISSING
+
+        for name, codes in zip(LABEL_COLUMNS, label_codes):
+            self._chunks[name].append(codes)
+        self._chunks["problem"].append(problem_codes)
+
+        # Untimed chunks are stored as their length and only expanded to NaN if read
+        if timestamps is None:
+            self._chunks["timestamp"].append(len(results))
+        else:
+            timestamps = np.array(timestamps, dtype=np.float64)
+            # Failed rows have no window either, so window_counts() skips them
+            timestamps[failed] = np.nan
+            self._chunks["timestamp"].append(timestamps)
+
+        self._columns = None
+        return self
+
+    def column(self, name):
+        """
+        The full code array of a column ("sentiment", "category", "priority",
+        "problem") or the timestamp array.
+        """
+        if self._columns is None:
+            self._columns = {}
+            for key, chunks in self._chunks.items():
+                if len(chunks) > 1 and key != "timestamp":
+                    chunks[:] = [np.concatenate(chunks)]
+                self._columns[key] = chunks[0] if chunks else np.empty(0, dtype=CODE_DTYPE)
+
+        if name == "timestamp":
+            return self._timestamps()
+        return self._columns[name]
+
+    def _timestamps(self):
+        chunks = self._chunks["timestamp"]
+        if len(chunks) != 1 or not isinstance(chunks[0], np.ndarray):
+            chunks[:] = [np.concatenate(
+                [np.full(chunk, np.nan) if isinstance(chunk, int) else chunk for chunk in chunks]
+            ) if chunks else np.empty(0)]
+        return chunks[0]
+
+    def distribution(self, name):
+        """
+        Counts per label, in order of first appearance, as detect_patterns reports them.
+        """
+        codes = self.column(name)
+        counts = _bincount(codes, len(self.vocabularies[name]))
+        seen = np.flatnonzero(counts)
+        first_rows = [int(np.argmax(codes == code)) for code in seen]
+        vocabulary = self.vocabularies[name]
+        return {vocabulary[seen[index]]: int(counts[seen[index]]) for index in np.argsort(first_rows)}
+
+    def count(self, name, value):
+        code = self._vocabularies[name].get(value, MISSING)
+        if code == MISSING:
+            return 0
+        return int(np.count_nonzero(self.column(name) == code))
+
+    def group_by(self, *names):
+        """
+        Row counts per combination of labels, e.g.
+        group_by("sentiment", "category", "priority")
+            -> {("Negative", "Bug", "High"): 12, ...}
+        Rows missing any of the labels are skipped.
+        """
+        codes, counts = self._group_counts(names)
+        return {self._labels(names, combination): int(count) for *combination, count in zip(*codes, counts)}
+
+    def window_counts(self, window_seconds, *names):
+        """
+        Row counts per time window, optionally split by labels.
+
+        Returns:
+            dict: window start (Unix seconds) -> count, or, with names,
+                  window start -> {label (or label tuple): count}
+        """
+        timestamps = self.column("timestamp")
+        timed = ~np.isnan(timestamps)
+        windows = np.full(len(timestamps), MISSING, dtype=np.int64)
+        windows[timed] = np.floor(timestamps[timed] / window_seconds).astype(np.int64)
+
+        # Window numbers relative to the first window, so they index from 0
+        first = int(windows[timed].min()) if timed.any() else 0
+        windows[timed] -= first
+
+        codes, counts = self._group_counts(names, windows)
+        result = {}
+        for window, *combination, count in zip(*codes, counts):
+            start = float((int(window) + first) * window_seconds)
+            if not names:
+                result[start] = int(count)
+                continue
+            labels = self._labels(names, combination)
+            result.setdefault(start, {})[labels[0] if len(names) == 1 else labels] = int(count)
+        return result
+
+    def _group_counts(self, names, windows=None):
+        """
+        Per-combination code arrays and counts over rows that have every
+        label (and a window, when windows are given).
+        """
+        columns = [self.column(name) for name in names]
+        sizes = [len(self.vocabularies[name]) for name in names]
+        if windows is not None:
+            columns.insert(0, windows)
+            sizes.insert(0, max(int(windows.max()) + 1, 1) if len(windows) else 1)
+
+        keep = np.ones(len(self), dtype=bool)
+        for codes in columns:
+            keep &= codes != MISSING
+
+        combined = np.ravel_multi_index([codes[keep] for codes in columns], sizes)
+        keys, counts = np.unique(combined, return_counts=True)
+        return np.unravel_index(keys, sizes), counts
+
+    def _labels(self, names, codes):
+        return tuple(self.vocabularies[name][int(code)] for name, code in zip(names, codes))
+
+    def problem_counts(self):
+        """
+        Counter of valid problem statements (rows whose problem is not "None").
+        """
+        counts = _bincount(self.column("problem"), len(self.problems))
+        return Counter({self.problems[code]: int(count) for code, count in enumerate(counts) if count})
+
+    def aggregate(self):
+        """
+        The counter part of the detect_patterns output (no themes).
+        """
+        return {
+            "category_distribution": self.distribution("category"),
+            "priority_distribution": self.distribution("priority"),
+            "high_priority_count": self.count("priority", "High"),
+            "failed_count": self.failed
+        }
+
+
+if __name__ == "__main__":
+    sample_input = [
+        {"problem": "App crashes on upload", "sentiment": "Negative", "category": "Bug", "priority": "High"},
+        {"problem": "Upload fails for large file", "sentiment": "Negative", "category": "Bug", "priority": "High"},
+        {"problem": "None", "sentiment": "Positive", "category": "Other", "priority": "Low"},
+        {"problem": "Dashboard loads slowly", "sentiment": "Negative", "category": "Performance", "priority": "Medium"}
+    ]
+
+    columns = ResultColumns.from_records(sample_input, timestamps=[0, 1800, 3600, 7300])
+    print(columns.aggregate())
+    print(columns.group_by("sentiment", "category", "priority"))
+    print(columns.window_counts(3600, "priority"))
@@ -0,0 +1,139 @@
+# retry_queue.py
+# Deferred Retry of Failed Agent 1 Lines
+# Purpose:
+# Lines whose Agent 1 call failed (even after the backend's retries) are
+# not counted as data (see FeedbackRecord.failed). This module gives them
+# a second chance:
+# - retry_failures() re-runs them once after the main pass, when a
+#   briefly saturated server has usually recovered
+# - lines that still fail are appended to a persistent JSONL queue, which
+#   can be exported and streamed through the pipeline later
+#
+# Usage:
+#   results = retry_failures(lines, results, analyze_lines, RetryQueue(), run_id="2024-06-01")
+#   python -m agents.retry_queue export retry.jsonl
+#   python streaming_pipeline.py retry.jsonl --column feedback
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from agents.instrumentation import record_event
+
+
+DEFAULT_QUEUE_PATH = os.path.join(".cache", "retry_queue.jsonl")
+
+
+class RetryQueue:
+    """
+    Append-only JSONL file of failed feedback lines:
+    {"feedback": ..., "problem": "API Failure", "run_id": ..., "queued_at": ...}
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def add(self, lines, results, run_id=None):
+        queued_at = time.time()
+        with self._lock, open(self.path, "a", encoding="utf-8") as handle:
+            for line, result in zip(lines, results):
+                handle.write(json.dumps({
+                    "feedback": line,
+                    "problem": result["problem"],
+                    "run_id": run_id,
+                    "queued_at": queued_at
+                }) + "\n")
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        with self._lock, open(self.path, encoding="utf-8") as handle:
+            return sum(1 for line in handle if line.strip())
+
+    def export(self, destination):
+        """
+        Moves the queued entries to `destination` (a JSONL file with a
+        "feedback" field) and empties the queue.
+
+        Returns:
+            int: Entries moved.
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                return 0
+            os.replace(self.path, destination)
+
+        with open(destination, encoding="utf-8") as handle:
+            return sum(1 for line in handle if line.strip())
+
+
+def retry_failures(feedback_list, results, analyze_lines, queue=None, run_id=None):
+    """
+    Deferred retry pass over the failed results of an Agent 1 run.
+
+    Parameters:
+        feedback_list (list[str]): The input lines.
+        results (list[FeedbackRecord]): Agent 1 results for feedback_list.
+        analyze_lines (callable): list[str] -> list[FeedbackRecord].
+        queue (RetryQueue, optional): Receives the lines that fail again.
+
+    Returns:
+        list[FeedbackRecord]: results with the recovered lines replaced.
+    """
+    failed = [index for index, result in enumerate(results) if result.failed]
+    if not failed:
+        return results
+
+    print(f"Retrying {len(failed)} failed line(s)...")
+    record_event("agent1", "deferred_retry", len(failed))
+
+    retried = analyze_lines([feedback_list[index] for index in failed])
+    results = list(results)
+    still_failed = []
+    for index, result in zip(failed, retried):
+        results[index] = result
+        if result.failed:
+            still_failed.append(index)
+
+    recovered = len(failed) - len(still_failed)
+    if recovered:
+        record_event("agent1", "deferred_retry_recovered", recovered)
+
+    if still_failed:
+        print(f"⚠️ {len(still_failed)} line(s) still failing; they are excluded from the counts.")
+        if queue is not None:
+            queue.add([feedback_list[index] for index in still_failed], [results[index] for index in still_failed], run_id)
+            print(f"Queued them in {queue.path}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export the queue of failed Agent 1 lines.")
+    parser.add_argument("command", choices=["count", "export"])
+    parser.add_argument("destination", nargs="?", help="JSONL file to move the queued lines to (export)")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH)
+    args = parser.parse_args()
+
+    queue = RetryQueue(args.queue)
+    if args.command == "count":
+        print(f"{len(queue)} queued line(s) in {queue.path}")
+        return
+
+    if not args.destination:
+        parser.error("export needs a destination file")
+    moved = queue.export(args.destination)
+    print(f"Moved {moved} line(s) to {args.destination}")
+    if moved:
+        print(f"Re-run them with: python streaming_pipeline.py {args.destination} --column feedback")
+
+
+if __name__ == "__main__":
+    main()
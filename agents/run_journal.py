@@ -0,0 +1,132 @@
+# run_journal.py
+# Checkpointed, Resumable Agent 1 Runs
+# Purpose:
+# Writes each completed chunk of a run to an append-only JSONL journal:
+# - the Agent 1 results for the chunk
+# - the Agent 2 counter state for the chunk (PatternAccumulator.to_state)
+# - a fingerprint of the chunk's input lines
+# Re-running with the same run ID replays the journaled chunks instead of
+# calling the LLM again, then continues with the remaining input.
+
+import hashlib
+import json
+import os
+from itertools import islice
+
+from agents.feedback_record import as_record
+from agents.patterndetector import PatternAccumulator
+
+
+DEFAULT_JOURNAL_DIR = os.path.join(".cache", "runs")
+DEFAULT_CHECKPOINT_SIZE = 200
+
+
+def _fingerprint(lines):
+    return hashlib.sha256(json.dumps(lines).encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """
+    Append-only journal of completed chunks for one run ID.
+    """
+
+    def __init__(self, run_id, directory=DEFAULT_JOURNAL_DIR):
+        if not run_id or os.sep in str(run_id):
+            raise ValueError("run_id must be a non-empty name without path separators")
+
+        os.makedirs(directory, exist_ok=True)
+        self.run_id = run_id
+        self.path = os.path.join(directory, f"{run_id}.jsonl")
+        self.completed_items = 0
+        self._repair()
+
+    def _repair(self):
+        """
+        Drops a partially written last record left behind by a crash,
+        so later appends start on a clean line.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        valid_bytes = 0
+        with open(self.path, "rb") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                valid_bytes += len(line)
+                self.completed_items += record["size"]
+
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, "r+b") as handle:
+                handle.truncate(valid_bytes)
+
+    def records(self):
+        """
+        Yields journaled chunk records in order.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding="utf-8") as handle:
+            for line in handle:
+                yield json.loads(line)
+
+    def append(self, lines, results, state):
+        record = {
+            "size": len(lines),
+            "input_hash": _fingerprint(lines),
+            "results": [dict(result) for result in results],
+            "state": state
+        }
+
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(record) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        self.completed_items += len(lines)
+
+
+def iter_journaled_chunks(feedback_iterable, journal, analyze_chunk, chunk_size=DEFAULT_CHECKPOINT_SIZE):
+    """
+    Runs analyze_chunk over the input in chunks, journaling each one.
+    Chunks already in the journal are replayed without calling analyze_chunk.
+
+    Parameters:
+        feedback_iterable (iterable[str]): Raw feedback lines.
+        journal (RunJournal): Journal for this run.
+        analyze_chunk (callable): list[str] -> list of Agent 1 results (FeedbackRecord or dict).
+        chunk_size (int): Feedback lines per checkpoint.
+
+    Yields:
+        tuple: (results, state, resumed) per chunk, where state is the chunk's
+               PatternAccumulator state and resumed is True for replayed chunks.
+    """
+    iterator = iter(feedback_iterable)
+
+    for record in journal.records():
+        lines = list(islice(iterator, record["size"]))
+        if _fingerprint(lines) != record["input_hash"]:
+            raise ValueError(
+                f"Input does not match the journal for run {journal.run_id!r}; "
+                "use a new run ID for different feedback"
+            )
+        yield [as_record(result) for result in record["results"]], record["state"], True
+
+    while True:
+        lines = list(islice(iterator, chunk_size))
+        if not lines:
+            return
+
+        results = analyze_chunk(lines)
+
+        accumulator = PatternAccumulator()
+        accumulator.update(results)
+        state = accumulator.to_state()
+
+        journal.append(lines, results, state)
+        yield results, state, False
@@ -0,0 +1,148 @@
+# sqlite_cache.py
+# SQLite LRU Table Shared by the Persistent Caches
+# Purpose:
+# The Agent 1 classification cache and the insight memo cache store the
+# same kind of entry: a value under a hashed key, with its creation and
+# last-use times. This base class owns that table:
+# - lookups treat entries older than max_age_seconds as misses and
+#   refresh last_used on a hit
+# - every EVICT_EVERY stores (and on close) expired entries are removed,
+#   then the least recently used ones above max_entries
+# - hit/miss counters for stats()
+# Subclasses name the table and its value columns, and build the keys.
+
+import os
+import sqlite3
+import threading
+import time
+
+
+# Stores between two eviction passes
+EVICT_EVERY = 1000
+
+
+class SQLiteCache:
+    """
+    Base class for a SQLite table of key -> value columns with LRU and
+    max-age eviction.
+
+    Subclasses set:
+        table (str): Table name.
+        columns (str): Value column definitions, e.g. "memo TEXT NOT NULL".
+        commit_touches (bool): Commit the last_used update of every hit.
+            Off for hot caches, whose updates are committed with the next store.
+    """
+
+    table = None
+    columns = None
+    commit_touches = False
+
+    def __init__(self, path, max_entries, max_age_seconds):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                {self.columns},
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._migrate()
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table} (last_used)")
+        self._conn.commit()
+
+    def _migrate(self):
+        """
+        Hook for subclasses to upgrade tables created by older versions.
+        """
+
+    def _lookup(self, key, columns):
+        """
+        Returns the row of `columns` stored under key, or None on a miss.
+        """
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT created_at, {columns} FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[0] > self.max_age_seconds:
+                self.misses += 1
+                return None
+
+            self._conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+            if self.commit_touches:
+                self._conn.commit()
+            self.hits += 1
+
+        return row[1:]
+
+    def _store(self, key, values):
+        """
+        Inserts or replaces the entry under key; values maps column -> value.
+        """
+        now = time.time()
+        names = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, {names}, created_at, last_used) "
+                f"VALUES (?, {placeholders}, ?, ?)",
+                (key, *values.values(), now, now)
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+
+        if self._puts_since_evict >= EVICT_EVERY:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes expired entries, then least recently used entries above max_entries.
+        """
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            self._conn.execute(
+                f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+            self._conn.commit()
+            self._puts_since_evict = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries
+        }
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,287 @@
+# structured_output.py
+# Schema-Constrained LLM Output
+# Purpose:
+# Replaces the string-replace JSON repair chains in the agents:
+# - Sends a JSON schema as Ollama's `format`, so the server constrains
+#   decoding to valid JSON of the expected shape (servers without schema
+#   support get plain JSON mode instead)
+# - Parses answers with json.loads, falling back to a single-pass tolerant
+#   parser for the rare malformed answer (bare words, single quotes,
+#   trailing commas, output cut off mid-object)
+# - Builds a targeted retry prompt when an answer still cannot be used
+# Parse failures, repairs, retries and repair time are recorded per call site.
+
+import json
+import time
+
+import ollama
+
+from agents.instrumentation import record_duration, record_event
+from agents.llm_backend import llm_chat
+
+
+SENTIMENTS = ["Positive", "Neutral", "Negative"]
+CATEGORIES = ["Bug", "Feature Request", "UX Issue", "Performance", "Other"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+FEEDBACK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "problem": {"type": "string"},
+        "sentiment": {"type": "string", "enum": SENTIMENTS},
+        "category": {"type": "string", "enum": CATEGORIES},
+        "priority": {"type": "string", "enum": PRIORITIES}
+    },
+    "required": ["problem", "sentiment", "category", "priority"]
+}
+
+FEEDBACK_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"index": {"type": "integer"}, **FEEDBACK_SCHEMA["properties"]},
+        "required": ["index"] + FEEDBACK_SCHEMA["required"]
+    }
+}
+
+THEMES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "themes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "theme": {"type": "string"},
+                    "related_problems": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["theme", "related_problems"]
+            }
+        }
+    },
+    "required": ["themes"]
+}
+
+THEME_NAME_SCHEMA = {
+    "type": "object",
+    "properties": {"theme": {"type": "string"}},
+    "required": ["theme"]
+}
+
+THEME_DIGESTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "digests": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"theme": {"type": "string"}, "digest": {"type": "string"}},
+                "required": ["theme", "digest"]
+            }
+        }
+    },
+    "required": ["digests"]
+}
+
+SENTIMENT_SCHEMA = {
+    "type": "object",
+    "properties": {"sentiment": {"type": "string", "enum": SENTIMENTS}},
+    "required": ["sentiment"]
+}
+
+# Cleared the first time the server rejects a schema `format`
+_schema_format_supported = True
+
+
+def schema_chat(call_site, schema, messages, client=None, **chat_kwargs):
+    """
+    llm_chat with decoding constrained to `schema`.
+
+    Servers that reject schema formats (Ollama < 0.5) are detected once,
+    after which plain JSON mode is requested instead.
+    """
+    global _schema_format_supported
+
+    if _schema_format_supported:
+        try:
+            return llm_chat(call_site, client, messages=messages, format=schema, **chat_kwargs)
+        except ollama.ResponseError as e:
+            if e.status_code != 400:
+                raise
+            print("⚠️ Server rejected the JSON schema format; using plain JSON mode.")
+            _schema_format_supported = False
+            record_event(call_site, "schema_unsupported")
+
+    return llm_chat(call_site, client, messages=messages, format="json", **chat_kwargs)
+
+
+def parse_json(call_site, content, expected_type=dict):
+    """
+    Parses an LLM answer into a value of expected_type (dict or list).
+
+    Tries json.loads first and the tolerant parser second. Returns None,
+    and records a "parse_failure" event, when neither yields that type.
+    """
+    content = (content or "").strip()
+
+    try:
+        parsed = json.loads(content)
+        if isinstance(parsed, expected_type):
+            return parsed
+    except ValueError:
+        pass
+
+    started = time.perf_counter()
+    parsed = tolerant_loads(content, "{" if expected_type is dict else "[")
+    record_duration(call_site, "repair_seconds", time.perf_counter() - started)
+
+    if isinstance(parsed, expected_type):
+        record_event(call_site, "json_repair")
+        return parsed
+
+    record_event(call_site, "parse_failure")
+    return None
+
+
+def retry_messages(messages, bad_content, problem="was not valid JSON in the required format"):
+    """
+    Messages for one targeted retry: the original conversation, the
+    rejected answer, and a short correction request.
+    """
+    return list(messages) + [
+        {"role": "assistant", "content": bad_content or ""},
+        {"role": "user", "content": f"Your previous answer {problem}. "
+                                    "Reply again with ONLY the corrected JSON."}
+    ]
+
+
+_BARE_WORDS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": "None"}
+
+
+class _TolerantParser:
+    """
+    Single left-to-right pass over possibly malformed JSON.
+
+    Accepts unquoted words and single-quoted strings, ignores stray and
+    trailing commas, and closes whatever is still open when the text
+    ends, so a truncated answer keeps every complete field.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def _peek(self):
+        self._skip_whitespace()
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def _skip_whitespace(self):
+        while self.pos < len(self.text) and self.text[self.pos] in " \t\r\n":
+            self.pos += 1
+
+    def value(self):
+        char = self._peek()
+        if char == "{":
+            return self._object()
+        if char == "[":
+            return self._array()
+        if char in "\"'":
+            return self._string(char)
+        return self._bare()
+
+    def _object(self):
+        self.pos += 1
+        result = {}
+        while True:
+            char = self._peek()
+            if char in ("", "}"):
+                self.pos += 1
+                return result
+            if char == ",":
+                self.pos += 1
+                continue
+
+            key = self._string(char) if char in "\"'" else self._bare(stop=":,}")
+            if self._peek() != ":":
+                # Key without a value, e.g. cut off mid-field
+                return result
+            self.pos += 1
+
+            if self._peek() in ("", "}"):
+                return result
+            result[str(key)] = self.value()
+
+    def _array(self):
+        self.pos += 1
+        result = []
+        while True:
+            char = self._peek()
+            if char in ("", "]"):
+                self.pos += 1
+                return result
+            if char == ",":
+                self.pos += 1
+                continue
+            result.append(self.value())
+
+    def _string(self, quote):
+        self.pos += 1
+        chars = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            self.pos += 1
+            if char == "\\" and self.pos < len(self.text):
+                chars.append(char + self.text[self.pos])
+                self.pos += 1
+            elif char == quote:
+                break
+            else:
+                chars.append(char)
+
+        raw = "".join(chars)
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return raw
+
+    def _bare(self, stop=",}]\n"):
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in stop:
+            self.pos += 1
+        if self.pos == start:
+            # Stray delimiter, e.g. "}" inside an array: skip it
+            self.pos += 1
+            return None
+        word = self.text[start:self.pos].strip()
+
+        if word in _BARE_WORDS:
+            return _BARE_WORDS[word]
+        try:
+            return json.loads(word)
+        except ValueError:
+            return word
+
+
+def tolerant_loads(text, opening="{"):
+    """
+    Parses the first JSON object (opening="{") or array (opening="[")
+    in text, tolerating common model formatting mistakes.
+    Returns None when text contains no such opening bracket.
+    """
+    start = text.find(opening)
+    if start == -1:
+        return None
+
+    parser = _TolerantParser(text)
+    parser.pos = start
+    return parser.value()
+
+
+if __name__ == "__main__":
+    samples = [
+        '{"problem": "Upload fails", "sentiment": Negative, "category": Bug, "priority": High,}',
+        "Sure! Here is the JSON:\n```json\n{'problem': 'None', 'sentiment': 'Positive'}\n```",
+        '[{"index": 0, "problem": "Login slow", "priority": "Medium"}, {"index": 1, "prob',
+    ]
+    for sample in samples:
+        print(tolerant_loads(sample, "[" if sample.startswith("[") else "{"))
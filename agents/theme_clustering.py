@@ -0,0 +1,361 @@
+# theme_clustering.py
+# Embedding-Based Theme Clustering (Agent 2)
+# Purpose:
+# Groups problem statements into themes without putting them all in one prompt:
+# - Embeds problems locally in NumPy batches (a local Ollama embedding
+#   model, or hashed n-gram vectors when that model is not available)
+# - Assigns each batch to the nearest running centroid, opening a new
+#   centroid when nothing is similar enough
+# - Merges centroids that ended up close to each other (agglomerative pass)
+# - Names each of the largest clusters with one short LLM call; the long
+#   tail is merged into one "Other Issues" theme
+# LLM cost is capped at MAX_NAMED_CLUSTERS calls, and memory scales with
+# batch_size x clusters, not with the number of problems.
+
+import json
+import re
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from agents.instrumentation import record_event, submit_in_context
+from agents.llm_backend import llm_embed
+from agents.structured_output import THEME_NAME_SCHEMA, parse_json, schema_chat
+
+
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+EMBEDDING_DIM = 512
+EMBED_BATCH_SIZE = 1024
+NAMING_SAMPLE_SIZE = 5
+
+# Clusters named per run; smaller clusters are merged into OTHER_THEME
+MAX_NAMED_CLUSTERS = 50
+OTHER_THEME = "Other Issues"
+
+# Most frequent distinct problems listed per theme (problem_count still counts all)
+MAX_RELATED_PROBLEMS = 50
+
+# (assign, merge) cosine thresholds per embedding type. Hashed n-gram
+# vectors only capture word overlap, so their similarities run lower.
+MODEL_THRESHOLDS = (0.7, 0.8)
+HASHED_THRESHOLDS = (0.34, 0.5)
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "to", "of",
+    "in", "on", "for", "with", "at", "by", "from", "it", "its", "this", "that", "not",
+    "no", "too", "very", "when", "after", "sometimes", "does", "do", "can", "cannot"
+}
+
+
+def _tokens(text):
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+def _features(text):
+    """
+    Word unigrams plus character 4-grams of each word, so "upload" and
+    "uploading" still overlap.
+    """
+    words = _tokens(text)
+    features = list(words)
+    for word in words:
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 4] for i in range(max(1, len(padded) - 3)))
+    return features
+
+
+def hash_embed(texts):
+    """
+    Embeds texts as L2-normalized hashed n-gram vectors.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), EMBEDDING_DIM).
+    """
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            rows.append(row)
+            cols.append(zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIM)
+
+    vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    np.add.at(vectors, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), 1.0)
+    return _normalize_rows(vectors)
+
+
+def ollama_embed(texts, model):
+    """
+    Embeds texts with a local Ollama embedding model (e.g. "nomic-embed-text").
+    """
+    response = llm_embed("agent2_embed", model, texts)
+    return _normalize_rows(np.asarray(response["embeddings"], dtype=np.float32))
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def resolve_embedder(embed_model=DEFAULT_EMBED_MODEL):
+    """
+    Picks the embedding function for a run.
+
+    Returns:
+        tuple: (embed_fn, (assign_threshold, merge_threshold), embedder_name)
+               embedder_name is the model name, or "hashed".
+    """
+    if embed_model:
+        try:
+            ollama_embed(["probe"], embed_model)
+            return (lambda texts: ollama_embed(texts, embed_model)), MODEL_THRESHOLDS, embed_model
+        except Exception as e:
+            print(f"⚠️ Embedding model {embed_model!r} unavailable ({e}); using hashed n-gram embeddings.")
+
+    return hash_embed, HASHED_THRESHOLDS, "hashed"
+
+
+def iter_embeddings(texts, embed_fn, batch_size=EMBED_BATCH_SIZE):
+    """
+    Yields (start_index, embedding batch) pairs.
+    """
+    for start in range(0, len(texts), batch_size):
+        yield start, embed_fn(texts[start:start + batch_size])
+
+
+def cluster_problems(problems, threshold=None, merge_threshold=None,
+                     batch_size=EMBED_BATCH_SIZE, embed_model=DEFAULT_EMBED_MODEL):
+    """
+    Clusters problem statements by embedding similarity.
+
+    Parameters:
+        problems (list[str] | Counter): Problem statements (duplicates allowed),
+            or a Counter of problem -> occurrences.
+        threshold (float, optional): Minimum cosine similarity to join an existing cluster.
+        merge_threshold (float, optional): Cosine similarity above which two clusters are merged.
+            Both default to the thresholds for the embedding type in use.
+        batch_size (int): Problems embedded and assigned per NumPy batch.
+        embed_model (str, optional): Ollama embedding model. None uses hashed n-grams.
+
+    Returns:
+        list[Counter]: One Counter of problem -> occurrences per cluster,
+                       largest clusters first.
+    """
+    occurrences = Counter(problems)
+    distinct = list(occurrences)
+    if not distinct:
+        return []
+
+    embed_fn, (default_threshold, default_merge), _ = resolve_embedder(embed_model)
+    threshold = default_threshold if threshold is None else threshold
+    merge_threshold = default_merge if merge_threshold is None else merge_threshold
+
+    centroid_sums = np.zeros((0, 0), dtype=np.float32)
+    centroids = np.zeros((0, 0), dtype=np.float32)
+    labels = np.empty(len(distinct), dtype=np.int64)
+
+    for start, vectors in iter_embeddings(distinct, embed_fn, batch_size):
+        if centroids.shape[0] == 0:
+            centroid_sums = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            centroids = centroid_sums.copy()
+
+        weights = np.asarray(
+            [occurrences[text] for text in distinct[start:start + len(vectors)]], dtype=np.float32
+        )
+
+        # Vectorized nearest-centroid lookup for the whole batch
+        if centroids.shape[0]:
+            similarities = vectors @ centroids.T
+            best = similarities.argmax(axis=1)
+            best_score = similarities[np.arange(len(vectors)), best]
+        else:
+            best = np.zeros(len(vectors), dtype=np.int64)
+            best_score = np.full(len(vectors), -1.0, dtype=np.float32)
+
+        batch_labels = np.where(best_score >= threshold, best, -1)
+
+        # Leftovers open new centroids, greedily within the batch
+        leftovers = np.flatnonzero(batch_labels == -1)
+        new_sums = np.zeros((len(leftovers), vectors.shape[1]), dtype=np.float32)
+        new_vectors = np.zeros_like(new_sums)
+        opened = 0
+        for row in leftovers:
+            vector = vectors[row]
+            if opened:
+                scores = new_vectors[:opened] @ vector
+                match = int(scores.argmax())
+                if scores[match] >= threshold:
+                    batch_labels[row] = centroids.shape[0] + match
+                    new_sums[match] += vector * weights[row]
+                    continue
+            batch_labels[row] = centroids.shape[0] + opened
+            new_sums[opened] = vector * weights[row]
+            new_vectors[opened] = vector
+            opened += 1
+
+        assigned = batch_labels < centroids.shape[0]
+        if assigned.any():
+            np.add.at(centroid_sums, batch_labels[assigned], vectors[assigned] * weights[assigned, None])
+
+        if opened:
+            centroid_sums = np.vstack([centroid_sums, new_sums[:opened]])
+
+        centroids = _normalize_rows(centroid_sums.copy())
+        labels[start:start + len(vectors)] = batch_labels
+
+    merged = merge_centroids(centroids, merge_threshold, batch_size)
+
+    clusters = {}
+    for text, label in zip(distinct, labels):
+        clusters.setdefault(merged[label], Counter())[text] = occurrences[text]
+
+    return sorted(clusters.values(), key=lambda cluster: -sum(cluster.values()))
+
+
+def merge_centroids(centroids, merge_threshold, block_size):
+    """
+    Agglomerative pass over centroids, computed block by block so the
+    similarity matrix never exceeds block_size x n_centroids.
+
+    Returns:
+        np.ndarray: merged cluster id for each centroid.
+    """
+    count = centroids.shape[0]
+    parent = np.arange(count)
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for start in range(0, count, block_size):
+        similarities = centroids[start:start + block_size] @ centroids.T
+        rows, cols = np.nonzero(similarities >= merge_threshold)
+        for row, col in zip(rows + start, cols):
+            if col <= row:
+                continue
+            root_row, root_col = find(row), find(col)
+            if root_row != root_col:
+                parent[max(root_row, root_col)] = min(root_row, root_col)
+
+    return np.asarray([find(index) for index in range(count)])
+
+
+def keyword_theme_name(cluster):
+    """
+    Names a cluster after its most common keyword, without an LLM call.
+    """
+    words = Counter()
+    for text, count in cluster.items():
+        for word in set(_tokens(text)):
+            words[word] += count
+    if not words:
+        return OTHER_THEME
+    return f"{words.most_common(1)[0][0].title()} Issues"
+
+
+def name_cluster(cluster, model=None):
+    """
+    Names one cluster with a short LLM call on its most frequent problems.
+    model defaults to the Agent 2 model (see agents/llm_backend.py).
+    Falls back to the most common keyword when the call or parse fails.
+    """
+    samples = [text for text, _ in cluster.most_common(NAMING_SAMPLE_SIZE)]
+
+    prompt = f"""
+Name the product issue theme shared by these problems.
+
+Rules:
+1. The name MUST be a clear technical noun phrase and MUST end with "Issues".
+   Example: "Upload Issues", "Authentication Issues", "Performance Issues".
+2. Be specific, not broad.
+
+Return ONLY valid JSON in this format:
+{{"theme": "Specific Theme Name Issues"}}
+
+Problems:
+{json.dumps(samples)}
+"""
+
+    try:
+        response = schema_chat(
+            "agent2_naming",
+            THEME_NAME_SCHEMA,
+            [{"role": "user", "content": prompt}],
+            model=model
+        )
+        parsed = parse_json("agent2_naming", response["message"]["content"])
+        theme = parsed.get("theme", "") if parsed else ""
+    except Exception:
+        theme = ""
+
+    theme = str(theme).strip()
+    if not theme:
+        record_event("agent2_naming", "keyword_fallback")
+        return keyword_theme_name(cluster)
+    if not theme.endswith("Issues"):
+        theme = f"{theme} Issues"
+    return theme
+
+
+def theme_entry(name, cluster):
+    """
+    A theme in the detect_patterns format. related_problems lists the
+    MAX_RELATED_PROBLEMS most frequent distinct problems of the cluster.
+    """
+    return {
+        "theme": name,
+        "related_problems": [text for text, _ in cluster.most_common(MAX_RELATED_PROBLEMS)],
+        "problem_count": sum(cluster.values())
+    }
+
+
+def cluster_themes(problems, max_workers=4, embed_model=DEFAULT_EMBED_MODEL, max_named=MAX_NAMED_CLUSTERS,
+                   **cluster_options):
+    """
+    Embedding-based replacement for the single-prompt theme detector.
+
+    Only the max_named largest clusters get a naming call; the rest are
+    merged into one OTHER_THEME entry at the end.
+
+    Returns:
+        list[dict]: [{"theme": str, "related_problems": [str, ...], "problem_count": int}, ...]
+                    related_problems lists each distinct problem once.
+    """
+    clusters = cluster_problems(problems, embed_model=embed_model, **cluster_options)
+    clusters, tail = clusters[:max_named], clusters[max_named:]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [submit_in_context(executor, name_cluster, cluster) for cluster in clusters]
+        names = [future.result() for future in futures]
+
+    themes = [theme_entry(name, cluster) for name, cluster in zip(names, clusters)]
+
+    if tail:
+        record_event("agent2_naming", "merged_into_other", len(tail))
+        other = Counter()
+        for cluster in tail:
+            other.update(cluster)
+        themes.append(theme_entry(OTHER_THEME, other))
+
+    return themes
+
+
+if __name__ == "__main__":
+
+    sample_problems = [
+        "App crashes when uploading images",
+        "Upload fails for large PDF files",
+        "File upload not working properly",
+        "Dashboard takes too long to load",
+        "App feels very slow after update",
+        "Reports page is lagging badly",
+        "Login session expires too quickly",
+        "Cannot log in with correct password",
+        "OTP verification fails sometimes"
+    ]
+
+    for cluster in cluster_problems(sample_problems, embed_model=None):
+        print(keyword_theme_name(cluster), list(cluster))
@@ -0,0 +1,234 @@
+# theme_index.py
+# Persistent Theme Index (Agent 2)
+# Purpose:
+# Keeps the themes found by earlier runs so a daily run only clusters the delta:
+# - Stores per-theme centroid vectors, member counts and names on disk
+# - Assigns new problems to the nearest existing theme centroid
+# - Sends only the unmatched problems through embedding clustering,
+#   and adds the resulting clusters as new themes
+# - Periodically re-balances by merging themes whose centroids converged
+# - If the embedder in use differs from the one the index was built with,
+#   the run is clustered without the index and the index is left as is
+
+import os
+from collections import Counter
+
+import numpy as np
+
+from agents.instrumentation import record_event
+from agents.theme_clustering import (
+    DEFAULT_EMBED_MODEL,
+    EMBED_BATCH_SIZE,
+    MAX_NAMED_CLUSTERS,
+    cluster_problems,
+    cluster_themes,
+    iter_embeddings,
+    keyword_theme_name,
+    merge_centroids,
+    name_cluster,
+    resolve_embedder,
+    theme_entry,
+)
+
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "theme_index.npz")
+
+# Re-balance after this many updates
+REBALANCE_EVERY = 10
+
+
+class ThemeIndex:
+    """
+    Centroid index of known themes.
+
+    centroid_sums holds the count-weighted sum of member embeddings for
+    each theme, so adding members and merging themes are plain additions.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, embed_model=DEFAULT_EMBED_MODEL):
+        self.path = path
+        self.embed_model = embed_model
+        self.embedder = None
+        self.names = []
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.centroid_sums = None
+        self.updates = 0
+
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.names = [str(name) for name in data["names"]]
+                self.counts = data["counts"].astype(np.int64)
+                self.centroid_sums = data["centroid_sums"].astype(np.float32)
+                self.embedder = str(data["embedder"]) or None
+                self.updates = int(data["updates"])
+
+    def __len__(self):
+        return len(self.names)
+
+    def _centroids(self):
+        norms = np.linalg.norm(self.centroid_sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return self.centroid_sums / norms
+
+    def _resolve(self):
+        """
+        Returns (embed_fn, thresholds), or None when the embedder in use is
+        not the one the index was built with: its centroids are then not
+        comparable with this run's vectors.
+        """
+        embed_fn, thresholds, embedder = resolve_embedder(self.embed_model)
+
+        if self.embedder is not None and embedder != self.embedder:
+            record_event("agent2_theme_index", "embedder_mismatch")
+            print(
+                f"⚠️ Theme index at {self.path} was built with {self.embedder!r} embeddings, "
+                f"but {embedder!r} is in use; clustering without the index."
+            )
+            return None
+
+        self.embedder = embedder
+        return embed_fn, thresholds
+
+    def update(self, problems, threshold=None, batch_size=EMBED_BATCH_SIZE):
+        """
+        Assigns problems to known themes and opens new themes for the rest.
+
+        Parameters:
+            problems (list[str] | Counter): Problem statements from this run
+                (duplicates allowed), or a Counter of problem -> occurrences.
+            threshold (float, optional): Minimum cosine similarity to a theme
+                centroid. Defaults to the assign threshold of the embedder.
+            batch_size (int): Problems embedded and looked up per NumPy batch.
+
+        Returns:
+            list[dict]: Themes touched by this run, in the detect_semantic_themes
+                        format, largest first.
+        """
+        occurrences = Counter(problems)
+        distinct = list(occurrences)
+        if not distinct:
+            return []
+
+        resolved = self._resolve()
+        if resolved is None:
+            return cluster_themes(occurrences, embed_model=self.embed_model, threshold=threshold, batch_size=batch_size)
+
+        embed_fn, (assign_threshold, merge_threshold) = resolved
+        threshold = assign_threshold if threshold is None else threshold
+
+        members = {}
+        unmatched = Counter()
+
+        for start, vectors in iter_embeddings(distinct, embed_fn, batch_size):
+            texts = distinct[start:start + len(vectors)]
+            weights = np.asarray([occurrences[text] for text in texts], dtype=np.float32)
+
+            if self.centroid_sums is None:
+                self.centroid_sums = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+
+            if len(self):
+                similarities = vectors @ self._centroids().T
+                best = similarities.argmax(axis=1)
+                matched = similarities[np.arange(len(vectors)), best] >= threshold
+            else:
+                best = np.zeros(len(vectors), dtype=np.int64)
+                matched = np.zeros(len(vectors), dtype=bool)
+
+            if matched.any():
+                np.add.at(self.centroid_sums, best[matched], vectors[matched] * weights[matched, None])
+                np.add.at(self.counts, best[matched], weights[matched].astype(np.int64))
+
+            for text, theme_id, is_matched in zip(texts, best, matched):
+                if is_matched:
+                    members.setdefault(int(theme_id), Counter())[text] = occurrences[text]
+                else:
+                    unmatched[text] = occurrences[text]
+
+        # Only the delta goes through clustering and naming
+        if unmatched:
+            embed_model = None if self.embedder == "hashed" else self.embedder
+            new_clusters = cluster_problems(
+                unmatched, threshold, merge_threshold, batch_size, embed_model
+            )
+            # Past MAX_NAMED_CLUSTERS, new themes take a keyword name instead of an LLM call
+            for number, cluster in enumerate(new_clusters):
+                members[self._add_theme(cluster, embed_fn, batch_size, number < MAX_NAMED_CLUSTERS)] = cluster
+
+        themes = [
+            theme_entry(self.names[theme_id], cluster)
+            for theme_id, cluster in sorted(members.items(), key=lambda item: -sum(item[1].values()))
+        ]
+
+        # Re-balancing renumbers theme ids, so it runs after themes are resolved
+        self.updates += 1
+        if self.updates % REBALANCE_EVERY == 0:
+            self.rebalance(merge_threshold)
+
+        self.save()
+
+        return themes
+
+    def _add_theme(self, cluster, embed_fn, batch_size, named=True):
+        texts = list(cluster)
+        weights = np.asarray([cluster[text] for text in texts], dtype=np.float32)
+
+        centroid_sum = np.zeros(self.centroid_sums.shape[1], dtype=np.float32)
+        for start, vectors in iter_embeddings(texts, embed_fn, batch_size):
+            centroid_sum += (vectors * weights[start:start + len(vectors), None]).sum(axis=0)
+
+        self.centroid_sums = np.vstack([self.centroid_sums, centroid_sum[None, :]])
+        self.counts = np.append(self.counts, int(weights.sum()))
+        self.names.append(name_cluster(cluster) if named else keyword_theme_name(cluster))
+
+        return len(self.names) - 1
+
+    def rebalance(self, merge_threshold=None):
+        """
+        Merges themes whose centroids drifted within merge_threshold of each
+        other. The merged theme keeps the name of its largest member.
+
+        Theme ids are renumbered, so call this between runs, not mid-update.
+        """
+        if len(self) < 2:
+            return
+
+        if merge_threshold is None:
+            resolved = self._resolve()
+            if resolved is None:
+                return
+            _, (_, merge_threshold) = resolved
+
+        groups = merge_centroids(self._centroids(), merge_threshold, EMBED_BATCH_SIZE)
+        roots = list(dict.fromkeys(groups.tolist()))
+        if len(roots) == len(self):
+            return
+
+        names, counts, sums = [], [], []
+        for root in roots:
+            ids = np.flatnonzero(groups == root)
+            largest = ids[self.counts[ids].argmax()]
+            names.append(self.names[largest])
+            counts.append(self.counts[ids].sum())
+            sums.append(self.centroid_sums[ids].sum(axis=0))
+
+        print(f"Theme index re-balanced: {len(self)} → {len(roots)} themes")
+        self.names = names
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.centroid_sums = np.asarray(sums, dtype=np.float32)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # np.savez appends ".npz" to names that lack it
+        temp_path = self.path + ".tmp.npz"
+        np.savez(
+            temp_path,
+            names=np.asarray(self.names, dtype=str),
+            counts=self.counts,
+            centroid_sums=self.centroid_sums,
+            embedder=np.asarray(self.embedder or ""),
+            updates=np.asarray(self.updates)
+        )
+        os.replace(temp_path, self.path)
@@ -0,0 +1,433 @@
+# trend_store.py
+# Time-Windowed Trend Store and Spike Detection
+# Purpose:
+# Persists per-window aggregates of Agent 2 output in SQLite:
+# - counts per theme, category and priority for each hour or day
+# - per-series baselines kept incrementally as windows close:
+#   an EWMA mean/variance (for z-scores) and a rolling sum over the last
+#   `baseline_windows` windows (for "N× vs 7-day baseline" ratios)
+# Checking a window for spikes reads one baseline row per series, so no
+# history is reprocessed. Counts added under a run ID replace that run's
+# earlier counts in the same window, so a resumed or repeated run is not
+# counted twice.
+#
+# Usage:
+#   store = TrendStore(granularity="day")
+#   store.add_patterns(pattern_output)             # counts for the current day
+#   store.add_patterns(pattern_output, run_id="nightly-2024-05-01")   # idempotent per run
+#   store.flags()                                  # ["Upload Issues up 4.0× vs 7-day baseline ..."]
+#   evaluate_system(pattern_output, trend_flags=record_trends(pattern_output, "day"))
+
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_TREND_PATH = os.path.join(".cache", "trends.sqlite")
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+
+# Windows in the rolling baseline (7 days at day granularity)
+DEFAULT_BASELINE_WINDOWS = 7
+
+# A window is flagged when it is this many times its rolling baseline ...
+DEFAULT_SPIKE_RATIO = 2.0
+# ... and this many EWMA standard deviations above the EWMA mean ...
+DEFAULT_SPIKE_Z = 3.0
+# ... with at least this many occurrences and this many closed windows of history
+DEFAULT_MIN_COUNT = 5
+DEFAULT_MIN_HISTORY = 3
+
+
+def series_counts(pattern_output):
+    """
+    Series -> count for one detect_patterns output, e.g.
+    {"category:Bug": 6, "priority:High": 8, "theme:Upload Issues": 2}
+    """
+    counts = {}
+    for category, count in pattern_output.get("category_distribution", {}).items():
+        counts[f"category:{category}"] = count
+    for priority, count in pattern_output.get("priority_distribution", {}).items():
+        counts[f"priority:{priority}"] = count
+    for theme in pattern_output.get("detected_themes", []):
+        name = f"theme:{theme.get('theme', '')}"
+        counts[name] = counts.get(name, 0) + theme.get("problem_count", len(theme.get("related_problems", [])))
+    return counts
+
+
+def open_trend_store(trends=None, path=DEFAULT_TREND_PATH):
+    """
+    Returns a TrendStore, or None when trends is falsy.
+    trends is a granularity ("hour", "day") or True for "day".
+    """
+    if not trends:
+        return None
+    return TrendStore(path, granularity="day" if trends is True else trends)
+
+
+def record_trends(pattern_output, trends=None, timestamp=None, run_id=None):
+    """
+    Adds one run's counts to the trend store and returns its spike flags
+    for the current window ([] when trends is falsy). With a run_id, the
+    counts replace any the same run recorded in this window before.
+    """
+    store = open_trend_store(trends)
+    if store is None:
+        return []
+    try:
+        store.add_patterns(pattern_output, timestamp, run_id)
+        return store.flags(timestamp)
+    finally:
+        store.close()
+
+
+class TrendStore:
+    """
+    SQLite-backed per-window counts with incrementally updated baselines.
+
+    Counts can be added to any window. A window is folded into the
+    baselines once a later window receives data; counts added to an
+    already closed window are kept in the history and the rolling sums,
+    but not in the EWMA state. Counts added with a run_id replace the
+    counts that run added to the same window before.
+
+    Parameters:
+        path (str): SQLite file.
+        granularity (str): "hour" or "day".
+        baseline_windows (int): Windows in the rolling baseline; also sets
+            the EWMA smoothing factor alpha = 2 / (baseline_windows + 1).
+    """
+
+    def __init__(self, path=DEFAULT_TREND_PATH, granularity="day", baseline_windows=DEFAULT_BASELINE_WINDOWS):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}")
+        if baseline_windows < 1:
+            raise ValueError("baseline_windows must be at least 1")
+
+        self.path = path
+        self.granularity = granularity
+        self.window_seconds = GRANULARITIES[granularity]
+        self.baseline_windows = baseline_windows
+        self.alpha = 2 / (baseline_windows + 1)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS window_counts (
+                granularity TEXT NOT NULL,
+                series TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (granularity, series, window)
+            );
+            CREATE INDEX IF NOT EXISTS idx_window_counts_window ON window_counts (granularity, window);
+            CREATE TABLE IF NOT EXISTS baselines (
+                granularity TEXT NOT NULL,
+                series TEXT NOT NULL,
+                ewma_mean REAL NOT NULL,
+                ewma_var REAL NOT NULL,
+                rolling_sum INTEGER NOT NULL,
+                windows_seen INTEGER NOT NULL,
+                PRIMARY KEY (granularity, series)
+            );
+            CREATE TABLE IF NOT EXISTS progress (
+                granularity TEXT PRIMARY KEY,
+                closed_through INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS run_counts (
+                granularity TEXT NOT NULL,
+                run_id TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                series TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (granularity, run_id, window, series)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def window_of(self, timestamp=None):
+        """
+        Window number containing a Unix timestamp (default: now).
+        """
+        return int((time.time() if timestamp is None else timestamp) // self.window_seconds)
+
+    def window_start(self, window):
+        return window * self.window_seconds
+
+    def add(self, counts, timestamp=None, run_id=None):
+        """
+        Adds series -> count to the window containing timestamp (default: now).
+        Earlier windows that are still open are closed first. With a run_id,
+        only the difference to that run's earlier counts in the window is added.
+        """
+        window = self.window_of(timestamp)
+
+        with self._lock:
+            self._close_windows_before(window)
+            if run_id is not None:
+                counts = self._replace_run_counts(str(run_id), window, counts)
+            self._add_late(window, counts)
+            self._conn.executemany(
+                "INSERT INTO window_counts (granularity, series, window, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (granularity, series, window) DO UPDATE SET count = count + excluded.count",
+                [(self.granularity, series, window, int(count)) for series, count in counts.items() if count]
+            )
+            if run_id is not None:
+                # A series a re-run no longer reports leaves no empty row behind
+                self._conn.execute(
+                    "DELETE FROM window_counts WHERE granularity = ? AND window = ? AND count <= 0",
+                    (self.granularity, window)
+                )
+            self._conn.commit()
+        return window
+
+    def add_patterns(self, pattern_output, timestamp=None, run_id=None):
+        """
+        Adds the theme, category and priority counts of one detect_patterns output.
+        """
+        return self.add(series_counts(pattern_output), timestamp, run_id)
+
+    def _replace_run_counts(self, run_id, window, counts):
+        """
+        Stores counts as run_id's counts in window and returns the change
+        against what the run recorded there before.
+        """
+        previous = dict(self._conn.execute(
+            "SELECT series, count FROM run_counts WHERE granularity = ? AND run_id = ? AND window = ?",
+            (self.granularity, run_id, window)
+        ).fetchall())
+
+        self._conn.execute(
+            "DELETE FROM run_counts WHERE granularity = ? AND run_id = ? AND window = ?",
+            (self.granularity, run_id, window)
+        )
+        self._conn.executemany(
+            "INSERT INTO run_counts (granularity, run_id, window, series, count) VALUES (?, ?, ?, ?, ?)",
+            [(self.granularity, run_id, window, series, int(count)) for series, count in counts.items() if count]
+        )
+
+        changes = {series: int(count) - previous.pop(series, 0) for series, count in counts.items()}
+        changes.update((series, -count) for series, count in previous.items())
+        return changes
+
+    def add_columns(self, columns):
+        """
+        Adds per-window category and priority counts of timestamped
+        ResultColumns (see agents/result_columns.py), oldest window first.
+        """
+        by_window = {}
+        for name in ("category", "priority"):
+            for start, groups in columns.window_counts(self.window_seconds, name).items():
+                window_counts = by_window.setdefault(start, {})
+                for label, count in groups.items():
+                    window_counts[f"{name}:{label}"] = count
+
+        for start in sorted(by_window):
+            self.add(by_window[start], start)
+
+    def _add_late(self, window, counts):
+        """
+        Late counts for a closed window still inside the rolling span go
+        into the rolling sums, so they are subtracted correctly when that
+        window leaves the span. The EWMA state is left as it is.
+        """
+        closed_through = self._closed_through()
+        if closed_through is None or not closed_through - self.baseline_windows < window <= closed_through:
+            return
+
+        self._conn.executemany(
+            "INSERT INTO baselines (granularity, series, ewma_mean, ewma_var, rolling_sum, windows_seen) "
+            "VALUES (?, ?, 0, 0, ?, 0) ON CONFLICT (granularity, series) "
+            "DO UPDATE SET rolling_sum = rolling_sum + excluded.rolling_sum",
+            [(self.granularity, series, int(count)) for series, count in counts.items() if count]
+        )
+
+    def _closed_through(self):
+        row = self._conn.execute(
+            "SELECT closed_through FROM progress WHERE granularity = ?", (self.granularity,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _counts_in(self, window):
+        return dict(self._conn.execute(
+            "SELECT series, count FROM window_counts WHERE granularity = ? AND window = ?",
+            (self.granularity, window)
+        ).fetchall())
+
+    def _close_windows_before(self, window):
+        """
+        Folds every unclosed window before `window` into the baselines.
+        Windows without data count as zero for every known series.
+        """
+        closed_through = self._closed_through()
+        if closed_through is None:
+            first_open = self._conn.execute(
+                "SELECT MIN(window) FROM window_counts WHERE granularity = ?", (self.granularity,)
+            ).fetchone()[0]
+            if first_open is None or first_open >= window:
+                return
+            closed_through = first_open - 1
+
+        if closed_through >= window - 1:
+            return
+
+        baselines = {
+            row[0]: list(row[1:]) for row in self._conn.execute(
+                "SELECT series, ewma_mean, ewma_var, rolling_sum, windows_seen FROM baselines "
+                "WHERE granularity = ?", (self.granularity,)
+            )
+        }
+
+        for closing in range(closed_through + 1, window):
+            counts = self._counts_in(closing)
+            leaving = self._counts_in(closing - self.baseline_windows) if baselines else {}
+
+            for series in set(baselines) | set(counts):
+                mean, var, rolling_sum, seen = baselines.get(series, (0.0, 0.0, 0, 0))
+                value = counts.get(series, 0)
+
+                # Incremental EWMA mean and variance
+                diff = value - mean
+                increment = self.alpha * diff
+                mean += increment
+                var = (1 - self.alpha) * (var + diff * increment)
+
+                rolling_sum += value - leaving.get(series, 0)
+                baselines[series] = [mean, var, rolling_sum, seen + 1]
+
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO baselines "
+            "(granularity, series, ewma_mean, ewma_var, rolling_sum, windows_seen) VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.granularity, series, *state) for series, state in baselines.items()]
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO progress (granularity, closed_through) VALUES (?, ?)",
+            (self.granularity, window - 1)
+        )
+
+    def spikes(self, timestamp=None, ratio=DEFAULT_SPIKE_RATIO, z_score=DEFAULT_SPIKE_Z,
+               min_count=DEFAULT_MIN_COUNT, min_history=DEFAULT_MIN_HISTORY):
+        """
+        Series whose count in the window containing timestamp (default: now)
+        is far above their baseline. The baselines only cover closed windows,
+        so an open window is compared against its own history.
+
+        Returns:
+            list[dict]: {"series", "window_start", "count", "baseline",
+                         "ratio", "z_score"}, largest ratio first.
+        """
+        window = self.window_of(timestamp)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.series, c.count, b.ewma_mean, b.ewma_var, b.rolling_sum, b.windows_seen "
+                "FROM window_counts c LEFT JOIN baselines b "
+                "ON b.granularity = c.granularity AND b.series = c.series "
+                "WHERE c.granularity = ? AND c.window = ?",
+                (self.granularity, window)
+            ).fetchall()
+            history = self._closed_through()
+            first_window = self._first_window()
+
+        # Windows of history, including ones before a series first appeared
+        history_windows = 0 if history is None or first_window is None else min(window, history + 1) - first_window
+
+        spikes = []
+        for series, count, mean, var, rolling_sum, seen in rows:
+            if count < min_count or history_windows < min_history:
+                continue
+
+            mean = mean or 0.0
+            baseline = (rolling_sum or 0) / min(history_windows, self.baseline_windows)
+            deviation = (count - mean) / max(math.sqrt(var or 0.0), 1.0)
+            times = count / baseline if baseline else math.inf
+
+            if times >= ratio and deviation >= z_score:
+                spikes.append({
+                    "series": series,
+                    "window_start": self.window_start(window),
+                    "count": count,
+                    "baseline": round(baseline, 2),
+                    "ratio": round(times, 2) if baseline else None,
+                    "z_score": round(deviation, 2)
+                })
+
+        spikes.sort(key=lambda spike: spike["ratio"] or math.inf, reverse=True)
+        return spikes
+
+    def _first_window(self):
+        return self._conn.execute(
+            "SELECT MIN(window) FROM window_counts WHERE granularity = ?", (self.granularity,)
+        ).fetchone()[0]
+
+    def flags(self, timestamp=None, **spike_options):
+        """
+        Human-readable spike descriptions for the evaluation layer, e.g.
+        "Upload Issues up 4.0× vs 7-day baseline (12 vs 3.0 per day)".
+        """
+        span = f"{self.baseline_windows}-{self.granularity}"
+        messages = []
+
+        for spike in self.spikes(timestamp, **spike_options):
+            kind, name = spike["series"].split(":", 1)
+            label = name if kind == "theme" else f"{name} {kind}"
+            if spike["ratio"] is None:
+                messages.append(f"{label} new this {self.granularity} ({spike['count']}, none in {span} baseline)")
+            else:
+                messages.append(
+                    f"{label} up {spike['ratio']:.1f}× vs {span} baseline "
+                    f"({spike['count']} vs {spike['baseline']:.1f} per {self.granularity})"
+                )
+        return messages
+
+    def history(self, series, limit=None):
+        """
+        (window start, count) pairs of one series, most recent first.
+        Windows without occurrences are omitted.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT window, count FROM window_counts WHERE granularity = ? AND series = ? "
+                "ORDER BY window DESC LIMIT ?",
+                (self.granularity, series, -1 if limit is None else limit)
+            ).fetchall()
+        return [(self.window_start(window), count) for window, count in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    # Two quiet weeks, then a day with an upload regression
+    with tempfile.TemporaryDirectory() as directory:
+        store = TrendStore(os.path.join(directory, "trends.sqlite"))
+        today = time.time()
+
+        for days_ago in range(14, 0, -1):
+            store.add_patterns({
+                "category_distribution": {"Bug": 4 + days_ago % 3, "Performance": 3},
+                "priority_distribution": {"High": 2 + days_ago % 2, "Low": 5},
+                "detected_themes": [{"theme": "Upload Issues", "related_problems": ["Upload fails"] * 3}]
+            }, today - days_ago * 86400)
+
+        store.add_patterns({
+            "category_distribution": {"Bug": 19, "Performance": 3},
+            "priority_distribution": {"High": 14, "Low": 5},
+            "detected_themes": [{"theme": "Upload Issues", "related_problems": ["Upload fails"] * 12}]
+        }, today)
+
+        for flag in store.flags(today):
+            print("-", flag)
+        store.close()
@@ -1,9 +1,17 @@
 import streamlit as st
-from main_pipeline import run_pipeline
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from io import BytesIO
+from agents.memo_cache import MemoCache
+from background_jobs import JobManager
+
+# Seconds between progress refreshes of a running analysis
+PROGRESS_POLL_SECONDS = 1.0
+
+STAGE_LABELS = {
+    None: "Waiting for a free worker...",
+    "agent1": "Agent 1: classifying feedback",
+    "agent2": "Agent 2: detecting patterns",
+    "agent3": "Agent 3: writing the memo (evaluation runs alongside)",
+    "pdf": "Exporting the PDF"
+}
 
 # =====================================
 # PAGE CONFIG
@@ -100,6 +108,64 @@ details:hover {
 </style>
 """, unsafe_allow_html=True)
 
+# =====================================
+# PIPELINE
+# =====================================
+@st.cache_resource
+def load_job_manager():
+    # Runs execute on background threads shared by all sessions, so a long
+    # analysis neither blocks this session nor queues other sessions behind it
+    return JobManager()
+
+
+@st.cache_resource
+def load_memo_cache():
+    # One SQLite memo cache shared by all sessions (see agents/memo_cache.py)
+    return MemoCache()
+
+
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def show_job_progress(job_id):
+    """
+    Polls a running job: progress, throughput, ETA, partial charts and the
+    memo so far. Only this fragment re-runs while polling; once the job
+    has finished, the whole page re-runs to show the result.
+    """
+    job = load_job_manager().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+
+    progress = job.progress()
+    items_text = f"{progress['items_processed']:,} / {progress['total']:,} items"
+    st.progress(
+        progress["items_processed"] / max(progress["total"], 1),
+        text=f"{STAGE_LABELS.get(progress['stage'], progress['stage'])} — {items_text}"
+    )
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Throughput", f"{progress['items_per_second']:,.1f} items/s" if progress["items_per_second"] else "–")
+    col2.metric("ETA", f"{progress['eta_seconds']:.0f} s" if progress["eta_seconds"] is not None else "–")
+    col3.metric("Elapsed", f"{progress['elapsed_seconds']:.0f} s")
+
+    partial = progress["partial_analysis"]
+    if partial:
+        chart1, chart2 = st.columns(2)
+        with chart1:
+            st.caption("📊 Categories so far")
+            st.bar_chart(partial["category_distribution"])
+        with chart2:
+            st.caption("📈 Priorities so far")
+            st.bar_chart(partial["priority_distribution"])
+
+    if progress["memo"]:
+        with st.expander("📝 Executive Insight Memo (writing...)", expanded=True):
+            st.markdown(progress["memo"])
+
+    if st.button("✖ Cancel Analysis"):
+        job.cancel()
+        st.rerun()
+
+
 # =====================================
 # HEADER
 # =====================================
@@ -127,18 +193,52 @@ analyze_button = st.button("🚀 Analyze Feedback")
 # =====================================
 # ANALYSIS LOGIC
 # =====================================
+# Runs go to the background job manager, which streams the LangGraph
+# pipeline; the session only keeps the job ID and the finished result,
+# so other widget interactions neither block on nor restart an analysis.
+# Re-analyzing an input finished within the last hour (in any session)
+# returns that run's result at once.
 if analyze_button and user_input.strip():
 
     feedback_list = [line.strip() for line in user_input.split("\n") if line.strip()]
+    st.session_state.pop("analysis", None)
 
-    with st.spinner("Running AI Agents..."):
-        result = run_pipeline(feedback_list)
+    previous = st.session_state.get("job")
+    if previous is not None:
+        load_job_manager().cancel(previous["id"])
+    job_id = load_job_manager().submit(feedback_list, memo_cache=load_memo_cache())
+    st.session_state["job"] = {"id": job_id}
 
-    pattern_analysis = result["pattern_analysis"]
-    insight_memo = result["insight_memo"]
-    system_evaluation = result["system_evaluation"]
+elif analyze_button:
+    st.warning("Please enter at least one feedback line.")
 
-    st.success("AI Analysis Complete")
+job_info = st.session_state.get("job")
+if job_info is not None:
+    job = load_job_manager().get(job_info["id"])
+
+    if job is None:
+        st.session_state.pop("job")
+    elif not job.finished:
+        show_job_progress(job_info["id"])
+    else:
+        progress = job.progress()
+        st.session_state.pop("job")
+
+        if progress["status"] == "done":
+            st.session_state["analysis"] = {"state": progress["result"], "cached": progress["cached"]}
+        elif progress["status"] == "cancelled":
+            st.warning(f"Analysis cancelled after {progress['items_processed']:,} of {progress['total']:,} items.")
+        else:
+            st.error(f"Analysis failed: {progress['error']}")
+
+analysis = st.session_state.get("analysis")
+if analysis is not None:
+
+    state = analysis["state"]
+    pattern_analysis = state["pattern_analysis"]
+
+    if analysis["cached"]:
+        st.info("Showing the results of an earlier run on this input.")
 
     # =====================================
     # METRICS ROW
@@ -186,37 +286,20 @@ if analyze_button and user_input.strip():
     with st.expander("📈 Priority Distribution"):
         st.bar_chart(pattern_analysis["priority_distribution"])
 
-    with st.expander("📝 Executive Insight Memo"):
-        st.write(insight_memo)
+    with st.expander("📝 Executive Insight Memo", expanded=True):
+        st.markdown(state["insight_memo"])
 
     with st.expander("🧾 System Evaluation Summary"):
-        st.write(system_evaluation)
+        st.write(state["system_evaluation"])
+
+    st.success("AI Analysis Complete")
 
     # =====================================
     # PDF DOWNLOAD
     # =====================================
-    def generate_pdf(memo_text):
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        elements.append(Paragraph("AI Feedback Intelligence Report", styles["Heading1"]))
-        elements.append(Spacer(1, 0.3 * inch))
-        elements.append(Paragraph(memo_text, styles["Normal"]))
-
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
-
-    pdf_buffer = generate_pdf(insight_memo)
-
     st.download_button(
         label="📥 Download Executive Memo (PDF)",
-        data=pdf_buffer,
+        data=state["memo_pdf"],
         file_name="Product_Insight_Memo.pdf",
         mime="application/pdf"
     )
-
-elif analyze_button:
-    st.warning("Please enter at least one feedback line.")
\ No newline at end of file
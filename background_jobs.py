@@ -0,0 +1,362 @@
+# background_jobs.py
+# Background Pipeline Jobs with Live Progress
+# Purpose:
+# Runs the LangGraph pipeline (main_pipeline.build_langgraph_pipeline)
+# outside the caller's thread, so the Streamlit dashboard (app.py) stays
+# responsive and a widget interaction does not restart an analysis:
+# - submit() queues a run on a thread pool and returns a job ID at once;
+#   jobs from different sessions run side by side (up to max_jobs)
+# - the graph is streamed: Agent 1 results arrive in groups and are folded
+#   into running counters, so a job reports items analyzed, throughput, an
+#   ETA and partial category/priority counts while it runs; memo chunks are
+#   collected as they stream in, and the evaluation (with trend flags) runs
+#   alongside the memo as in every graph run
+# - cancel() stops a job after the current group of Agent 1 results (or
+#   memo chunk); requests already sent to the model finish first
+# - a finished run is kept for RESULT_TTL_SECONDS under a fingerprint of
+#   its input, options and models, so submitting the same input again
+#   (in any session) returns it at once instead of re-running Agent 2's
+#   theme call and the memo
+#
+# Usage:
+#   jobs = JobManager(max_jobs=4)
+#   job_id = jobs.submit(feedback_list)
+#   jobs.get(job_id).progress()     # {"status": "running", "items_processed": 120, ...}
+#   jobs.cancel(job_id)
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.patterndetector import PatternAccumulator
+from agents.instrumentation import critical_path, recording
+from agents.llm_backend import STAGES, stage_model
+from main_pipeline import STAGE_DEPENDENCIES, build_langgraph_pipeline, initial_state
+
+
+# Jobs running at once; further jobs wait in the pool's queue
+DEFAULT_MAX_JOBS = 4
+
+# Agent 1 results are reported in about this many groups per job (of at
+# least MIN_PROGRESS_GROUP results), one progress update and cancellation
+# check each
+PROGRESS_STEPS = 20
+MIN_PROGRESS_GROUP = 50
+
+# Stage a job is in once a graph node has finished; the evaluation runs
+# alongside Agent 3 and PDF export, so it does not move the job on
+NEXT_STAGE = {"Agent1": "agent2", "Agent2": "agent3", "Agent3": "pdf"}
+
+RESULT_KEYS = ("pattern_analysis", "insight_memo", "system_evaluation", "memo_pdf")
+
+# Finished jobs kept for polling before the oldest are forgotten
+MAX_FINISHED_JOBS = 64
+
+# Results of finished runs served again for identical input and options
+RESULT_TTL_SECONDS = 3600
+MAX_CACHED_RESULTS = 32
+
+# Options that change a run's result, with their defaults
+RESULT_OPTIONS = {"batch_size": 1, "dedup": False, "preclassify": True, "trends": None}
+
+FINISHED_STATUSES = ("done", "cancelled", "failed")
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job's worker thread once the job has been cancelled.
+    """
+
+
+def result_key(feedback_list, options):
+    """
+    Fingerprint of a run's input, result-changing options and stage models.
+    """
+    payload = json.dumps({
+        "feedback": feedback_list,
+        "options": {name: options.get(name, default) for name, default in RESULT_OPTIONS.items()},
+        "models": {stage: stage_model(stage) for stage in STAGES}
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU of finished run results, each kept for ttl_seconds.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_RESULTS, ttl_seconds=RESULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.time(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _reusable(result):
+    # Runs with failed lines or a placeholder memo are worth re-running
+    return not result["pattern_analysis"].get("failed_count") and not (
+        result["run_report"]["events"].get("agent3_memo.api_fallback")
+    )
+
+
+class Job:
+    """
+    One pipeline run. The worker thread updates it; progress() returns a
+    consistent copy for pollers.
+    """
+
+    def __init__(self, job_id, feedback_list, options):
+        self.id = job_id
+        self.feedback_list = feedback_list
+        self.options = options
+        self.total = len(feedback_list)
+        self.status = "queued"
+        self.stage = None
+        self.items_processed = 0
+        self.partial_analysis = None
+        self.memo_chunks = []
+        self.result = None
+        self.cached = False
+        self.error = None
+        self.submitted_at = time.time()
+        self.agent1_started_at = None
+        self.agent1_finished_at = None
+        self.finished_at = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            if self.status == "queued":
+                self.status = "cancelled"
+                self.finished_at = time.time()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise JobCancelled(self.id)
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def add_memo_chunk(self, text):
+        with self._lock:
+            self.memo_chunks.append(text)
+
+    def progress(self):
+        """
+        Returns:
+            dict: status, stage, items_processed / total, items_per_second,
+                  eta_seconds (None until Agent 1 has results), the partial
+                  analysis, the memo so far and, when done, the result
+                  ("cached" when it comes from an earlier run).
+        """
+        with self._lock:
+            now = self.finished_at or time.time()
+            items_per_second = eta_seconds = None
+            if self.agent1_started_at is not None and self.items_processed:
+                # Throughput is Agent 1's: it stops changing once Agent 1 is done
+                elapsed = max((self.agent1_finished_at or now) - self.agent1_started_at, 1e-9)
+                items_per_second = self.items_processed / elapsed
+                eta_seconds = max(0.0, (self.total - self.items_processed) / items_per_second)
+
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "items_processed": self.items_processed,
+                "total": self.total,
+                "items_per_second": round(items_per_second, 1) if items_per_second else None,
+                "eta_seconds": round(eta_seconds, 1) if eta_seconds is not None else None,
+                "partial_analysis": self.partial_analysis,
+                "memo": "".join(self.memo_chunks),
+                "result": self.result,
+                "cached": self.cached,
+                "error": self.error,
+                "elapsed_seconds": round(now - self.submitted_at, 1)
+            }
+
+
+class JobManager:
+    """
+    Thread-pool runner for pipeline jobs.
+
+    Parameters:
+        max_jobs (int): Jobs that run at once.
+        max_workers (int): Concurrent Agent 1 requests per job. The LLM
+            backend's in-flight cap still bounds the total across jobs.
+    """
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, max_workers=4):
+        self.max_workers = max_workers
+        self._graph = build_langgraph_pipeline()
+        self._results = ResultCache()
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="pipeline-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, feedback_list, **options):
+        """
+        Queues a run over feedback_list and returns its job ID. When the
+        same input and options finished recently, the job is done at once
+        with that run's result.
+
+        options: batch_size, use_cache, dedup, preclassify, trends ("hour"
+                 or "day", see agents/trend_store.py), and memo_cache (an
+                 open MemoCache to use instead of opening one).
+        """
+        job = Job(uuid.uuid4().hex[:12], list(feedback_list), options)
+        # use_cache=False bypasses the result cache like the other caches
+        key = result_key(job.feedback_list, options) if options.get("use_cache", True) else None
+        result = self._results.get(key) if key is not None else None
+        if result is not None:
+            job.update(status="done", result=result, cached=True, items_processed=job.total, finished_at=time.time())
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_finished()
+
+        if result is None:
+            self._executor.submit(self._run, job, key)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def shutdown(self, cancel_running=True):
+        if cancel_running:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                job.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, key=None):
+        if job.finished:
+            return
+
+        job.update(status="running")
+        try:
+            with recording(job.id) as report:
+                result = self._run_stages(job)
+            run_report = report.to_dict()
+            run_report["critical_path"] = critical_path(run_report["stages"], STAGE_DEPENDENCIES)
+            result["run_report"] = run_report
+            if key is not None and _reusable(result):
+                self._results.put(key, result)
+            job.update(status="done", stage=None, result=result, finished_at=time.time())
+
+        except JobCancelled:
+            job.update(status="cancelled", finished_at=time.time())
+            print(f"Job {job.id} cancelled after {job.items_processed}/{job.total} items.")
+
+        except Exception as e:
+            job.update(status="failed", error=str(e), finished_at=time.time())
+            print(f"⚠️ Job {job.id} failed: {e}")
+
+    def _run_stages(self, job):
+        """
+        Streams the pipeline graph over the job's input, mapping node
+        updates and custom events (Agent 1 results, memo chunks) onto the job.
+        """
+        options = job.options
+        accumulator = PatternAccumulator()
+        config = {"configurable": {
+            "max_workers": self.max_workers,
+            "batch_size": options.get("batch_size", 1),
+            "use_cache": options.get("use_cache", True),
+            "dedup": options.get("dedup", False),
+            "preclassify": options.get("preclassify", True),
+            "trends": options.get("trends"),
+            "memo_cache": options.get("memo_cache"),
+            "progress_every": max(MIN_PROGRESS_GROUP, -(-job.total // PROGRESS_STEPS)),
+            "check_cancelled": job.check_cancelled
+        }}
+
+        job.update(stage="agent1", agent1_started_at=time.time())
+        final_state = {}
+        events = self._graph.stream(initial_state(job.feedback_list), config, stream_mode=["updates", "custom"])
+        try:
+            for mode, event in events:
+                if mode == "custom" and "agent1_results" in event:
+                    accumulator.update(event["agent1_results"])
+                    job.update(items_processed=accumulator.items, partial_analysis=accumulator.snapshot())
+                elif mode == "custom" and "memo_chunk" in event:
+                    job.add_memo_chunk(event["memo_chunk"])
+                elif mode == "updates":
+                    for node, update in event.items():
+                        final_state.update(update or {})
+                        self._node_finished(job, node, update or {})
+                job.check_cancelled()
+        finally:
+            events.close()
+
+        return {key: final_state[key] for key in RESULT_KEYS}
+
+    def _node_finished(self, job, node, update):
+        fields = {}
+        if node in NEXT_STAGE:
+            fields["stage"] = NEXT_STAGE[node]
+        if node == "Agent1":
+            # Retried lines are in the node's final results, not in the progress groups
+            fields["items_processed"] = len(update["structured_results"])
+            fields["agent1_finished_at"] = time.time()
+        elif node == "Agent2":
+            fields["partial_analysis"] = update["pattern_analysis"]
+        job.update(**fields)
+
+
+if __name__ == "__main__":
+    from agents.fake_llm import FakeLLM, installed
+
+    with installed(FakeLLM(latency=0.01)):
+        jobs = JobManager()
+        job_id = jobs.submit(["App crashes on upload", "Dashboard is slow", "Please add dark mode"] * 100)
+        job = jobs.get(job_id)
+        while not job.finished:
+            snapshot = job.progress()
+            print(f"{snapshot['status']} {snapshot['stage']}: {snapshot['items_processed']}/{snapshot['total']} "
+                  f"({snapshot['items_per_second']} items/s, ETA {snapshot['eta_seconds']}s)")
+            time.sleep(0.5)
+        print(job.progress()["result"]["insight_memo"])
+        jobs.shutdown()
@@ -0,0 +1,411 @@
+# benchmark.py
+# Offline Performance Benchmarks
+# Runs the agents against the deterministic FakeLLM (agents/fake_llm.py)
+# on synthetic feedback, so pipeline overhead can be measured without a
+# live llama3. For each benchmark and input size it reports throughput,
+# p50/p99 latency per operation and peak traced memory. Results can be
+# saved as JSON and compared against a saved baseline to catch regressions.
+#
+# Usage:
+#   python benchmark.py                                    # 100 and 10k items
+#   python benchmark.py --sizes 100 10k 1m --output baseline.json
+#   python benchmark.py --baseline baseline.json           # exit 1 on regression
+#   python benchmark.py --latency 0.05 --jitter 0.02 --malformed-rate 0.1 --workers 8
+#   python benchmark.py --prefix-reuse --sizes 1k         # Agent 1 prompt prefix caching
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from agents.fake_llm import FakeLLM, classify, installed
+from agents.feedback_record import FeedbackRecord
+from agents.instrumentation import recording
+
+
+SIZES = {"100": 100, "1k": 1_000, "10k": 10_000, "1m": 1_000_000}
+DEFAULT_SIZES = ["100", "10k"]
+
+# Allowed relative drop in throughput / growth in peak memory vs. a baseline
+DEFAULT_TOLERANCE = 0.2
+
+# Simulated prompt processing speed for --prefix-reuse (about 10k tokens/s)
+DEFAULT_PREFILL_PER_TOKEN = 0.0001
+
+# Streamed calls sampled for time-to-first-token in --prefix-reuse
+TTFT_SAMPLES = 100
+
+AREAS = [
+    "upload", "login", "dashboard", "search", "checkout", "export", "notifications",
+    "settings page", "profile", "payment", "sync", "calendar", "reports", "sharing", "onboarding"
+]
+
+TEMPLATES = [
+    "The app crashes when I open the {area}.",
+    "{area} fails every time I try it",
+    "The {area} is really slow lately",
+    "{area} takes forever to load on mobile.",
+    "The {area} screen is confusing and cluttered",
+    "I can't find the {area} option anywhere",
+    "Please add dark mode to the {area}.",
+    "Would love support for bulk actions in {area}",
+    "Love the new {area}, great work!",
+    "The {area} is smooth and easy to use",
+    "Got an error in {area} after the update",
+    "{area} is laggy when there is a lot of data",
+]
+
+
+def generate_feedback(n, seed=0, duplicate_rate=0.3):
+    """
+    Yields n synthetic feedback lines.
+
+    A duplicate_rate share of lines repeats an earlier line with a casing or
+    punctuation change, like re-submitted or templated feedback.
+    """
+    rng = random.Random(seed)
+    recent = []
+
+    for _ in range(n):
+        if recent and rng.random() < duplicate_rate:
+            text = rng.choice(recent)
+            text = text.upper() if rng.random() < 0.5 else text.rstrip(".!") + "!!"
+        else:
+            template = rng.choice(TEMPLATES)
+            text = template.format(area=rng.choice(AREAS))
+            text = text[0].upper() + text[1:]
+            if rng.random() < 0.3:
+                text += f" (build {rng.randint(100, 999)})"
+            recent.append(text)
+            if len(recent) > 500:
+                recent.pop(0)
+        yield text
+
+
+def generate_agent1_results(n, seed=0):
+    """
+    Returns n synthetic Agent 1 results.
+
+    Results for repeated feedback share one record, as cached or
+    de-duplicated results do in the pipeline, so 1M items stay small.
+    """
+    shared = {}
+    results = []
+    for text in generate_feedback(n, seed, duplicate_rate=0.0):
+        # Fold the build suffix so results repeat like real problem statements
+        key = text.split(" (build")[0]
+        if key not in shared:
+            shared[key] = FeedbackRecord.from_dict(classify(key))
+        results.append(shared[key])
+    return results
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _measure(name, size_label, items, run):
+    """
+    Runs `run` under tracemalloc. Tracing slows allocation-heavy code, so
+    throughput is only comparable between runs of this script.
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    latencies = run()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = sorted(latencies)
+    return {
+        "benchmark": name,
+        "size": size_label,
+        "items": items,
+        "seconds": round(seconds, 4),
+        "items_per_second": round(items / seconds, 1) if seconds else 0.0,
+        "latency_p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "latency_p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "peak_memory_mb": round(peak / 1e6, 2)
+    }
+
+
+def _timed_calls(calls):
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+# Each bench_* function prepares its input outside the measurement and
+# returns (items processed, run), where run() returns per-operation latencies.
+
+def bench_analyze_feedback(n, options):
+    from agents.feedback_analyzer import analyze_feedback
+
+    def run():
+        return _timed_calls(
+            (lambda text=text: analyze_feedback(text)) for text in generate_feedback(n)
+        )
+    return n, run
+
+
+def bench_agent1_stage(n, options):
+    from agents.feedback_analyzer import iter_analyze_feedback
+
+    def run():
+        # Latency here is the gap between consecutive results leaving the stage
+        latencies = []
+        last = time.perf_counter()
+        for _ in iter_analyze_feedback(
+            generate_feedback(n), options["workers"], batch_size=options["batch_size"], dedup=True
+        ):
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+        return latencies
+    return n, run
+
+
+def bench_detect_patterns(n, options):
+    from agents.patterndetector import detect_patterns
+
+    results = generate_agent1_results(n)
+
+    def run():
+        return _timed_calls([lambda: detect_patterns(results)] * options["repeats"])
+    return n * options["repeats"], run
+
+
+def bench_group_by(n, options):
+    from agents.result_columns import ResultColumns
+
+    # One result per second, so hourly windows hold 3,600 results
+    columns = ResultColumns.from_records(generate_agent1_results(n), timestamps=range(n))
+
+    def run():
+        return _timed_calls([
+            lambda: columns.group_by("sentiment", "category", "priority"),
+            lambda: columns.window_counts(3600, "priority")
+        ] * options["repeats"])
+    return n * 2 * options["repeats"], run
+
+
+def bench_evaluate_system(n, options):
+    from agents.evaluation_engine import evaluate_system
+    from agents.patterndetector import detect_patterns
+
+    pattern_output = detect_patterns(generate_agent1_results(n))
+    evaluations = options["repeats"] * 100
+
+    # The summary does not scale with n, so one evaluation counts as one item
+    def run():
+        return _timed_calls([lambda: evaluate_system(pattern_output)] * evaluations)
+    return evaluations, run
+
+
+def bench_langgraph(n, options):
+    from main_pipeline import build_langgraph_pipeline, initial_state
+
+    graph = build_langgraph_pipeline()
+    feedback = list(generate_feedback(n))
+    config = {"configurable": {
+        "max_workers": options["workers"],
+        "batch_size": options["batch_size"],
+        "use_cache": False
+    }}
+
+    def run():
+        return _timed_calls([lambda: graph.invoke(initial_state(feedback), config)])
+    return n, run
+
+
+BENCHMARKS = {
+    "analyze_feedback": bench_analyze_feedback,
+    "agent1_stage": bench_agent1_stage,
+    "detect_patterns": bench_detect_patterns,
+    "group_by": bench_group_by,
+    "evaluate_system": bench_evaluate_system,
+    "langgraph": bench_langgraph,
+}
+
+
+def run_benchmarks(names, size_labels, fake, options, verbose=False):
+    """
+    Runs each named benchmark at each size against `fake`.
+    Pipeline progress output is discarded unless verbose is set.
+
+    Returns:
+        list[dict]: One result row per (benchmark, size).
+    """
+    rows = []
+
+    with installed(fake), open(os.devnull, "w") as devnull:
+        for size_label in size_labels:
+            n = SIZES[size_label]
+            for name in names:
+                with redirect_stdout(sys.stdout if verbose else devnull):
+                    items, run = BENCHMARKS[name](n, options)
+                    with recording(name) as report:
+                        row = _measure(name, size_label, items, run)
+
+                row["llm_calls"] = sum(site["calls"] for site in report.to_dict()["llm_calls"].values())
+                rows.append(row)
+                print(_format_row(row), flush=True)
+
+    return rows
+
+
+def compare_prefix_reuse(n, latency=0.0, prefill_per_token=DEFAULT_PREFILL_PER_TOKEN):
+    """
+    Agent 1 per-item latency and time-to-first-token with the model
+    unloaded after every request (keep_alive=0, so every prompt is read in
+    full) vs. kept loaded, where the shared system prompt is served from
+    the fake's prefix cache.
+
+    Returns:
+        list[dict]: One row per configuration.
+    """
+    from agents.feedback_analyzer import agent1_messages, analyze_feedback
+    from agents.llm_backend import DEFAULT_KEEP_ALIVE, llm_chat
+
+    feedback = list(generate_feedback(n))
+    rows = []
+
+    for label, keep_alive in (("keep_alive=0", 0), (f"keep_alive={DEFAULT_KEEP_ALIVE}", DEFAULT_KEEP_ALIVE)):
+        fake = FakeLLM(latency, prefill_per_token=prefill_per_token, keep_alive=keep_alive)
+
+        with installed(fake), open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            item_latencies = sorted(_timed_calls(
+                (lambda text=text: analyze_feedback(text)) for text in feedback
+            ))
+
+            first_token = []
+            for text in feedback[:TTFT_SAMPLES]:
+                started = time.perf_counter()
+                chunks = llm_chat("agent1", messages=agent1_messages(text), stream=True)
+                next(iter(chunks), None)
+                first_token.append(time.perf_counter() - started)
+            first_token.sort()
+
+        rows.append({
+            "config": label,
+            "items": n,
+            "latency_p50_ms": round(_percentile(item_latencies, 0.50) * 1000, 3),
+            "latency_p99_ms": round(_percentile(item_latencies, 0.99) * 1000, 3),
+            "ttft_p50_ms": round(_percentile(first_token, 0.50) * 1000, 3),
+            "cached_prompt_share": round(fake.cached_prompt_tokens / max(fake.prompt_tokens, 1), 3)
+        })
+        print(
+            f"{label:<16} {n:>7} items | p50 {rows[-1]['latency_p50_ms']:>8.3f} ms | "
+            f"p99 {rows[-1]['latency_p99_ms']:>8.3f} ms | TTFT p50 {rows[-1]['ttft_p50_ms']:>8.3f} ms | "
+            f"{rows[-1]['cached_prompt_share']:.0%} of prompt tokens cached",
+            flush=True
+        )
+
+    cold, warm = rows
+    if cold["latency_p50_ms"] and cold["ttft_p50_ms"]:
+        print(
+            f"Prefix reuse: per-item p50 {1 - warm['latency_p50_ms'] / cold['latency_p50_ms']:.0%} lower, "
+            f"TTFT p50 {1 - warm['ttft_p50_ms'] / cold['ttft_p50_ms']:.0%} lower"
+        )
+    return rows
+
+
+def _format_row(row):
+    return (
+        f"{row['benchmark']:<18} {row['size']:>5} | {row['items_per_second']:>12,.1f} items/s | "
+        f"p50 {row['latency_p50_ms']:>9.3f} ms | p99 {row['latency_p99_ms']:>9.3f} ms | "
+        f"peak {row['peak_memory_mb']:>8.2f} MB | {row['llm_calls']} LLM calls"
+    )
+
+
+def compare_to_baseline(rows, baseline_rows, tolerance=DEFAULT_TOLERANCE):
+    """
+    Returns human-readable regressions against a baseline result list:
+    throughput lower, or peak memory higher, by more than `tolerance`.
+    """
+    baseline = {(row["benchmark"], row["size"]): row for row in baseline_rows}
+    regressions = []
+
+    for row in rows:
+        previous = baseline.get((row["benchmark"], row["size"]))
+        if previous is None:
+            continue
+
+        label = f"{row['benchmark']} @ {row['size']}"
+        if row["items_per_second"] < previous["items_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {row['items_per_second']:,.1f} items/s "
+                f"vs baseline {previous['items_per_second']:,.1f}"
+            )
+        if row["peak_memory_mb"] > previous["peak_memory_mb"] * (1 + tolerance) + 1:
+            regressions.append(
+                f"{label}: peak memory {row['peak_memory_mb']} MB "
+                f"vs baseline {previous['peak_memory_mb']} MB"
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipeline against a fake LLM.")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=DEFAULT_SIZES)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake LLM seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per call")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of broken answers")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of failed calls")
+    parser.add_argument("--workers", type=int, default=1, help="concurrent Agent 1 requests")
+    parser.add_argument("--batch-size", type=int, default=1, help="feedback lines per Agent 1 prompt")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of the whole-input benchmarks")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against results saved with --output")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--verbose", action="store_true", help="show pipeline progress output")
+    parser.add_argument("--prefix-reuse", action="store_true",
+                        help="compare Agent 1 latency with and without prompt prefix caching")
+    parser.add_argument("--prefill-per-token", type=float, default=DEFAULT_PREFILL_PER_TOKEN,
+                        help="fake LLM seconds per uncached prompt token (--prefix-reuse)")
+    args = parser.parse_args()
+
+    if args.prefix_reuse:
+        rows = []
+        for size_label in args.sizes:
+            rows += compare_prefix_reuse(SIZES[size_label], args.latency, args.prefill_per_token)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as handle:
+                json.dump(rows, handle, indent=2)
+        return
+
+    fake = FakeLLM(args.latency, args.jitter, args.malformed_rate, args.error_rate)
+    options = {"workers": args.workers, "batch_size": args.batch_size, "repeats": args.repeats}
+
+    rows = run_benchmarks(args.benchmarks, args.sizes, fake, options, args.verbose)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(rows, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = compare_to_baseline(rows, json.load(handle), args.tolerance)
+
+        if regressions:
+            print("\n⚠️ Regressions against baseline:")
+            for regression in regressions:
+                print(" -", regression)
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,109 +1,62 @@
 # main_pipeline.py
 # End-to-End Integration: Agent 1 → Agent 2
-from agents.feedback_analyzer import analyze_feedback
-from agents.patterndetector import detect_patterns
-from agents.insight_generator import generate_insights
-from agents.evaluation_engine import evaluate_system
-
-
-def run_pipeline(raw_feedback_list):
-    structured_results = []
-
-    print("\n--- Running Agent 1 (Feedback Analyzer) ---")
-
-    for feedback in raw_feedback_list:
-        result = analyze_feedback(feedback)
-        structured_results.append(result)
-        print("Processed:", feedback)
-
-    print("\n--- Running Agent 2 (Pattern Detector) ---")
-
-    pattern_output = detect_patterns(structured_results)
-
-    print("\n--- Running Agent 3 (Insight Generator) ---")
-    insight_output = generate_insights(pattern_output)
-
-    print("\n--- Running Evaluation Layer ---")
-    evaluation_output = evaluate_system(pattern_output)
-
-    return {
-        "pattern_analysis": pattern_output,
-        "insight_memo": insight_output,
-        "system_evaluation": evaluation_output
-    }
-
-
-if __name__ == "__main__":
-
-    sample_feedback = [
-        "App crashes when uploading images.",
-        "Upload fails for large PDF files.",
-        "File upload not working properly.",
-        "Dashboard takes too long to load.",
-        "The app feels very slow after update.",
-        "Reports page is lagging badly.",
-        "Login session expires too quickly.",
-        "Cannot log in with correct password.",
-        "OTP verification fails sometimes.",
-        "Please add dark mode.",
-        "Would love an export to Excel feature.",
-        "Add multi-language support.",
-        "Love the new UI design!",
-        "Great job on the latest update.",
-        "Good but needs improvement.",
-        "It works fine most of the time.",
-        "",
-        "???",
-        "App good but sometimes bad."
-    ]
-
-    final_result = run_pipeline(sample_feedback)
-
-    print("\n=== FINAL PATTERN ANALYSIS ===")
-    print(final_result["pattern_analysis"])
-
-    print("\n=== PRODUCT INSIGHT MEMO ===")
-    print(final_result["insight_memo"])
-
-    print("\n=== SYSTEM EVALUATION SUMMARY ===")
-    print(final_result["system_evaluation"])
-# main_pipeline.py
 # LangGraph Orchestrated Pipeline (Primary)
 # Manual Python Orchestration kept for learning reference
 
 from typing import TypedDict, List, Dict
-from langgraph.graph import StateGraph
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, END
+
+from langchain_core.runnables import RunnableConfig
 
-from agents.feedback_analyzer import analyze_feedback
+from agents.feedback_analyzer import run_agent1_stage
+from agents.feedback_record import Category, FeedbackRecord, Priority, Sentiment
 from agents.patterndetector import detect_patterns
 from agents.insight_generator import generate_insights
+from agents.memo_cache import open_memo_cache
 from agents.evaluation_engine import evaluate_system
+from agents.trend_store import record_trends
+from agents.retry_queue import RetryQueue
+from agents.report_exporter import generate_pdf
+from agents.instrumentation import critical_path, recording, stage
 
 
 # =========================================================
 # =============== LEARNING VERSION (MANUAL) ==============
 # =========================================================
 
-def run_manual_pipeline(raw_feedback_list):
+def run_manual_pipeline(raw_feedback_list, max_workers=1, item_timeout=None, batch_size=1, use_cache=True,
+                        dedup=False, run_id=None, preclassify=True, trends=None):
     """
     Manual orchestration using plain Python.
-    Kept for learning curve reference.
+    Kept for learning curve reference. Takes the same options as run_pipeline.
     """
 
-    structured_results = []
-
-    for feedback in raw_feedback_list:
-        result = analyze_feedback(feedback)
-        structured_results.append(result)
-
-    pattern_output = detect_patterns(structured_results)
-    insight_output = generate_insights(pattern_output)
-    evaluation_output = evaluate_system(pattern_output)
+    with recording(run_id) as report:
+        with stage("agent1"):
+            structured_results = run_agent1_stage(
+                raw_feedback_list, max_workers, item_timeout, batch_size, use_cache, dedup, run_id, preclassify,
+                retry_queue=RetryQueue()
+            )
+
+        with stage("agent2"):
+            pattern_output = detect_patterns(structured_results)
+        with stage("agent3"):
+            memo_cache = open_memo_cache(use_cache)
+            try:
+                insight_output = generate_insights(pattern_output, cache=memo_cache)
+            finally:
+                if memo_cache is not None:
+                    memo_cache.close()
+        with stage("evaluation"):
+            trend_flags = record_trends(pattern_output, trends, run_id=run_id)
+            evaluation_output = evaluate_system(pattern_output, trend_flags)
 
     return {
         "pattern_analysis": pattern_output,
         "insight_memo": insight_output,
-        "system_evaluation": evaluation_output
+        "system_evaluation": evaluation_output,
+        "run_report": report.to_dict()
     }
 
 
@@ -113,50 +66,222 @@ def run_manual_pipeline(raw_feedback_list):
 
 class PipelineState(TypedDict):
     raw_feedback: List[str]
-    structured_results: List[Dict]
+    structured_results: List[FeedbackRecord]
     pattern_analysis: Dict
     insight_memo: str
     system_evaluation: str
+    memo_pdf: bytes
 
 
-def agent1_node(state: PipelineState):
-    structured = []
-    for feedback in state["raw_feedback"]:
-        result = analyze_feedback(feedback)
-        structured.append(result)
+# Stage -> stages it waits for. Stages with the same parent run in parallel,
+# e.g. the deterministic evaluation does not wait for the LLM memo.
+STAGE_DEPENDENCIES = {
+    "agent1": [],
+    "agent2": ["agent1"],
+    "agent3": ["agent2"],
+    "evaluation": ["agent2"],
+    "pdf": ["agent3"]
+}
+
+
+# Custom types stored in checkpoints, allowlisted for the checkpointer's msgpack serializer
+CHECKPOINT_TYPES = [(cls.__module__, cls.__name__) for cls in (FeedbackRecord, Sentiment, Category, Priority)]
+
+
+def initial_state(raw_feedback):
+    return {
+        "raw_feedback": raw_feedback,
+        "structured_results": [],
+        "pattern_analysis": {},
+        "insight_memo": "",
+        "system_evaluation": "",
+        "memo_pdf": b""
+    }
+
+
+def agent1_node(state: PipelineState, config: RunnableConfig):
+    # Agent 1 options come from config["configurable"], e.g.
+    # graph.invoke(state, config={"configurable": {"max_workers": 8}})
+    # A run_id (or the checkpointer's thread_id) journals Agent 1 progress
+    # so an interrupted run resumes mid-node. With "progress_every", results
+    # go out on the "custom" stream as {"agent1_results": [...]} in groups of
+    # that size, and "check_cancelled" (a callable that raises to stop the
+    # run) is called after each group.
+    configurable = config.get("configurable", {})
+    progress_every = configurable.get("progress_every")
+    check_cancelled = configurable.get("check_cancelled")
+
+    write = get_stream_writer()
+    pending = []
+
+    def report_progress(result=None):
+        if result is not None:
+            pending.append(result)
+        if pending and (result is None or len(pending) >= progress_every):
+            write({"agent1_results": list(pending)})
+            pending.clear()
+            if check_cancelled is not None:
+                check_cancelled()
+
+    with stage("agent1"):
+        structured = run_agent1_stage(
+            state["raw_feedback"],
+            max_workers=configurable.get("max_workers", 1),
+            item_timeout=configurable.get("item_timeout"),
+            batch_size=configurable.get("batch_size", 1),
+            use_cache=configurable.get("use_cache", True),
+            dedup=configurable.get("dedup", False),
+            run_id=configurable.get("run_id") or configurable.get("thread_id"),
+            preclassify=configurable.get("preclassify", True),
+            retry_queue=RetryQueue(),
+            on_result=report_progress if progress_every else None
+        )
+    if progress_every:
+        report_progress()
 
     return {"structured_results": structured}
 
 
 def agent2_node(state: PipelineState):
-    pattern_output = detect_patterns(state["structured_results"])
+    with stage("agent2"):
+        pattern_output = detect_patterns(state["structured_results"])
     return {"pattern_analysis": pattern_output}
 
 
-def agent3_node(state: PipelineState):
-    insight_output = generate_insights(state["pattern_analysis"])
-    return {"insight_memo": insight_output}
+def agent3_node(state: PipelineState, config: RunnableConfig):
+    # Memo chunks go out on the "custom" stream as they arrive, e.g.
+    # graph.stream(state, stream_mode=["updates", "custom"])
+    # An unchanged pattern analysis gets its memo from the memo cache:
+    # configurable "memo_cache" passes an open MemoCache (e.g. the app's
+    # shared one), otherwise one is opened for the node unless "use_cache" is off.
+    # "check_cancelled" is called after every chunk.
+    configurable = config.get("configurable", {})
+    check_cancelled = configurable.get("check_cancelled")
+    memo_cache = configurable.get("memo_cache")
+    owned_cache = None
+    if memo_cache is None:
+        memo_cache = owned_cache = open_memo_cache(configurable.get("use_cache", True))
+
+    write = get_stream_writer()
+    chunks = []
+
+    try:
+        with stage("agent3"):
+            stream = generate_insights(state["pattern_analysis"], stream=True, cache=memo_cache)
+            try:
+                for text in stream:
+                    chunks.append(text)
+                    write({"memo_chunk": text})
+                    if check_cancelled is not None:
+                        check_cancelled()
+            finally:
+                # Closing the memo generator ends its model stream early
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+    finally:
+        if owned_cache is not None:
+            owned_cache.close()
+    return {"insight_memo": "".join(chunks)}
+
+
+def evaluation_node(state: PipelineState, config: RunnableConfig):
+    # configurable "trends" ("hour"/"day") adds spike flags from the trend store;
+    # a run_id (or thread_id) is recorded once per window however often it is re-run
+    configurable = config.get("configurable", {})
+    run_id = configurable.get("run_id") or configurable.get("thread_id")
+
+    with stage("evaluation"):
+        trend_flags = record_trends(state["pattern_analysis"], configurable.get("trends"), run_id=run_id)
+        evaluation_output = evaluate_system(state["pattern_analysis"], trend_flags)
+    return {"system_evaluation": evaluation_output}
 
 
-def evaluation_node(state: PipelineState):
-    evaluation_output = evaluate_system(state["pattern_analysis"])
-    return {"system_evaluation": evaluation_output}
+def pdf_node(state: PipelineState):
+    with stage("pdf"):
+        memo_pdf = generate_pdf(state["insight_memo"])
+    return {"memo_pdf": memo_pdf}
 
 
-def build_langgraph_pipeline():
+def build_langgraph_pipeline(checkpointer=None):
+    """
+    Agent 2 fans out into two branches that run in parallel:
+    Agent 3 memo → PDF export, and the evaluation layer. The run ends
+    when both branches have finished (see STAGE_DEPENDENCIES).
+
+    checkpointer: optional LangGraph checkpointer (e.g. MemorySaver or
+    SqliteSaver). With one, invoke with {"configurable": {"thread_id": ...}}
+    and completed nodes are not re-run when the same thread is resumed.
+    """
     workflow = StateGraph(PipelineState)
 
     workflow.add_node("Agent1", agent1_node)
     workflow.add_node("Agent2", agent2_node)
     workflow.add_node("Agent3", agent3_node)
     workflow.add_node("Evaluation", evaluation_node)
+    workflow.add_node("PDF", pdf_node)
 
     workflow.set_entry_point("Agent1")
     workflow.add_edge("Agent1", "Agent2")
     workflow.add_edge("Agent2", "Agent3")
-    workflow.add_edge("Agent3", "Evaluation")
+    workflow.add_edge("Agent2", "Evaluation")
+    workflow.add_edge("Agent3", "PDF")
+    workflow.add_edge(["PDF", "Evaluation"], END)
+
+    if checkpointer is not None and hasattr(checkpointer, "with_allowlist"):
+        checkpointer = checkpointer.with_allowlist(CHECKPOINT_TYPES)
+
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def run_pipeline(raw_feedback_list, max_workers=1, item_timeout=None, batch_size=1, use_cache=True,
+                 dedup=False, run_id=None, preclassify=True, trends=None):
+    """
+    Runs all agents over raw_feedback_list through the LangGraph pipeline,
+    so the memo, evaluation and PDF branches run in parallel after Agent 2.
+
+    max_workers > 1 fans Agent 1 out over a bounded worker pool and
+    batch_size > 1 packs several feedback lines into one prompt;
+    results keep the input order either way. use_cache=False bypasses
+    the persistent Agent 1 classification cache and the memo cache
+    (agents/memo_cache.py), and dedup=True sends one representative
+    per group of near-duplicate lines to the LLM. With a run_id, Agent 1
+    progress is checkpointed and a re-run with the same run_id resumes.
+    preclassify=False sends trivial lines ("", "???", pure praise) to the
+    LLM too; preclassify="agreement" does so and reports how often the
+    local answers agree with the LLM. trends="hour" or "day" records the
+    run's counts in the trend store (agents/trend_store.py) and lists
+    spikes against the rolling baseline in the evaluation.
+
+    The returned "run_report" holds per-stage timings, the critical path
+    through the stage graph and per-call LLM latency/token counts
+    (see agents/instrumentation.py).
+    """
+    graph = build_langgraph_pipeline()
+    config = {"configurable": {
+        "max_workers": max_workers,
+        "item_timeout": item_timeout,
+        "batch_size": batch_size,
+        "use_cache": use_cache,
+        "dedup": dedup,
+        "run_id": run_id,
+        "preclassify": preclassify,
+        "trends": trends
+    }}
+
+    with recording(run_id) as report:
+        final_state = graph.invoke(initial_state(raw_feedback_list), config)
+
+    run_report = report.to_dict()
+    run_report["critical_path"] = critical_path(run_report["stages"], STAGE_DEPENDENCIES)
 
-    return workflow.compile()
+    return {
+        "pattern_analysis": final_state["pattern_analysis"],
+        "insight_memo": final_state["insight_memo"],
+        "system_evaluation": final_state["system_evaluation"],
+        "memo_pdf": final_state["memo_pdf"],
+        "run_report": run_report
+    }
 
 
 # =========================================================
@@ -191,13 +316,8 @@ if __name__ == "__main__":
 
     graph = build_langgraph_pipeline()
 
-    final_state = graph.invoke({
-        "raw_feedback": sample_feedback,
-        "structured_results": [],
-        "pattern_analysis": {},
-        "insight_memo": "",
-        "system_evaluation": ""
-    })
+    with recording() as report:
+        final_state = graph.invoke(initial_state(sample_feedback))
 
     print("\n=== FINAL PATTERN ANALYSIS ===")
     print(final_state["pattern_analysis"])
@@ -206,4 +326,10 @@ if __name__ == "__main__":
     print(final_state["insight_memo"])
 
     print("\n=== SYSTEM EVALUATION SUMMARY ===")
-    print(final_state["system_evaluation"])
\ No newline at end of file
+    print(final_state["system_evaluation"])
+
+    print("\n=== RUN REPORT ===")
+    print(report.to_json())
+
+    print("\n=== CRITICAL PATH ===")
+    print(critical_path(report.to_dict()["stages"], STAGE_DEPENDENCIES))
\ No newline at end of file
@@ -1,5 +1,4 @@
-import ollama
-import json
+from agents.structured_output import SENTIMENT_SCHEMA, parse_json, schema_chat
 
 
 def analyze_sentiment(feedback_text):
@@ -18,9 +17,10 @@ Feedback:
 "{feedback_text}"
 """
 
-    response = ollama.chat(
-        model="llama3",
-        messages=[
+    response = schema_chat(
+        "sentiment",
+        SENTIMENT_SCHEMA,
+        [
             {"role": "user", "content": prompt}
         ]
     )
@@ -28,12 +28,11 @@ Feedback:
     content = response["message"]["content"]
     print("RAW MODEL OUTPUT:")
     print(content) 
-    # Extract JSON block safely
-    start = content.find("{")
-    end = content.rfind("}") + 1
-    json_string = content[start:end]
 
-    return json.loads(json_string)
+    parsed = parse_json("sentiment", content)
+    if parsed is None:
+        raise ValueError(f"Could not parse sentiment from model output: {content!r}")
+    return parsed
 if __name__ == "__main__":
     sample_feedback = "The app crashes every time I try to upload a file."
 
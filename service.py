@@ -0,0 +1,408 @@
+# service.py
+# Long-Running HTTP Service (ASGI)
+# Purpose:
+# Serves the agents to other services over HTTP, without Streamlit:
+# - POST /analyze   Agent 1 for one line ({"feedback": "..."}) or a list
+# - POST /patterns  Agent 2 over Agent 1 results or raw feedback lines
+# - POST /insights  Agent 3 memo for a pattern analysis (optionally streamed)
+# - POST /evaluate  evaluation summary for a pattern analysis (an optional
+#                   "run_id" records the run in the trend store only once)
+# - GET  /health, GET /metrics (Prometheus text)
+# Concurrent /analyze requests are micro-batched: lines arriving within a
+# few milliseconds of each other share one batched Agent 1 prompt (and the
+# classification cache, near-duplicate collapsing and pre-classifier).
+# Memos for an unchanged pattern analysis come from the memo cache.
+# On SIGTERM (python service.py) the service first reports "draining" on
+# /health (503) and refuses new lines for --drain-delay seconds, so a load
+# balancer stops routing to it; then it closes its socket and finishes the
+# queued and in-flight batches before closing the caches. Under a plain
+# `uvicorn service:app` the drain starts when uvicorn shuts down.
+#
+# Usage:
+#   python service.py --port 8000 --max-batch-size 10 --max-wait-ms 20
+#   uvicorn service:app --port 8000
+#   curl -X POST localhost:8000/analyze -d '{"feedback": "Upload fails for large files"}'
+
+import argparse
+import asyncio
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from agents.feedback_analyzer import analyze_feedback_list, open_cache
+from agents.feedback_record import as_record
+from agents.patterndetector import detect_patterns
+from agents.preclassifier import open_preclassifier
+from agents.insight_generator import generate_insights
+from agents.memo_cache import open_memo_cache
+from agents.evaluation_engine import evaluate_system
+from agents.trend_store import record_trends
+from agents.instrumentation import GLOBAL_REPORT, prometheus_text, stage
+from agents.llm_backend import DEFAULT_MAX_IN_FLIGHT, OllamaBackend, configure_llm
+
+
+# Lines per shared Agent 1 prompt, and how long the first line of a batch
+# waits for others to join it
+DEFAULT_MAX_BATCH_SIZE = 10
+DEFAULT_MAX_WAIT_SECONDS = 0.02
+
+# Batches analyzed at the same time (each holds one worker thread)
+DEFAULT_MAX_CONCURRENT_BATCHES = 4
+
+# Seconds between SIGTERM and closing the listening socket, while /health
+# already answers 503
+DEFAULT_DRAIN_DELAY_SECONDS = 5
+
+
+class ServiceDraining(Exception):
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects single feedback lines from concurrent requests into batches.
+
+    A batch is dispatched once it holds max_batch_size lines or its first
+    line has waited max_wait seconds. analyze_batch(lines) runs in a worker
+    thread and must return one result per line, in order.
+    """
+
+    def __init__(self, analyze_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT_SECONDS,
+                 max_concurrent_batches=DEFAULT_MAX_CONCURRENT_BATCHES):
+        if max_batch_size < 1 or max_concurrent_batches < 1:
+            raise ValueError("max_batch_size and max_concurrent_batches must be at least 1")
+
+        self.analyze_batch = analyze_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrent_batches = max_concurrent_batches
+        self.draining = False
+        self.stats = Counter()
+        self._queue = None
+        self._slots = None
+        self._in_flight = set()
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def batches_in_flight(self):
+        return len(self._in_flight)
+
+    async def submit(self, feedback_text):
+        """
+        Queues one line and waits for its result.
+
+        Raises:
+            ServiceDraining: If the service is shutting down.
+        """
+        if self.draining or self._task is None:
+            raise ServiceDraining()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((feedback_text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._slots.acquire()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            results = await asyncio.to_thread(self.analyze_batch, [text for text, _ in batch])
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    async def drain(self):
+        """
+        Stops accepting lines, then waits for every queued and in-flight batch.
+        """
+        self.draining = True
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+
+def _error(message, status_code=400):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def create_app(max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT_SECONDS,
+               max_concurrent_batches=DEFAULT_MAX_CONCURRENT_BATCHES, item_timeout=None, use_cache=True,
+               dedup=False, preclassify=True, trends=None):
+    """
+    Builds the ASGI application.
+
+    Parameters:
+        max_batch_size (int): Lines per micro-batch (and per Agent 1 prompt).
+        max_wait (float): Seconds a batch waits for more lines.
+        max_concurrent_batches (int): Micro-batches analyzed at once.
+        item_timeout (float, optional): Per-request LLM timeout in seconds.
+        use_cache, dedup, preclassify: as in main_pipeline.run_pipeline.
+        trends (str, optional): "hour" or "day" records every /evaluate call
+            in the trend store and adds spike flags to the summary. A call
+            whose body has a "run_id" replaces that run's earlier counts.
+    """
+    resources = {}
+
+    def analyze_batch(lines):
+        with stage("agent1"):
+            return analyze_feedback_list(
+                lines, max_workers=1, item_timeout=item_timeout, batch_size=max_batch_size,
+                cache=resources.get("cache"), dedup=dedup, preclassifier=resources.get("preclassifier")
+            )
+
+    batcher = MicroBatcher(analyze_batch, max_batch_size, max_wait, max_concurrent_batches)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        resources["cache"] = open_cache(use_cache)
+        resources["memo_cache"] = open_memo_cache(use_cache)
+        resources["preclassifier"] = open_preclassifier(preclassify)
+        batcher.start()
+        print(f"Service ready: micro-batches of up to {max_batch_size} lines, {max_wait * 1000:.0f} ms wait")
+        try:
+            yield
+        finally:
+            print(f"Draining {batcher.queue_depth} queued line(s) and {batcher.batches_in_flight} batch(es)...")
+            await batcher.drain()
+            for name in ("cache", "memo_cache"):
+                if resources[name] is not None:
+                    resources[name].close()
+            print("Service stopped.")
+
+    async def analyze_lines(lines):
+        return await asyncio.gather(*(batcher.submit(str(line)) for line in lines))
+
+    async def analyze(request: Request):
+        body = await _json_body(request)
+        if body is None or "feedback" not in body:
+            return _error('expected {"feedback": "..."} or {"feedback": [...]}')
+
+        feedback = body["feedback"]
+        try:
+            if isinstance(feedback, list):
+                results = await analyze_lines(feedback)
+                return JSONResponse({"results": [result.to_dict() for result in results]})
+            result = await batcher.submit(str(feedback))
+        except ServiceDraining:
+            return _error("service is shutting down", 503)
+        return JSONResponse(result.to_dict())
+
+    async def patterns(request: Request):
+        body = await _json_body(request)
+        if body is None or not isinstance(body.get("results", body.get("feedback")), list):
+            return _error('expected {"results": [...]} (Agent 1 results) or {"feedback": [...]}')
+
+        try:
+            if "results" in body:
+                results = [as_record(result) for result in body["results"]]
+            else:
+                results = await analyze_lines(body["feedback"])
+        except ServiceDraining:
+            return _error("service is shutting down", 503)
+        except (KeyError, ValueError, TypeError) as e:
+            return _error(f"invalid Agent 1 result: {e}")
+
+        def run_agent2():
+            with stage("agent2"):
+                return detect_patterns(results, theme_method=body.get("theme_method", "auto"))
+
+        return JSONResponse(await asyncio.to_thread(run_agent2))
+
+    async def insights(request: Request):
+        body = await _json_body(request)
+        if body is None or not isinstance(body.get("pattern_analysis"), dict):
+            return _error('expected {"pattern_analysis": {...}}')
+
+        # Streamed memos are iterated in Starlette's thread pool as chunks arrive
+        if body.get("stream"):
+            return StreamingResponse(
+                generate_insights(body["pattern_analysis"], stream=True, cache=resources.get("memo_cache")),
+                media_type="text/plain"
+            )
+
+        def run_agent3():
+            with stage("agent3"):
+                return generate_insights(body["pattern_analysis"], cache=resources.get("memo_cache"))
+
+        return JSONResponse({"insight_memo": await asyncio.to_thread(run_agent3)})
+
+    async def evaluate(request: Request):
+        body = await _json_body(request)
+        if body is None or not isinstance(body.get("pattern_analysis"), dict):
+            return _error('expected {"pattern_analysis": {...}}')
+
+        def run_evaluation():
+            with stage("evaluation"):
+                trend_flags = record_trends(body["pattern_analysis"], trends, run_id=body.get("run_id"))
+                return evaluate_system(body["pattern_analysis"], trend_flags)
+
+        return JSONResponse({"system_evaluation": await asyncio.to_thread(run_evaluation)})
+
+    async def health(request: Request):
+        status = {
+            "status": "draining" if batcher.draining else "ok",
+            "queue_depth": batcher.queue_depth,
+            "batches_in_flight": batcher.batches_in_flight
+        }
+        return JSONResponse(status, status_code=503 if batcher.draining else 200)
+
+    async def metrics(request: Request):
+        lines = [prometheus_text(GLOBAL_REPORT.to_dict())]
+        gauges = {
+            "service_queue_depth": ("gauge", "Lines waiting for a micro-batch", batcher.queue_depth),
+            "service_batches_in_flight": ("gauge", "Micro-batches being analyzed", batcher.batches_in_flight),
+            "service_batches_total": ("counter", "Micro-batches analyzed", batcher.stats["batches"]),
+            "service_batched_items_total": ("counter", "Lines analyzed in micro-batches", batcher.stats["items"]),
+            "service_failed_batches_total": ("counter", "Micro-batches that raised", batcher.stats["failed_batches"])
+        }
+        for name, (kind, help_text, value) in gauges.items():
+            lines.append(f"# HELP feedback_engine_{name} {help_text}\n# TYPE feedback_engine_{name} {kind}\n"
+                         f"feedback_engine_{name} {value}\n")
+        return PlainTextResponse("".join(lines), media_type="text/plain; version=0.0.4")
+
+    app = Starlette(
+        routes=[
+            Route("/analyze", analyze, methods=["POST"]),
+            Route("/patterns", patterns, methods=["POST"]),
+            Route("/insights", insights, methods=["POST"]),
+            Route("/evaluate", evaluate, methods=["POST"]),
+            Route("/health", health, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"])
+        ],
+        lifespan=lifespan
+    )
+    app.state.batcher = batcher
+    return app
+
+
+app = create_app()
+
+
+def serve(service, host, port, drain_delay=DEFAULT_DRAIN_DELAY_SECONDS, drain_timeout=30):
+    """
+    Runs `service` under uvicorn. The first SIGINT/SIGTERM marks the
+    batcher as draining at once and hands over to uvicorn's shutdown
+    (stop accepting connections, wait for open requests, lifespan drain)
+    drain_delay seconds later; a second signal skips the delay.
+    """
+    import uvicorn
+
+    batcher = service.state.batcher
+
+    class DrainingServer(uvicorn.Server):
+        def handle_exit(self, sig, frame):
+            if batcher.draining or drain_delay <= 0:
+                super().handle_exit(sig, frame)
+                return
+            batcher.draining = True
+            print(f"Draining: /health reports 503, shutting down in {drain_delay:g} s...")
+            timer = threading.Timer(drain_delay, super().handle_exit, (sig, frame))
+            timer.daemon = True
+            timer.start()
+
+    config = uvicorn.Config(service, host=host, port=port, timeout_graceful_shutdown=drain_timeout)
+    DrainingServer(config).run()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Serve the feedback agents over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ollama-host", help="Ollama server URL (default: $OLLAMA_HOST or localhost)")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="concurrent requests sent to the Ollama server")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="feedback lines per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_SECONDS * 1000,
+                        help="how long a micro-batch waits for more lines")
+    parser.add_argument("--max-concurrent-batches", type=int, default=DEFAULT_MAX_CONCURRENT_BATCHES)
+    parser.add_argument("--timeout", type=float, help="per-request LLM timeout in seconds")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the classification cache")
+    parser.add_argument("--dedup", action="store_true", help="collapse near-duplicate lines before Agent 1")
+    parser.add_argument("--no-preclassify", action="store_true", help="send trivial lines to the LLM too")
+    parser.add_argument("--trends", choices=["hour", "day"], help="record /evaluate calls and flag spikes")
+    parser.add_argument("--drain-delay", type=float, default=DEFAULT_DRAIN_DELAY_SECONDS,
+                        help="seconds /health reports draining before the service stops listening")
+    parser.add_argument("--drain-timeout", type=float, default=30,
+                        help="seconds to wait for open requests on shutdown")
+    args = parser.parse_args()
+
+    configure_llm(backend=OllamaBackend(host=args.ollama_host, max_in_flight=args.max_in_flight))
+
+    service = create_app(
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait_ms / 1000,
+        max_concurrent_batches=args.max_concurrent_batches,
+        item_timeout=args.timeout,
+        use_cache=not args.no_cache,
+        dedup=args.dedup,
+        preclassify=not args.no_preclassify,
+        trends=args.trends
+    )
+
+    serve(service, args.host, args.port, args.drain_delay, args.drain_timeout)
+
+
+if __name__ == "__main__":
+    main()
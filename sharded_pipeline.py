@@ -0,0 +1,344 @@
+# sharded_pipeline.py
+# Multi-Process Sharded Runner: N × (Agent 1 → partial Agent 2) → merge → Agent 3
+# Splits one feedback file across worker processes, so parsing,
+# normalization and counting are not bound by one interpreter's GIL and
+# each shard can talk to its own Ollama host:
+# - shard k takes every line whose position in the file is k modulo N
+# - each worker runs Agent 1 and folds its results into a PatternAccumulator
+# - the reducer sums the partial counter states (merge_states), resolves
+#   themes over the merged problem counts and makes one Agent 3 call
+# With a run ID, finished shard states are stored in .cache/shards/<run_id>/
+# and each shard journals its chunks, so a failed or stale shard can be
+# re-run on its own and merged with the others again.
+#
+# Usage:
+#   python sharded_pipeline.py feedback.csv --shards 4 --hosts http://gpu1:11434 http://gpu2:11434
+#   python sharded_pipeline.py feedback.csv --shards 4 --run-id 2024-06-01 --rerun-shards 2
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from agents.feedback_analyzer import open_cache
+from agents.patterndetector import PatternAccumulator, merge_states
+from agents.preclassifier import open_preclassifier
+from agents.run_journal import RunJournal
+from agents.insight_generator import generate_insights
+from agents.memo_cache import open_memo_cache
+from agents.evaluation_engine import evaluate_system
+from agents.trend_store import record_trends
+from agents.instrumentation import recording, stage
+from agents.llm_backend import DEFAULT_MAX_IN_FLIGHT, OllamaBackend, configure_llm
+from streaming_pipeline import DEFAULT_CHUNK_SIZE, iter_feedback_file, iter_streaming_pipeline, retry_stream_failures
+
+
+DEFAULT_SHARD_DIR = os.path.join(".cache", "shards")
+
+
+def iter_shard(path, shard, num_shards, column="feedback", file_format=None):
+    """
+    Yields the feedback lines of one shard: every line whose position in
+    the file is `shard` modulo `num_shards`. Membership only depends on
+    the file, so a shard can be re-run on its own.
+    """
+    for index, line in enumerate(iter_feedback_file(path, column, file_format)):
+        if index % num_shards == shard:
+            yield line
+
+
+def run_shard(path, shard, num_shards, host=None, options=None):
+    """
+    Worker entry point: Agent 1 and the partial Agent 2 counters for one shard.
+
+    Parameters:
+        host (str, optional): Ollama server for this shard. None keeps the
+            worker's default backend.
+        options (dict, optional): column, file_format, chunk_size, max_workers,
+            item_timeout, batch_size, use_cache, dedup, preclassify, run_id,
+            max_in_flight.
+
+    Returns:
+        dict: {"shard", "num_shards", "host", "items", "seconds",
+               "state" (PatternAccumulator.to_state()), "run_report"}
+    """
+    options = options or {}
+    if host:
+        configure_llm(backend=OllamaBackend(host=host, max_in_flight=options.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT)))
+
+    run_id = options.get("run_id")
+    accumulator = PatternAccumulator()
+    started = time.perf_counter()
+
+    with recording(run_id) as report:
+        journal = RunJournal(f"{run_id}-shard{shard}of{num_shards}") if run_id else None
+        cache = open_cache(options.get("use_cache", True))
+        preclassifier = open_preclassifier(options.get("preclassify", True))
+        failures = []
+        try:
+            with stage("agent1"):
+                progress = iter_streaming_pipeline(
+                    iter_shard(path, shard, num_shards, options.get("column", "feedback"), options.get("file_format")),
+                    accumulator,
+                    options.get("chunk_size", DEFAULT_CHUNK_SIZE),
+                    options.get("max_workers", 1),
+                    options.get("item_timeout"),
+                    options.get("batch_size", 1),
+                    cache,
+                    options.get("dedup", False),
+                    journal,
+                    preclassifier,
+                    failures
+                )
+                for update in progress:
+                    print(f"[shard {shard + 1}/{num_shards}] processed {update['items_processed']}")
+
+                retry_stream_failures(
+                    failures, accumulator, options.get("max_workers", 1), options.get("item_timeout"),
+                    options.get("batch_size", 1), cache, run_id, options.get("dedup", False), preclassifier
+                )
+        finally:
+            if cache is not None:
+                cache.close()
+
+    return {
+        "shard": shard,
+        "num_shards": num_shards,
+        "host": host,
+        "items": accumulator.items,
+        "seconds": round(time.perf_counter() - started, 4),
+        "state": accumulator.to_state(),
+        "run_report": report.to_dict()
+    }
+
+
+class ShardStore:
+    """
+    Finished shard results of one run ID, one JSON file per shard.
+    A stored shard is only reused for the same input file (path, size,
+    modification time) and shard count.
+    """
+
+    def __init__(self, run_id, path, num_shards, directory=DEFAULT_SHARD_DIR):
+        if not run_id or os.sep in str(run_id):
+            raise ValueError("run_id must be a non-empty name without path separators")
+
+        self.directory = os.path.join(directory, run_id)
+        os.makedirs(self.directory, exist_ok=True)
+        stat = os.stat(path)
+        self.source = {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+        self.num_shards = num_shards
+
+    def _path(self, shard):
+        return os.path.join(self.directory, f"shard-{shard}-of-{self.num_shards}.json")
+
+    def load(self, shard):
+        try:
+            with open(self._path(shard), encoding="utf-8") as handle:
+                stored = json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+        if stored.get("source") != self.source:
+            print(f"⚠️ Stored shard {shard + 1}/{self.num_shards} was built from another input; re-running it.")
+            return None
+        return stored["result"]
+
+    def save(self, result):
+        # Written to a temporary file first, so a crash never leaves half a shard
+        path = self._path(result["shard"])
+        with open(path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump({"source": self.source, "result": result}, handle)
+        os.replace(path + ".tmp", path)
+
+
+def run_sharded_pipeline(path, num_shards=2, hosts=None, column="feedback", file_format=None,
+                         chunk_size=DEFAULT_CHUNK_SIZE, max_workers=1, item_timeout=None, batch_size=1,
+                         use_cache=True, dedup=False, preclassify=True, theme_method="auto", theme_index=None,
+                         run_id=None, rerun_shards=(), max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                         start_method="spawn", trends=None):
+    """
+    Runs Agent 1 over `num_shards` worker processes, merges their partial
+    Agent 2 states and runs themes, Agent 3 and the evaluation once.
+
+    Parameters:
+        hosts (list[str], optional): Ollama servers; shard k uses
+            hosts[k % len(hosts)]. Defaults to each worker's default backend.
+        run_id (str, optional): Stores finished shards and journals each
+            shard's chunks; a re-run reuses stored shards.
+        rerun_shards (iterable[int]): Shards to re-run even if stored.
+        start_method (str): multiprocessing start method for the workers.
+
+    Returns:
+        dict: same shape as streaming_pipeline.run_streaming_pipeline; the
+              run report also lists each shard's host, items and seconds.
+
+    Raises:
+        RuntimeError: If any shard failed. With a run ID, the finished
+            shards are kept, so re-running only repeats the failed ones.
+    """
+    if num_shards < 1:
+        raise ValueError("num_shards must be at least 1")
+
+    hosts = list(hosts or [None])
+    store = ShardStore(run_id, path, num_shards) if run_id else None
+    options = {
+        "column": column,
+        "file_format": file_format,
+        "chunk_size": chunk_size,
+        "max_workers": max_workers,
+        "item_timeout": item_timeout,
+        "batch_size": batch_size,
+        "use_cache": use_cache,
+        "dedup": dedup,
+        "preclassify": preclassify,
+        "run_id": run_id,
+        "max_in_flight": max_in_flight
+    }
+
+    results = {}
+    if store is not None:
+        for shard in range(num_shards):
+            if shard not in rerun_shards:
+                stored = store.load(shard)
+                if stored is not None:
+                    results[shard] = stored
+        if results:
+            print(f"Reusing {len(results)} stored shard(s) of run {run_id!r}")
+
+    pending = [shard for shard in range(num_shards) if shard not in results]
+
+    with recording(run_id) as report:
+        print(f"\n--- Running Agent 1 over {len(pending)} shard(s) ---")
+
+        failed = []
+        with stage("agent1"):
+            if pending:
+                context = multiprocessing.get_context(start_method)
+                with ProcessPoolExecutor(max_workers=len(pending), mp_context=context) as pool:
+                    futures = {
+                        pool.submit(run_shard, path, shard, num_shards, hosts[shard % len(hosts)], options): shard
+                        for shard in pending
+                    }
+                    for future in as_completed(futures):
+                        shard = futures[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"⚠️ Shard {shard + 1}/{num_shards} failed: {e}")
+                            failed.append(shard)
+                            continue
+
+                        results[shard] = result
+                        if store is not None:
+                            store.save(result)
+                        print(f"Shard {shard + 1}/{num_shards} done: {result['items']} items in {result['seconds']}s")
+
+        if failed:
+            hint = " Re-run with the same run_id to repeat only those shards." if run_id else ""
+            raise RuntimeError(f"Shards {sorted(failed)} failed.{hint}")
+
+        print("\n--- Running Agent 2 (merging shard states) ---")
+        with stage("agent2"):
+            accumulator = merge_states(results[shard]["state"] for shard in range(num_shards))
+            pattern_output = accumulator.finalize(theme_method, theme_index)
+
+        print("\n--- Running Agent 3 (Insight Generator) ---")
+        with stage("agent3"):
+            memo_cache = open_memo_cache(use_cache)
+            try:
+                insight_output = generate_insights(pattern_output, cache=memo_cache)
+            finally:
+                if memo_cache is not None:
+                    memo_cache.close()
+
+        print("\n--- Running Evaluation Layer ---")
+        with stage("evaluation"):
+            trend_flags = record_trends(pattern_output, trends, run_id=run_id)
+            evaluation_output = evaluate_system(pattern_output, trend_flags)
+
+    run_report = report.to_dict()
+    run_report["shards"] = [
+        {key: results[shard][key] for key in ("shard", "host", "items", "seconds")}
+        for shard in range(num_shards)
+    ]
+
+    return {
+        "items_processed": accumulator.items,
+        "pattern_analysis": pattern_output,
+        "insight_memo": insight_output,
+        "system_evaluation": evaluation_output,
+        "run_report": run_report
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Agent 1 over a feedback file in parallel worker processes.")
+    parser.add_argument("path", help="CSV, JSONL or plain-text feedback file")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 2, help="worker processes")
+    parser.add_argument("--hosts", nargs="+", help="Ollama server URLs, assigned to shards round-robin")
+    parser.add_argument("--column", default="feedback", help="feedback field for CSV/JSONL input")
+    parser.add_argument("--format", dest="file_format", choices=["csv", "jsonl", "txt"])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="concurrent Agent 1 requests per shard (capped by --max-in-flight)")
+    parser.add_argument("--timeout", type=float, help="per-request timeout in seconds")
+    parser.add_argument("--batch-size", type=int, default=1, help="feedback lines per Agent 1 prompt")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="concurrent requests each shard sends to its Ollama server")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the classification cache")
+    parser.add_argument("--dedup", action="store_true", help="collapse near-duplicate lines before Agent 1")
+    parser.add_argument("--no-preclassify", action="store_true", help="send trivial lines to the LLM too")
+    parser.add_argument("--run-id", help="store finished shards under this ID and reuse them on a re-run")
+    parser.add_argument("--rerun-shards", type=int, nargs="+", default=[],
+                        help="shard numbers (1-based) to re-run even if stored")
+    parser.add_argument("--trends", choices=["hour", "day"],
+                        help="record counts per hour/day and flag spikes against the rolling baseline")
+    parser.add_argument("--output", help="write the final result as JSON to this path")
+    args = parser.parse_args()
+
+    # Themes and the memo go to the first host
+    if args.hosts:
+        configure_llm(backend=OllamaBackend(host=args.hosts[0], max_in_flight=args.max_in_flight))
+
+    result = run_sharded_pipeline(
+        args.path,
+        num_shards=args.shards,
+        hosts=args.hosts,
+        column=args.column,
+        file_format=args.file_format,
+        chunk_size=args.chunk_size,
+        max_workers=args.workers,
+        item_timeout=args.timeout,
+        batch_size=args.batch_size,
+        use_cache=not args.no_cache,
+        dedup=args.dedup,
+        preclassify=not args.no_preclassify,
+        run_id=args.run_id,
+        rerun_shards={shard - 1 for shard in args.rerun_shards},
+        max_in_flight=args.max_in_flight,
+        trends=args.trends
+    )
+
+    print("\n=== FINAL PATTERN ANALYSIS ===")
+    print(result["pattern_analysis"])
+
+    print("\n=== PRODUCT INSIGHT MEMO ===")
+    print(result["insight_memo"])
+
+    print("\n=== SYSTEM EVALUATION SUMMARY ===")
+    print(result["system_evaluation"])
+
+    print("\n=== SHARDS ===")
+    for shard in result["run_report"]["shards"]:
+        print(f"shard {shard['shard'] + 1}: {shard['items']} items in {shard['seconds']}s ({shard['host'] or 'default host'})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(result, handle, indent=2, default=str)
+        print(f"\nSaved result to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
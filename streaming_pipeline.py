@@ -0,0 +1,323 @@
+# streaming_pipeline.py
+# Streaming Ingestion: large feedback files → Agent 1 → online Agent 2
+# Reads CSV, JSONL or plain-text files lazily, pushes lines through Agent 1
+# in chunks and folds results into running counters, so memory stays flat
+# whatever the file size. Partial aggregates are yielded after every chunk.
+# With a run ID, every chunk is checkpointed and an interrupted run resumes.
+#
+# Usage:
+#   python streaming_pipeline.py feedback.csv --column text --workers 4 --batch-size 10
+#   python streaming_pipeline.py feedback.csv --run-id 2024-06-01   # resumable
+#   python streaming_pipeline.py feedback.csv --agent1-model llama3.2:3b --max-in-flight 8
+
+import argparse
+import csv
+import json
+import os
+from itertools import islice, tee
+
+from agents.feedback_analyzer import analyze_feedback_list, iter_analyze_feedback, open_cache
+from agents.patterndetector import PatternAccumulator
+from agents.preclassifier import open_preclassifier
+from agents.run_journal import RunJournal, iter_journaled_chunks
+from agents.retry_queue import RetryQueue, retry_failures
+from agents.insight_generator import generate_insights
+from agents.memo_cache import open_memo_cache
+from agents.evaluation_engine import evaluate_system
+from agents.trend_store import record_trends
+from agents.instrumentation import prometheus_text, record_event, recording, stage
+from agents.llm_backend import DEFAULT_MAX_IN_FLIGHT, OllamaBackend, configure_llm
+
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def iter_feedback_file(path, column="feedback", file_format=None):
+    """
+    Yields non-empty feedback lines from a file without loading it into memory.
+
+    Blank lines and rows with empty feedback are dropped: in a file they are
+    padding, not feedback. (A list passed to run_pipeline keeps its "" items,
+    which the pre-classifier answers locally.) JSONL lines that are not valid
+    JSON are skipped, counted as "ingest.malformed_line" in the run report,
+    and reported once the file has been read.
+
+    Parameters:
+        path (str): Input file.
+        column (str): Field holding the feedback text in CSV/JSONL input.
+            CSV files without that column fall back to their first column.
+        file_format (str, optional): "csv", "jsonl" or "txt". Defaults to the
+            file extension (anything unrecognised is read as plain text).
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+
+    with open(path, newline="", encoding="utf-8") as handle:
+        if file_format == "csv":
+            reader = csv.DictReader(handle)
+            field = column if column in (reader.fieldnames or []) else (reader.fieldnames or [None])[0]
+            for row in reader:
+                text = (row.get(field) or "").strip()
+                if text:
+                    yield text
+
+        elif file_format in ("jsonl", "ndjson"):
+            malformed = 0
+            for line_number, line in enumerate(handle, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    malformed += 1
+                    record_event("ingest", "malformed_line")
+                    if malformed == 1:
+                        print(f"⚠️ Skipping malformed JSON on line {line_number} of {path}: {e}")
+                    continue
+                text = str(record.get(column, "") if isinstance(record, dict) else record).strip()
+                if text:
+                    yield text
+
+            if malformed:
+                print(f"⚠️ Skipped {malformed} malformed line(s) in {path}.")
+
+        else:
+            for line in handle:
+                text = line.strip()
+                if text:
+                    yield text
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_streaming_pipeline(feedback_iterable, accumulator, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=1,
+                            item_timeout=None, batch_size=1, cache=None, dedup=False, journal=None,
+                            preclassifier=None, failures=None):
+    """
+    Runs Agent 1 over a feedback stream and folds each chunk of results
+    into `accumulator`. With a RunJournal, chunks are checkpointed and
+    journaled chunks are replayed from their saved counter state.
+    A `failures` list receives (line, result) for every failed line, for
+    a deferred retry (see agents/retry_queue.py). The dedup and preclassifier
+    steps work one chunk at a time, so near-duplicates are only collapsed
+    within a chunk and every chunk yields its partial analysis as soon as
+    it is done.
+
+    Yields:
+        dict: {"items_processed": int, "partial_analysis": dict} after each
+              chunk, where partial_analysis is accumulator.snapshot().
+    """
+    # Results come back in input order, so a copy of the input lines them up
+    if failures is not None:
+        feedback_iterable, input_lines = tee(feedback_iterable)
+
+    def collect_failures(results):
+        if failures is not None:
+            lines = islice(input_lines, len(results))
+            failures.extend((line, result) for line, result in zip(lines, results) if result.failed)
+
+    if journal is not None:
+        def analyze_chunk(lines):
+            return analyze_feedback_list(lines, max_workers, item_timeout, batch_size, cache, dedup, preclassifier)
+
+        for results, state, _ in iter_journaled_chunks(feedback_iterable, journal, analyze_chunk, chunk_size):
+            accumulator.merge(PatternAccumulator.from_state(state))
+            collect_failures(results)
+            yield {
+                "items_processed": accumulator.items,
+                "partial_analysis": accumulator.snapshot()
+            }
+        return
+
+    results = iter_analyze_feedback(
+        feedback_iterable, max_workers, item_timeout, batch_size=batch_size, cache=cache, dedup=dedup,
+        preclassifier=preclassifier, window=chunk_size
+    )
+
+    for chunk in _chunked(results, chunk_size):
+        accumulator.update(chunk)
+        collect_failures(chunk)
+        yield {
+            "items_processed": accumulator.items,
+            "partial_analysis": accumulator.snapshot()
+        }
+
+
+def retry_stream_failures(failures, accumulator, max_workers=1, item_timeout=None, batch_size=1, cache=None,
+                          run_id=None, dedup=False, preclassifier=None):
+    """
+    Deferred retry of the failed lines of a streamed run, with the run's
+    cache, dedup and preclassifier options; recovered lines are folded
+    into `accumulator` and the rest go to the RetryQueue.
+    """
+    if not failures:
+        return
+
+    lines = [line for line, _ in failures]
+
+    def analyze_lines(retry_lines):
+        return analyze_feedback_list(retry_lines, max_workers, item_timeout, batch_size, cache, dedup, preclassifier)
+
+    retried = retry_failures(lines, [result for _, result in failures], analyze_lines, RetryQueue(), run_id)
+    accumulator.update_retried(retried)
+
+
+def run_streaming_pipeline(path, column="feedback", file_format=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                           max_workers=1, item_timeout=None, batch_size=1, use_cache=True, dedup=False,
+                           theme_method="auto", theme_index=None, run_id=None, preclassify=True, trends=None):
+    """
+    Streams a feedback file through all agents. A run_id checkpoints each
+    chunk so a re-run with the same run_id skips the finished chunks.
+    trends="hour" or "day" records the run in the trend store and adds
+    spike flags to the evaluation.
+
+    Returns:
+        dict: same shape as main_pipeline.run_pipeline, plus "items_processed".
+    """
+    accumulator = PatternAccumulator()
+
+    with recording(run_id) as report:
+        print("\n--- Running Agent 1 (Feedback Analyzer, streaming) ---")
+
+        journal = RunJournal(run_id) if run_id else None
+        if journal is not None and journal.completed_items:
+            print(f"Resuming run {run_id!r}: {journal.completed_items} items already analyzed")
+
+        cache = open_cache(use_cache)
+        preclassifier = open_preclassifier(preclassify)
+        failures = []
+        try:
+            with stage("agent1"):
+                progress = iter_streaming_pipeline(
+                    iter_feedback_file(path, column, file_format), accumulator, chunk_size,
+                    max_workers, item_timeout, batch_size, cache, dedup, journal, preclassifier, failures
+                )
+                for update in progress:
+                    partial = update["partial_analysis"]
+                    print(
+                        f"Processed {update['items_processed']} | "
+                        f"high priority: {partial['high_priority_count']} | "
+                        f"categories: {partial['category_distribution']}"
+                    )
+
+                retry_stream_failures(
+                    failures, accumulator, max_workers, item_timeout, batch_size, cache, run_id, dedup, preclassifier
+                )
+        finally:
+            if preclassifier is not None:
+                print("Pre-classifier:", preclassifier.stats())
+            if cache is not None:
+                print("Cache:", cache.stats())
+                cache.close()
+
+        print("\n--- Running Agent 2 (Pattern Detector) ---")
+        with stage("agent2"):
+            pattern_output = accumulator.finalize(theme_method, theme_index)
+
+        print("\n--- Running Agent 3 (Insight Generator) ---")
+        with stage("agent3"):
+            memo_cache = open_memo_cache(use_cache)
+            try:
+                insight_output = generate_insights(pattern_output, cache=memo_cache)
+            finally:
+                if memo_cache is not None:
+                    memo_cache.close()
+
+        print("\n--- Running Evaluation Layer ---")
+        with stage("evaluation"):
+            trend_flags = record_trends(pattern_output, trends, run_id=run_id)
+            evaluation_output = evaluate_system(pattern_output, trend_flags)
+
+    return {
+        "items_processed": accumulator.items,
+        "pattern_analysis": pattern_output,
+        "insight_memo": insight_output,
+        "system_evaluation": evaluation_output,
+        "run_report": report.to_dict()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a feedback file through the agent pipeline.")
+    parser.add_argument("path", help="CSV, JSONL or plain-text feedback file")
+    parser.add_argument("--column", default="feedback", help="feedback field for CSV/JSONL input")
+    parser.add_argument("--format", dest="file_format", choices=["csv", "jsonl", "txt"])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="concurrent Agent 1 requests (capped by --max-in-flight)")
+    parser.add_argument("--timeout", type=float, help="per-request timeout in seconds")
+    parser.add_argument("--batch-size", type=int, default=1, help="feedback lines per Agent 1 prompt")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the classification cache")
+    parser.add_argument("--dedup", action="store_true", help="collapse near-duplicate lines before Agent 1")
+    parser.add_argument("--no-preclassify", action="store_true", help="send trivial lines to the LLM too")
+    parser.add_argument("--preclassify-agreement", action="store_true",
+                        help="also send locally classified lines to the LLM and report agreement")
+    parser.add_argument("--run-id", help="checkpoint under this ID and resume it if it was interrupted")
+    parser.add_argument("--host", help="Ollama server URL (default: $OLLAMA_HOST or localhost)")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="concurrent requests sent to the Ollama server")
+    parser.add_argument("--agent1-model", help="model for Agent 1 classification (default: llama3)")
+    parser.add_argument("--agent3-model", help="model for the Agent 3 memo (default: llama3)")
+    parser.add_argument("--trends", choices=["hour", "day"],
+                        help="record counts per hour/day and flag spikes against the rolling baseline")
+    parser.add_argument("--output", help="write the final result as JSON to this path")
+    parser.add_argument("--metrics", help="write stage and LLM call metrics in Prometheus format to this path")
+    args = parser.parse_args()
+
+    stage_models = {"agent1": args.agent1_model, "agent3": args.agent3_model}
+    configure_llm(
+        backend=OllamaBackend(host=args.host, max_in_flight=args.max_in_flight),
+        stage_models={stage: model for stage, model in stage_models.items() if model}
+    )
+
+    result = run_streaming_pipeline(
+        args.path,
+        column=args.column,
+        file_format=args.file_format,
+        chunk_size=args.chunk_size,
+        max_workers=args.workers,
+        item_timeout=args.timeout,
+        batch_size=args.batch_size,
+        use_cache=not args.no_cache,
+        dedup=args.dedup,
+        preclassify="agreement" if args.preclassify_agreement else not args.no_preclassify,
+        run_id=args.run_id,
+        trends=args.trends
+    )
+
+    print("\n=== FINAL PATTERN ANALYSIS ===")
+    print(result["pattern_analysis"])
+
+    print("\n=== PRODUCT INSIGHT MEMO ===")
+    print(result["insight_memo"])
+
+    print("\n=== SYSTEM EVALUATION SUMMARY ===")
+    print(result["system_evaluation"])
+
+    print("\n=== RUN REPORT ===")
+    report = result["run_report"]
+    for name, timing in report["stages"].items():
+        print(f"{name}: {timing['seconds']}s")
+    for call_site, stats in report["llm_calls"].items():
+        print(
+            f"{call_site}: {stats['calls']} calls | p50 {stats['latency_p50']}s | "
+            f"p99 {stats['latency_p99']}s | tokens {stats['prompt_tokens']}+{stats['completion_tokens']}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(result, handle, indent=2)
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as handle:
+            handle.write(prometheus_text(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import hashlib
+import time
+
+from agents.fake_llm import FakeLLM, installed
+from agents.patterndetector import PatternAccumulator
+from agents.preclassifier import PreClassifier
+from agents.resilience import CircuitBreaker, Resilience, RetryPolicy
+from agents.trend_store import DEFAULT_TREND_PATH, TrendStore
+from background_jobs import JobManager
+from streaming_pipeline import iter_streaming_pipeline
+
+
+def wait_for(jobs, job_id, timeout=30.0):
+    deadline = time.time() + timeout
+    job = jobs.get(job_id)
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.02)
+    return job.progress()
+
+
+def test_streaming_with_preclassifier_reports_every_chunk():
+    read = []
+
+    def lines():
+        for number in range(120):
+            read.append(number)
+            yield f"The export page {number} crashes"
+
+    with installed(FakeLLM()):
+        updates = iter_streaming_pipeline(lines(), PatternAccumulator(), chunk_size=40, preclassifier=PreClassifier())
+        first = next(updates)
+        read_before_first_update = len(read)
+        rest = list(updates)
+
+    assert first["items_processed"] == 40
+    assert read_before_first_update == 40
+    assert [update["items_processed"] for update in rest] == [80, 120]
+
+
+def test_job_collapses_near_duplicates_across_progress_windows():
+    # 200 distinct lines, each repeated far apart so no window holds both copies
+    lines = [f"Upload fails with error {hashlib.sha1(bytes([number])).hexdigest()}" for number in range(200)] * 2
+
+    with installed(FakeLLM()) as fake:
+        jobs = JobManager(max_jobs=1, max_workers=1)
+        try:
+            snapshot = wait_for(jobs, jobs.submit(lines, use_cache=False, dedup=True, preclassify=False))
+        finally:
+            jobs.shutdown()
+
+    assert snapshot["status"] == "done"
+    assert snapshot["items_processed"] == 400
+    assert sum(snapshot["result"]["pattern_analysis"]["category_distribution"].values()) == 400
+    # One Agent 1 call per group; the remaining calls are Agent 2 and Agent 3
+    assert 200 <= fake.calls < 220
+
+
+def test_job_runs_the_graph_with_trends_and_streams_the_memo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    lines = ["App crashes on upload", "Dashboard is slow", "Please add dark mode"] * 40
+
+    with installed(FakeLLM()):
+        jobs = JobManager(max_jobs=1, max_workers=2)
+        try:
+            snapshot = wait_for(jobs, jobs.submit(lines, trends="hour"))
+        finally:
+            jobs.shutdown()
+
+    result = snapshot["result"]
+    assert snapshot["status"] == "done"
+    assert snapshot["memo"] == result["insight_memo"]
+    assert result["memo_pdf"].startswith(b"%PDF")
+    assert set(result["run_report"]["stages"]) == {"agent1", "agent2", "agent3", "evaluation", "pdf"}
+
+    store = TrendStore(DEFAULT_TREND_PATH, granularity="hour")
+    assert store.history("category:Bug")[0][1] == 40
+    store.close()
+
+
+def test_cancelled_job_stops_between_agent1_groups():
+    lines = [f"Upload fails with error {number}" for number in range(2000)]
+
+    with installed(FakeLLM(latency=0.002)) as fake:
+        jobs = JobManager(max_jobs=1, max_workers=1)
+        try:
+            job_id = jobs.submit(lines, use_cache=False, preclassify=False)
+            job = jobs.get(job_id)
+            while not job.items_processed and not job.finished:
+                time.sleep(0.01)
+            jobs.cancel(job_id)
+            snapshot = wait_for(jobs, job_id)
+        finally:
+            jobs.shutdown()
+
+    assert snapshot["status"] == "cancelled"
+    assert 0 < snapshot["items_processed"] < len(lines)
+    assert fake.calls < len(lines)
+
+
+def test_identical_input_returns_the_earlier_result(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    lines = ["App crashes on upload", "Dashboard is slow", "Please add dark mode"]
+
+    with installed(FakeLLM()) as fake:
+        jobs = JobManager(max_jobs=1, max_workers=1)
+        try:
+            first = wait_for(jobs, jobs.submit(lines))
+            calls = fake.calls
+            again = wait_for(jobs, jobs.submit(list(lines)))
+            assert fake.calls == calls
+
+            other_options = wait_for(jobs, jobs.submit(lines, batch_size=3))
+            uncached = wait_for(jobs, jobs.submit(lines, use_cache=False))
+        finally:
+            jobs.shutdown()
+
+    assert not first["cached"]
+    assert again["cached"]
+    assert again["result"] is first["result"]
+    assert not other_options["cached"]
+    assert not uncached["cached"]
+
+
+def test_results_with_failed_lines_are_not_reused(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with installed(FakeLLM(error_rate=1.0)) as fake:
+        fake.resilience = Resilience(
+            retry=RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0),
+            breaker=CircuitBreaker(failure_threshold=1000)
+        )
+        jobs = JobManager(max_jobs=1, max_workers=1)
+        try:
+            first = wait_for(jobs, jobs.submit(["App crashes on upload"], preclassify=False))
+            again = wait_for(jobs, jobs.submit(["App crashes on upload"], preclassify=False))
+        finally:
+            jobs.shutdown()
+
+    assert first["status"] == "done"
+    assert first["result"]["pattern_analysis"]["failed_count"] == 1
+    assert not again["cached"]
@@ -0,0 +1,108 @@
+import sqlite3
+
+from agents.classification_cache import ClassificationCache
+from agents.memo_cache import MemoCache, analytics_fingerprint
+
+
+RESULT = {"sentiment": "Negative", "category": "Bug", "priority": "High", "problem": "Upload fails"}
+
+
+def test_classification_cache_hits_on_normalized_text(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "c.sqlite"))
+    cache.put("App crashes on upload", "model", "1", RESULT)
+
+    assert cache.get("  app CRASHES on   upload ", "model", "1") == RESULT
+    assert cache.get("App crashes on upload", "other-model", "1") is None
+    assert cache.get("App crashes on upload", "model", "2") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    cache.close()
+
+
+def test_failed_results_are_not_cached(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "c.sqlite"))
+    cache.put("App crashes", "model", "1", {**RESULT, "problem": "API Failure"})
+
+    assert cache.get("App crashes", "model", "1") is None
+    cache.close()
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "c.sqlite"), max_age_seconds=-1)
+    cache.put("App crashes", "model", "1", RESULT)
+
+    assert cache.get("App crashes", "model", "1") is None
+    cache.close()
+
+
+def test_eviction_keeps_most_recently_used_entries(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "c.sqlite"), max_entries=2)
+    for text in ("first", "second", "third"):
+        cache.put(text, "model", "1", RESULT)
+    cache.get("first", "model", "1")
+    cache.evict()
+
+    assert cache.stats()["entries"] == 2
+    assert cache.get("first", "model", "1") == RESULT
+    assert cache.get("second", "model", "1") is None
+    cache.close()
+
+
+def test_store_evicts_periodically_not_on_every_put(tmp_path, monkeypatch):
+    monkeypatch.setattr("agents.sqlite_cache.EVICT_EVERY", 3)
+    cache = MemoCache(str(tmp_path / "m.sqlite"), max_entries=1)
+
+    cache.put({"a": 1}, "model", "1", "memo 1")
+    cache.put({"a": 2}, "model", "1", "memo 2")
+    assert cache.stats()["entries"] == 2
+
+    cache.put({"a": 3}, "model", "1", "memo 3")
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+
+def test_old_classification_tables_gain_the_feedback_column(tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE classifications (key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+        "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    cache = ClassificationCache(path)
+    cache.put("Dark mode please", "model", "1", RESULT)
+
+    assert cache.training_examples() == [("dark mode please", RESULT)]
+    cache.close()
+
+
+def test_memo_fingerprint_ignores_ordering():
+    first = {
+        "category_distribution": {"Bug": 2, "Performance": 1},
+        "detected_themes": [
+            {"theme": "Upload Issues", "related_problems": ["b", "a"]},
+            {"theme": "Login Issues", "related_problems": ["c"]}
+        ]
+    }
+    second = {
+        "detected_themes": [
+            {"theme": "Login Issues", "related_problems": ["c"]},
+            {"theme": "Upload Issues", "related_problems": ["a", "b"]}
+        ],
+        "category_distribution": {"Performance": 1, "Bug": 2}
+    }
+
+    assert analytics_fingerprint(first) == analytics_fingerprint(second)
+    assert analytics_fingerprint(first) != analytics_fingerprint({**first, "high_priority_count": 1})
+
+
+def test_memo_cache_round_trip(tmp_path):
+    cache = MemoCache(str(tmp_path / "m.sqlite"))
+    analysis = {"category_distribution": {"Bug": 1}, "detected_themes": []}
+    cache.put(analysis, "model", "1", "The memo")
+
+    assert cache.get(analysis, "model", "1") == "The memo"
+    assert cache.get(analysis, "model", "2") is None
+    cache.close()
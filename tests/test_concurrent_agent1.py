@@ -0,0 +1,38 @@
+import pytest
+
+from agents.fake_llm import FakeLLM, installed
+from agents.feedback_analyzer import iter_analyze_feedback
+
+
+TEMPLATES = [
+    "App crashes when uploading file {}",
+    "Dashboard {} loads slowly",
+    "Settings page {} is confusing",
+    "Please add export option {}",
+    "Love the new editor {}",
+    "Nothing to report about release {}"
+]
+
+LINES = [TEMPLATES[number % len(TEMPLATES)].format(number) for number in range(60)]
+
+
+def analyze(max_workers, batch_size):
+    # Random per-call latency, so concurrent calls finish out of order
+    with installed(FakeLLM(jitter=0.005, seed=max_workers * 10 + batch_size)):
+        return [dict(result) for result in iter_analyze_feedback(
+            iter(LINES), max_workers, batch_size=batch_size
+        )]
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_concurrent_results_match_serial_order(batch_size):
+    serial = analyze(1, batch_size)
+    concurrent = analyze(8, batch_size)
+
+    assert len(serial) == len(LINES)
+    assert concurrent == serial
+    assert [result["problem"] for result in serial[:3]] == [LINES[0], LINES[1], LINES[2]]
+
+
+def test_batched_results_match_single_calls():
+    assert analyze(8, 4) == analyze(1, 1)
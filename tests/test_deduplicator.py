@@ -0,0 +1,50 @@
+from agents.deduplicator import collapse_near_duplicates, group_near_duplicates
+from agents.fake_llm import FakeLLM, installed
+from agents.feedback_analyzer import analyze_feedback_list
+from agents.instrumentation import recording
+
+
+LINES = [
+    "Upload fails for large PDF files.",
+    "upload fails for large pdf file",
+    "Dashboard takes too long to load.",
+    "Upload fails for large PDF files!!",
+    "",
+    "???"
+]
+
+
+def test_near_duplicates_share_the_first_line_as_representative():
+    assert group_near_duplicates(LINES) == [0, 0, 2, 0, 4, 5]
+
+
+def test_collapse_keeps_input_order_and_group_sizes():
+    representatives, positions, multiplicities = collapse_near_duplicates(LINES)
+
+    assert representatives == [LINES[0], LINES[2], "", "???"]
+    assert positions == [0, 0, 1, 0, 2, 3]
+    assert multiplicities == [3, 1, 1, 1]
+
+
+def test_distinct_lines_are_not_grouped():
+    lines = ["App crashes on login", "Please add dark mode", "Export to CSV is broken"]
+    assert group_near_duplicates(lines) == [0, 1, 2]
+
+
+def test_dedup_is_opt_in():
+    lines = ["Upload fails for large PDF files."] * 5
+
+    with installed(FakeLLM()) as fake:
+        analyze_feedback_list(lines)
+        calls_without_dedup = fake.calls
+        analyze_feedback_list(lines, dedup=True)
+
+    assert calls_without_dedup == 5
+    assert fake.calls - calls_without_dedup == 1
+
+
+def test_collapsed_lines_are_reported():
+    with installed(FakeLLM()), recording() as report:
+        analyze_feedback_list(LINES, dedup=True)
+
+    assert report.to_dict()["events"]["dedup.collapsed"] == 2
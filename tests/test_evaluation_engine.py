@@ -0,0 +1,21 @@
+from agents.evaluation_engine import evaluate_system
+from agents.theme_clustering import MAX_RELATED_PROBLEMS, cluster_themes
+
+
+def test_total_problems_counts_beyond_the_listed_sample():
+    problems = [f"Upload fails for file number {number}" for number in range(3 * MAX_RELATED_PROBLEMS)]
+    themes = cluster_themes(problems, embed_model=None, max_named=0)
+
+    assert sum(len(theme["related_problems"]) for theme in themes) < len(problems)
+    summary = evaluate_system({"high_priority_count": 0, "detected_themes": themes})
+    assert f"Total Problems Clustered: {len(problems)}" in summary
+
+
+def test_total_problems_falls_back_to_the_listed_problems():
+    summary = evaluate_system({"detected_themes": [
+        {"theme": "Upload Issues", "related_problems": ["Crash on upload", "Upload fails"]},
+        {"theme": "Login Issues", "related_problems": ["Login fails"], "problem_count": 40}
+    ]})
+
+    assert "Total Problems Clustered: 42" in summary
+    assert "Theme Count: 2" in summary
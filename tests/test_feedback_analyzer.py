@@ -0,0 +1,118 @@
+import copy
+import time
+
+import httpx
+
+from agents.classification_cache import ClassificationCache
+from agents.fake_llm import FakeLLM, installed
+from agents.feedback_analyzer import (
+    AGENT1_BATCH_SYSTEM_PROMPT,
+    AGENT1_SYSTEM_PROMPT,
+    PROMPT_VERSION,
+    agent1_batch_messages,
+    agent1_messages,
+    analyze_feedback_list,
+    run_agent1_stage,
+)
+from agents.llm_backend import stage_model
+from agents.resilience import CircuitBreaker, Resilience, RetryPolicy
+
+
+def test_single_calls_do_not_carry_batch_instructions():
+    system = agent1_messages("Upload fails")[0]["content"]
+
+    assert system == AGENT1_SYSTEM_PROMPT
+    assert "Feedback items" not in system
+    assert '"index"' not in system
+
+
+def test_batch_prompt_extends_the_single_prompt():
+    system = agent1_batch_messages(["Upload fails", "Add dark mode"])[0]["content"]
+
+    assert system == AGENT1_BATCH_SYSTEM_PROMPT
+    assert system.startswith(AGENT1_SYSTEM_PROMPT)
+
+
+def test_batched_and_single_results_agree():
+    lines = ["App crashes on upload", "Please add dark mode", "Dashboard is slow"]
+
+    with installed(FakeLLM()):
+        single = analyze_feedback_list(lines)
+        batched = analyze_feedback_list(lines, batch_size=3)
+
+    assert [dict(result) for result in single] == [dict(result) for result in batched]
+
+
+class FlakyLLM(FakeLLM):
+    """
+    Fails the first call about each line containing `flaky`.
+    """
+
+    def __init__(self, flaky):
+        super().__init__()
+        self.flaky = flaky
+        self.failed = set()
+        self.resilience = Resilience(
+            retry=RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0),
+            breaker=CircuitBreaker(failure_threshold=100)
+        )
+
+    def chat(self, model=None, messages=None, stream=False, **kwargs):
+        content = messages[-1]["content"]
+        if self.flaky in content and content not in self.failed:
+            self.failed.add(content)
+            raise ConnectionError("dropped")
+        return super().chat(model=model, messages=messages, stream=stream, **kwargs)
+
+
+def test_deferred_retry_uses_the_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    lines = ["App crashes on upload", "Dashboard is slow"]
+
+    with installed(FlakyLLM("Dashboard")):
+        results = run_agent1_stage(lines, use_cache=True, preclassify=False)
+
+    assert not any(result.failed for result in results)
+    cache = ClassificationCache()
+    assert cache.get("Dashboard is slow", stage_model("agent1"), PROMPT_VERSION) is not None
+    cache.close()
+
+
+class HangingLLM(FakeLLM):
+    """
+    Answers every call after `timeout` seconds with a timeout error, like
+    an Ollama server that accepted the request but never replied.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.timeout = None
+        self.attempts = []
+        self.resilience = Resilience(
+            retry=RetryPolicy(max_attempts=4, base_delay=0.05, max_delay=0.05),
+            breaker=CircuitBreaker(failure_threshold=100)
+        )
+
+    def with_timeout(self, timeout):
+        view = copy.copy(self)
+        view.timeout = view.item_timeout = timeout
+        return view
+
+    def chat(self, model=None, messages=None, stream=False, **kwargs):
+        # Views share the attempts list
+        self.attempts.append(self.timeout)
+        time.sleep(self.timeout or 0.0)
+        raise httpx.ReadTimeout("timed out")
+
+
+def test_timed_out_item_is_not_retried_past_its_timeout():
+    fake = HangingLLM()
+
+    with installed(fake):
+        started = time.perf_counter()
+        [result] = analyze_feedback_list(["App crashes on upload"], item_timeout=0.2)
+        elapsed = time.perf_counter() - started
+
+    assert result.failed
+    assert fake.attempts == [0.2]
+    assert elapsed < 0.4
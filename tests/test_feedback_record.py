@@ -0,0 +1,87 @@
+import io
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from agents.fake_llm import FakeLLM, installed
+from agents.feedback_record import (
+    API_FAILURE_RECORD,
+    Category,
+    FeedbackRecord,
+    Priority,
+    Sentiment,
+    dump_jsonl,
+    from_msgpack,
+    load_jsonl,
+    to_msgpack,
+)
+from main_pipeline import CHECKPOINT_TYPES, build_langgraph_pipeline, initial_state
+
+
+RESULT = {"problem": "Upload fails", "sentiment": "Negative", "category": "Bug", "priority": "High"}
+
+RECORDS = [
+    FeedbackRecord.from_dict(RESULT),
+    FeedbackRecord.from_dict(RESULT, source_id="ticket-7"),
+    FeedbackRecord.from_dict(RESULT, timestamp=1_700_000_000.5),
+    FeedbackRecord.from_dict(RESULT, source_id="ticket-8", timestamp=1_700_000_001.0),
+    API_FAILURE_RECORD
+]
+
+
+def assert_same_records(loaded):
+    assert loaded == RECORDS
+    for record in loaded:
+        assert type(record.sentiment) is Sentiment
+        assert type(record.category) is Category
+        assert type(record.priority) is Priority
+
+
+def test_dict_round_trip_keeps_optional_fields_only_when_set():
+    assert_same_records([FeedbackRecord.from_dict(record.to_dict()) for record in RECORDS])
+    assert RECORDS[0].to_dict() == RESULT
+    assert RECORDS[1].to_dict() == {**RESULT, "source_id": "ticket-7"}
+    assert RECORDS[2].to_dict() == {**RESULT, "timestamp": 1_700_000_000.5}
+
+
+def test_jsonl_round_trip():
+    handle = io.StringIO()
+    dump_jsonl(RECORDS, handle)
+    handle.seek(0)
+
+    assert_same_records(list(load_jsonl(handle)))
+
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+
+    assert_same_records(from_msgpack(to_msgpack(RECORDS)))
+
+
+def strict_checkpointer():
+    # Like LANGGRAPH_STRICT_MSGPACK=true: types outside the allowlist load as plain dicts
+    return MemorySaver(serde=JsonPlusSerializer(allowed_msgpack_modules=None))
+
+
+def test_allowlisted_checkpoint_loads_records_back():
+    serde = strict_checkpointer().with_allowlist(CHECKPOINT_TYPES).serde
+    assert_same_records(serde.loads_typed(serde.dumps_typed(RECORDS)))
+
+    serde = strict_checkpointer().serde
+    blocked = serde.loads_typed(serde.dumps_typed(RECORDS))[0]
+    assert type(blocked) is dict
+    assert blocked == {**RESULT, "source_id": None, "timestamp": None}
+
+
+def test_checkpointed_pipeline_state_keeps_records(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    graph = build_langgraph_pipeline(strict_checkpointer())
+    config = {"configurable": {"thread_id": "records"}}
+
+    with installed(FakeLLM()):
+        graph.invoke(initial_state(["App crashes on upload", "Please add dark mode"]), config)
+
+    results = graph.get_state(config).values["structured_results"]
+    assert [type(result) for result in results] == [FeedbackRecord, FeedbackRecord]
+    assert results[0].category is Category.BUG
@@ -0,0 +1,33 @@
+from agents.instrumentation import GLOBAL_REPORT, LATENCY_SAMPLE_SIZE, RunReport, recording, stage
+
+
+def test_global_report_keeps_no_spans():
+    for _ in range(100):
+        with stage("agent1"):
+            pass
+    assert len(GLOBAL_REPORT.to_dict()["spans"]) == 0
+    assert GLOBAL_REPORT.to_dict()["stages"]["agent1"]["calls"] >= 100
+
+
+def test_run_report_records_and_caps_spans():
+    with recording("capped") as report:
+        with stage("agent2"):
+            pass
+    assert [span["name"] for span in report.to_dict()["spans"]] == ["agent2"]
+
+    report = RunReport(max_spans=3)
+    for index in range(10):
+        report.record_stage("agent3", index, index + 1)
+    spans = report.to_dict()["spans"]
+    assert len(spans) == 3
+    assert spans[-1]["start_time_unix_nano"] == int(9 * 1e9)
+    assert report.to_dict()["stages"]["agent3"] == {"calls": 10, "seconds": 10.0}
+
+
+def test_latency_sample_is_bounded():
+    report = RunReport()
+    for index in range(LATENCY_SAMPLE_SIZE * 2):
+        report.record_llm_call("agent1", index / 1000)
+    site = report.llm_calls["agent1"]
+    assert site["calls"] == LATENCY_SAMPLE_SIZE * 2
+    assert len(site["_latencies"]) == LATENCY_SAMPLE_SIZE
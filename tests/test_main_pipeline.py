@@ -0,0 +1,66 @@
+import time
+
+from agents.fake_llm import FakeLLM, installed
+from main_pipeline import build_langgraph_pipeline, initial_state
+
+
+LINES = ["App crashes on upload", "Dashboard is slow", "Please add dark mode"]
+
+
+def stream_graph(fake, config=None):
+    graph = build_langgraph_pipeline()
+    updates, custom = [], []
+    with installed(fake):
+        for mode, chunk in graph.stream(initial_state(LINES), config, stream_mode=["updates", "custom"]):
+            (updates if mode == "updates" else custom).append(chunk)
+    return updates, custom
+
+
+def test_streamed_memo_chunks_join_to_the_memo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    updates, custom = stream_graph(FakeLLM(), {"configurable": {"use_cache": False}})
+
+    chunks = [event["memo_chunk"] for event in custom if "memo_chunk" in event]
+    [memo] = [update["Agent3"]["insight_memo"] for update in updates if "Agent3" in update]
+    assert len(chunks) > 1
+    assert "".join(chunks) == memo
+
+
+def test_agent1_progress_is_streamed_in_groups(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    updates, custom = stream_graph(FakeLLM(), {"configurable": {"use_cache": False, "progress_every": 2}})
+
+    groups = [event["agent1_results"] for event in custom if "agent1_results" in event]
+    [results] = [update["Agent1"]["structured_results"] for update in updates if "Agent1" in update]
+    assert [len(group) for group in groups] == [2, 1]
+    assert [result for group in groups for result in group] == results
+
+
+class SlowMemoLLM(FakeLLM):
+    """
+    Takes `delay` seconds before streaming an answer (the Agent 3 memo).
+    """
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def chat(self, model=None, messages=None, stream=False, **kwargs):
+        if stream:
+            time.sleep(self.delay)
+        return super().chat(model=model, messages=messages, stream=stream, **kwargs)
+
+
+def test_evaluation_runs_alongside_the_memo_branch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    updates, _ = stream_graph(SlowMemoLLM(delay=0.3), {"configurable": {"use_cache": False}})
+
+    nodes = [node for update in updates for node in update]
+    assert sorted(nodes) == ["Agent1", "Agent2", "Agent3", "Evaluation", "PDF"]
+    assert nodes[:2] == ["Agent1", "Agent2"]
+    # The evaluation does not wait for the slow memo, and the PDF follows the memo
+    assert nodes.index("Evaluation") < nodes.index("Agent3") < nodes.index("PDF")
+
+    final = {key: value for update in updates for values in update.values() for key, value in values.items()}
+    assert final["memo_pdf"].startswith(b"%PDF")
+    assert final["system_evaluation"]
@@ -0,0 +1,21 @@
+from agents.fake_llm import FakeLLM, installed
+from agents.memo_digest import digest_analytics
+
+
+def test_digests_use_problem_count_over_the_listed_sample():
+    agent2_output = {
+        "category_distribution": {"Bug": 1000},
+        "detected_themes": [
+            {"theme": "Login Issues", "related_problems": ["Login fails", "Password reset broken"], "problem_count": 2},
+            {"theme": "Upload Issues", "related_problems": ["Upload fails"], "problem_count": 900},
+            {"theme": "Export Issues", "related_problems": ["CSV export empty", "Excel export missing", "PDF cut off"]}
+        ]
+    }
+
+    with installed(FakeLLM()):
+        analytics = digest_analytics(agent2_output)
+
+    entries = analytics["detected_themes"]
+    assert [entry["theme"] for entry in entries] == ["Upload Issues", "Export Issues", "Login Issues"]
+    assert [entry["problem_count"] for entry in entries] == [900, 3, 2]
+    assert all(entry["digest"] for entry in entries)
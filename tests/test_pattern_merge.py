@@ -0,0 +1,86 @@
+import itertools
+import random
+
+from agents.patterndetector import PatternAccumulator, merge_states
+
+
+CATEGORIES = ["Bug", "Performance", "UX Issue", "Feature Request", "Other"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+
+def make_results(rng, count):
+    results = []
+    for _ in range(count):
+        problem = rng.choice(["None", "API Failure"] + [f"Problem {number}" for number in range(40)])
+        results.append({
+            "problem": problem,
+            "sentiment": "Negative",
+            "category": rng.choice(CATEGORIES),
+            "priority": rng.choice(PRIORITIES)
+        })
+    return results
+
+
+def shard_states(seed, shards=3, max_tracked_problems=10):
+    # Small max_tracked_problems, so the shards prune their own counters
+    rng = random.Random(seed)
+    shard_results = [make_results(rng, rng.randint(20, 80)) for _ in range(shards)]
+    states = []
+    for results in shard_results:
+        accumulator = PatternAccumulator(max_tracked_problems)
+        for start in range(0, len(results), 7):
+            accumulator.update(results[start:start + 7])
+        states.append(accumulator.to_state())
+    return shard_results, states
+
+
+def merged(*states):
+    accumulator = PatternAccumulator.from_state(states[0])
+    for state in states[1:]:
+        accumulator.merge(PatternAccumulator.from_state(state), prune=False)
+    return accumulator.to_state()
+
+
+def test_merge_is_associative():
+    for seed in range(20):
+        _, (a, b, c) = shard_states(seed)
+        assert merged(merged(a, b), c) == merged(a, merged(b, c))
+
+
+def test_merge_states_does_not_depend_on_shard_order():
+    for seed in range(10):
+        _, states = shard_states(seed, shards=4, max_tracked_problems=10)
+        expected = merge_states(states, max_tracked_problems=10).to_state()
+        for order in itertools.permutations(states):
+            assert merge_states(order, max_tracked_problems=10).to_state() == expected
+
+
+def test_regrouped_shards_merge_to_the_same_state():
+    _, (a, b, c) = shard_states(seed=3)
+    flat = merge_states([a, b, c], max_tracked_problems=10).to_state()
+
+    # A re-run of shards a and b merged on their own, then with c
+    assert merge_states([merged(a, b), c], max_tracked_problems=10).to_state() == flat
+
+
+def test_merged_shards_match_a_single_shard_run():
+    for seed in range(10):
+        shard_results, states = shard_states(seed, max_tracked_problems=10_000)
+        single = PatternAccumulator(10_000)
+        single.update([result for results in shard_results for result in results])
+
+        assert merge_states(states, max_tracked_problems=10_000).to_state() == single.to_state()
+
+
+def test_pruned_shards_keep_exact_counters():
+    shard_results, states = shard_states(seed=5, max_tracked_problems=10)
+    state = merge_states(states, max_tracked_problems=10).to_state()
+    everything = [result for results in shard_results for result in results]
+    counted = [result for result in everything if result["problem"] != "API Failure"]
+
+    assert state["items"] == len(everything)
+    assert state["failed_count"] == len(everything) - len(counted)
+    assert sum(state["category_distribution"].values()) == len(counted)
+    assert state["high_priority_count"] == sum(result["priority"] == "High" for result in counted)
+    # Only problems seen more than once survive pruning
+    assert all(count > 1 for count in state["problem_counts"].values())
@@ -0,0 +1,83 @@
+from agents.fake_llm import FakeLLM, installed
+from agents.feedback_analyzer import analyze_feedback_list
+from agents.instrumentation import recording
+from agents.preclassifier import EMPTY_RESULT, PRAISE_RESULT, PreClassifier, rule_classify
+
+
+def test_lines_without_words_are_answered_locally():
+    assert rule_classify("") is EMPTY_RESULT
+    assert rule_classify("???") is EMPTY_RESULT
+    assert rule_classify("  ...!  ") is EMPTY_RESULT
+
+
+def test_short_pure_praise_is_answered_locally():
+    assert rule_classify("Great job on the latest update") is PRAISE_RESULT
+    assert rule_classify("Thanks, love the new design!") is PRAISE_RESULT
+
+
+def test_praise_with_anything_else_is_escalated():
+    assert rule_classify("App good but sometimes bad.") is None
+    assert rule_classify("Great update, but the app crashes on login") is None
+    assert rule_classify("Dashboard takes too long to load.") is None
+
+
+def test_long_praise_is_escalated():
+    assert rule_classify("great " * 13) is None
+
+
+def test_predict_counts_local_and_escalated_lines():
+    preclassifier = PreClassifier()
+    lines = ["", "Great job on the latest update", "App good but sometimes bad.", "Upload fails"]
+
+    with recording() as report:
+        answers = preclassifier.predict(lines)
+
+    assert answers == [EMPTY_RESULT, PRAISE_RESULT, None, None]
+    assert report.to_dict()["events"] == {"preclassifier.local": 2, "preclassifier.escalated": 2}
+    assert preclassifier.stats() == {"model": "rules only", "local": 2, "escalated": 2, "escalation_rate": 0.5}
+
+
+def test_trained_model_never_answers_problem_lines(tmp_path):
+    praise = [(f"the release is fine number {index}", dict(PRAISE_RESULT)) for index in range(40)]
+    problems = [(f"upload fails with error {index}", {
+        "problem": "Upload fails", "sentiment": "Negative", "category": "Bug", "priority": "High"
+    }) for index in range(40)]
+
+    model = PreClassifier.train(praise + problems, confidence=0.6)
+    path = str(tmp_path / "preclassifier.npz")
+    model.save(path)
+    loaded = PreClassifier.load(path, confidence=0.6)
+
+    answers = loaded.predict(["the release is fine number 99", "upload fails with error 99"])
+    assert answers == [PRAISE_RESULT, None]
+    assert loaded.stats()["model"] == "trained"
+
+
+def test_agreement_mode_sends_every_line_to_the_llm():
+    preclassifier = PreClassifier(agreement=True)
+    lines = ["Great job on the latest update", "???", "App crashes on upload"]
+
+    with installed(FakeLLM()) as fake, recording() as report:
+        results = analyze_feedback_list(lines, preclassifier=preclassifier)
+
+    assert fake.calls == len(lines)
+    assert results[2]["category"] == "Bug"
+    events = report.to_dict()["events"]
+    assert events["preclassifier.compared"] == 2
+    assert events["preclassifier.agreed"] == 2
+    assert preclassifier.stats()["compared"] == 2
+    assert preclassifier.stats()["agreement_rate"] == 1.0
+
+
+def test_agreement_counter_skips_failed_llm_results():
+    preclassifier = PreClassifier(agreement=True)
+    negative = {"problem": "None", "sentiment": "Negative", "category": "Other", "priority": "Low"}
+
+    with recording() as report:
+        preclassifier.record_agreement(
+            [PRAISE_RESULT, PRAISE_RESULT, None, EMPTY_RESULT],
+            [dict(PRAISE_RESULT), negative, dict(PRAISE_RESULT), {"problem": "API Failure"}]
+        )
+
+    assert report.to_dict()["events"] == {"preclassifier.compared": 2, "preclassifier.agreed": 1}
+    assert preclassifier.stats()["agreement_rate"] == 0.5
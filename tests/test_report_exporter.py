@@ -0,0 +1,10 @@
+from agents.report_exporter import generate_pdf
+
+
+def test_memo_text_with_markup_characters_renders():
+    memo = "Executive Summary\nLatency < 2s for 90% of users & <b>unclosed tags\n\nRecommended Actions\n- Fix uploads"
+    assert generate_pdf(memo).startswith(b"%PDF")
+
+
+def test_empty_memo_renders():
+    assert generate_pdf("").startswith(b"%PDF")
@@ -0,0 +1,147 @@
+import gc
+
+import ollama
+import pytest
+
+from agents.resilience import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, Resilience, RetryPolicy
+
+
+def make_resilience(failure_threshold=2, reset_seconds=0.0, max_attempts=1, max_concurrency=None):
+    return Resilience(
+        max_concurrency=max_concurrency,
+        retry=RetryPolicy(max_attempts=max_attempts, base_delay=0.0, max_delay=0.0),
+        breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_seconds=reset_seconds)
+    )
+
+
+def fail_with(error):
+    def attempt():
+        raise error
+    return attempt
+
+
+def open_circuit(resilience):
+    for _ in range(resilience.breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            resilience.call("test", fail_with(ConnectionError("down")))
+    assert resilience.breaker.state == "open"
+
+
+def test_transient_errors_are_retried():
+    resilience = make_resilience(failure_threshold=10, max_attempts=3)
+    answers = iter([ConnectionError("blip"), TimeoutError("slow"), "ok"])
+
+    def attempt():
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert resilience.call("test", attempt) == "ok"
+    assert resilience.retries == 2
+
+
+def test_non_retryable_errors_are_not_retried():
+    resilience = make_resilience(max_attempts=3)
+    with pytest.raises(ollama.ResponseError):
+        resilience.call("test", fail_with(ollama.ResponseError("model not found", 404)))
+    assert resilience.retries == 0
+
+
+def test_circuit_opens_and_fails_fast():
+    resilience = make_resilience(reset_seconds=60.0)
+    open_circuit(resilience)
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        resilience.call("test", lambda: calls.append(1))
+    assert calls == []
+
+
+def test_successful_probe_closes_circuit():
+    resilience = make_resilience()
+    open_circuit(resilience)
+
+    assert resilience.call("test", lambda: "ok") == "ok"
+    assert resilience.breaker.state == "closed"
+
+
+def test_probe_answered_with_error_status_does_not_wedge_circuit():
+    # A 404 (e.g. a missing embedding model) on the half-open probe means
+    # the server answered; later calls must not be rejected forever
+    resilience = make_resilience()
+    open_circuit(resilience)
+
+    with pytest.raises(ollama.ResponseError):
+        resilience.call("test", fail_with(ollama.ResponseError("model not found", 404)))
+
+    assert resilience.call("test", lambda: "ok") == "ok"
+    assert resilience.breaker.state == "closed"
+
+
+def test_probe_failing_with_local_error_frees_probe_slot():
+    resilience = make_resilience()
+    open_circuit(resilience)
+
+    with pytest.raises(ValueError):
+        resilience.call("test", fail_with(ValueError("bad request")))
+
+    assert resilience.breaker.state == "half_open"
+    assert resilience.call("test", lambda: "ok") == "ok"
+
+
+def test_stream_probe_answered_with_error_status_does_not_wedge_circuit():
+    resilience = make_resilience()
+    open_circuit(resilience)
+
+    with pytest.raises(ollama.ResponseError):
+        resilience.stream("test", fail_with(ollama.ResponseError("model not found", 404)))
+
+    assert list(resilience.stream("test", lambda: iter(["a", "b"]))) == ["a", "b"]
+
+
+def test_limiter_halves_on_overload_and_grows_back():
+    limiter = AdaptiveLimiter(max_limit=8)
+    limiter.acquire()
+    limiter.release("test", overloaded=True)
+    assert limiter.limit == 4.0
+
+    for _ in range(40):
+        limiter.acquire()
+        limiter.release("test", seconds=0.01)
+    assert 4.0 < limiter.limit <= 8.0
+
+
+def test_limiter_treats_slow_calls_as_overload():
+    limiter = AdaptiveLimiter(max_limit=8, latency_tolerance=2.0)
+    limiter.acquire()
+    limiter.release("test", seconds=0.0)
+    limiter.acquire()
+    limiter.release("test", seconds=1.0)
+    assert limiter.limit < 8.0
+
+
+def test_stream_dropped_unread_frees_its_slot():
+    resilience = make_resilience(max_concurrency=1)
+
+    stream = resilience.stream("test", lambda: iter(["a", "b"]))
+    assert resilience.limiter.in_flight == 1
+    del stream
+    gc.collect()
+    assert resilience.limiter.in_flight == 0
+
+    stream = resilience.stream("test", lambda: iter(["a", "b"]))
+    assert next(stream) == "a"
+    stream.close()
+    assert resilience.limiter.in_flight == 0
+
+
+def test_stream_frees_its_slot_once():
+    resilience = make_resilience(max_concurrency=2)
+
+    stream = resilience.stream("test", lambda: iter(["a", "b"]))
+    assert list(stream) == ["a", "b"]
+    stream.close()
+    del stream
+    gc.collect()
+    assert resilience.limiter.in_flight == 0
@@ -0,0 +1,101 @@
+import random
+from collections import Counter
+
+from agents.result_columns import ResultColumns
+from agents.structured_output import CATEGORIES, PRIORITIES, SENTIMENTS
+
+
+HOUR = 3600
+
+
+def make_results(count=500, seed=7):
+    rng = random.Random(seed)
+    results, timestamps = [], []
+    for _ in range(count):
+        problem = rng.choice(["Upload fails", "Dashboard is slow", "None", "API Failure", "Parsing Error"])
+        results.append({
+            "problem": problem,
+            "sentiment": rng.choice(SENTIMENTS),
+            "category": rng.choice(CATEGORIES + ["Billing"]),
+            "priority": rng.choice(PRIORITIES + [""])
+        })
+        timestamps.append(rng.choice([rng.uniform(0, 10 * HOUR), None]))
+    return results, timestamps
+
+
+def is_failed(result):
+    return result["problem"] in ("API Failure", "Parsing Error")
+
+
+def naive_counts(results, *names):
+    return Counter(
+        tuple(result[name] for name in names) for result in results
+        if not is_failed(result) and all(result[name] for name in names)
+    )
+
+
+def test_distribution_and_counts_match_naive_counts():
+    results, _ = make_results()
+    columns = ResultColumns.from_records(results)
+    kept = [result for result in results if not is_failed(result)]
+
+    for name in ("sentiment", "category", "priority"):
+        expected = Counter(result[name] for result in kept if result[name])
+        assert columns.distribution(name) == dict(expected)
+        # Labels in order of first appearance
+        assert list(columns.distribution(name)) == list(dict.fromkeys(r[name] for r in kept if r[name]))
+
+    assert columns.failed == sum(map(is_failed, results))
+    assert columns.count("priority", "High") == sum(result["priority"] == "High" for result in kept)
+    assert columns.count("priority", "Unknown") == 0
+    assert columns.problem_counts() == Counter(r["problem"] for r in kept if r["problem"] != "None")
+
+
+def test_group_by_matches_naive_counts():
+    results, _ = make_results()
+    columns = ResultColumns.from_records(results)
+
+    assert columns.group_by("sentiment", "category", "priority") == naive_counts(
+        results, "sentiment", "category", "priority"
+    )
+    assert columns.group_by("category") == naive_counts(results, "category")
+
+
+def test_window_counts_match_naive_counts():
+    results, timestamps = make_results()
+    columns = ResultColumns.from_records(results, timestamps=[
+        float("nan") if timestamp is None else timestamp for timestamp in timestamps
+    ])
+
+    timed = [
+        (float(timestamp // HOUR * HOUR), result) for result, timestamp in zip(results, timestamps)
+        if timestamp is not None and not is_failed(result)
+    ]
+
+    assert columns.window_counts(HOUR) == dict(Counter(start for start, _ in timed))
+
+    expected = {}
+    for start, result in timed:
+        if result["priority"]:
+            window = expected.setdefault(start, Counter())
+            window[result["priority"]] += 1
+    assert columns.window_counts(HOUR, "priority") == {start: dict(counts) for start, counts in expected.items()}
+
+
+def test_extend_in_chunks_matches_one_shot():
+    results, timestamps = make_results()
+    stamped = [float("nan") if timestamp is None else timestamp for timestamp in timestamps]
+
+    whole = ResultColumns.from_records(results, timestamps=stamped)
+    chunked = ResultColumns()
+    chunked.extend(results[:100])
+    chunked.extend(results[100:300], timestamps=stamped[100:300])
+    chunked.extend(results[300:], timestamps=stamped[300:])
+
+    assert chunked.aggregate() == whole.aggregate()
+    assert chunked.group_by("sentiment", "priority") == whole.group_by("sentiment", "priority")
+    # The first chunk has no timestamps, so its rows are left out of the windows
+    assert sum(chunked.window_counts(HOUR).values()) == sum(
+        1 for result, timestamp in zip(results[100:], timestamps[100:])
+        if timestamp is not None and not is_failed(result)
+    )
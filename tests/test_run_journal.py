@@ -0,0 +1,67 @@
+import pytest
+
+from agents.feedback_record import as_record
+from agents.run_journal import RunJournal, iter_journaled_chunks
+
+
+LINES = [f"Feedback line {number}" for number in range(5)]
+
+
+def classify(calls):
+    def analyze_chunk(lines):
+        calls.append(list(lines))
+        return [
+            as_record({"problem": line, "sentiment": "Negative", "category": "Bug", "priority": "High"})
+            for line in lines
+        ]
+    return analyze_chunk
+
+
+def run(journal, lines, calls):
+    return list(iter_journaled_chunks(lines, journal, classify(calls), chunk_size=2))
+
+
+def test_resume_replays_journaled_chunks(tmp_path):
+    first_calls = []
+    first = run(RunJournal("run", str(tmp_path)), LINES[:4], first_calls)
+    assert [resumed for _, _, resumed in first] == [False, False]
+    assert len(first_calls) == 2
+
+    calls = []
+    resumed = run(RunJournal("run", str(tmp_path)), LINES, calls)
+
+    # Only the chunk past the journal reaches the model
+    assert calls == [LINES[4:]]
+    assert [flag for _, _, flag in resumed] == [True, True, False]
+    assert [result.problem for results, _, _ in resumed for result in results] == LINES
+    assert resumed[0][1] == first[0][1]
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    journal = RunJournal("run", str(tmp_path))
+    run(journal, LINES[:4], [])
+    intact = open(journal.path, "rb").read()
+
+    with open(journal.path, "ab") as handle:
+        handle.write(b'{"size": 2, "input_ha')
+
+    repaired = RunJournal("run", str(tmp_path))
+    assert open(repaired.path, "rb").read() == intact
+    assert repaired.completed_items == 4
+
+    calls = []
+    run(repaired, LINES, calls)
+    assert calls == [LINES[4:]]
+    assert RunJournal("run", str(tmp_path)).completed_items == 5
+
+
+def test_different_input_is_rejected(tmp_path):
+    run(RunJournal("run", str(tmp_path)), LINES, [])
+
+    with pytest.raises(ValueError):
+        run(RunJournal("run", str(tmp_path)), ["Other feedback"] + LINES[1:], [])
+
+
+def test_run_id_must_not_be_a_path(tmp_path):
+    with pytest.raises(ValueError):
+        RunJournal("../run", str(tmp_path))
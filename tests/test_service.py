@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+from agents.fake_llm import FakeLLM, installed
+from service import MicroBatcher, ServiceDraining, create_app
+
+
+def test_concurrent_lines_share_one_batch():
+    batches = []
+
+    def analyze_batch(lines):
+        batches.append(list(lines))
+        return [line.upper() for line in lines]
+
+    async def scenario():
+        batcher = MicroBatcher(analyze_batch, max_batch_size=3, max_wait=0.05)
+        batcher.start()
+        results = await asyncio.gather(*(batcher.submit(line) for line in ["a", "b", "c", "d"]))
+        await batcher.drain()
+        return results
+
+    assert asyncio.run(scenario()) == ["A", "B", "C", "D"]
+    assert batches == [["a", "b", "c"], ["d"]]
+
+
+def test_draining_batcher_refuses_new_lines_and_finishes_queued_ones():
+    async def scenario():
+        batcher = MicroBatcher(lambda lines: list(lines), max_batch_size=10, max_wait=0.05)
+        batcher.start()
+        queued = asyncio.ensure_future(batcher.submit("queued"))
+        await asyncio.sleep(0)
+        await batcher.drain()
+        with pytest.raises(ServiceDraining):
+            await batcher.submit("late")
+        return await queued
+
+    assert asyncio.run(scenario()) == "queued"
+
+
+def test_health_reports_draining():
+    with installed(FakeLLM()):
+        app = create_app(use_cache=False, preclassify=False)
+        with TestClient(app) as client:
+            assert client.get("/health").status_code == 200
+            assert client.post("/analyze", json={"feedback": "Upload fails"}).json()["category"]
+
+            app.state.batcher.draining = True
+            assert client.get("/health").status_code == 503
+            assert client.post("/analyze", json={"feedback": "Upload fails"}).status_code == 503
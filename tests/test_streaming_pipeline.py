@@ -0,0 +1,28 @@
+from agents.instrumentation import recording
+from streaming_pipeline import iter_feedback_file
+
+
+def test_jsonl_reader_skips_and_counts_malformed_lines(tmp_path):
+    path = tmp_path / "feedback.jsonl"
+    path.write_text(
+        '{"feedback": "App crashes on upload"}\n'
+        '{"feedback": "truncated\n'
+        '\n'
+        'not json at all\n'
+        '{"feedback": ""}\n'
+        '"Please add dark mode"\n',
+        encoding="utf-8"
+    )
+
+    with recording() as report:
+        lines = list(iter_feedback_file(str(path)))
+
+    assert lines == ["App crashes on upload", "Please add dark mode"]
+    assert report.to_dict()["events"]["ingest.malformed_line"] == 2
+
+
+def test_text_reader_drops_blank_lines(tmp_path):
+    path = tmp_path / "feedback.txt"
+    path.write_text("Dashboard is slow\n\n   \nLogin fails\n", encoding="utf-8")
+
+    assert list(iter_feedback_file(str(path))) == ["Dashboard is slow", "Login fails"]
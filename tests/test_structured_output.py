@@ -0,0 +1,97 @@
+from agents.fake_llm import FakeLLM, installed
+from agents.feedback_analyzer import analyze_feedback
+from agents.instrumentation import recording
+from agents.structured_output import parse_json
+
+
+VALID_ANSWER = '{"problem": "Upload fails", "sentiment": "Negative", "category": "Bug", "priority": "High"}'
+
+
+class ScriptedLLM(FakeLLM):
+    """
+    Answers with the given contents in order, then like FakeLLM.
+    """
+
+    def __init__(self, *answers):
+        super().__init__()
+        self.answers = list(answers)
+
+    def chat(self, model=None, messages=None, stream=False, **kwargs):
+        response = super().chat(model=model, messages=messages, stream=stream, **kwargs)
+        if self.answers:
+            response["message"]["content"] = self.answers.pop(0)
+        return response
+
+
+def analyze(*answers):
+    fake = ScriptedLLM(*answers)
+    with installed(fake), recording() as report:
+        record = analyze_feedback("Upload fails for large files.")
+    return record, fake, report.to_dict()
+
+
+def test_fenced_json_is_repaired_without_a_retry():
+    record, fake, report = analyze(f"Here is the result:\n```json\n{VALID_ANSWER}\n```")
+
+    assert record.problem == "Upload fails"
+    assert record.priority == "High"
+    assert fake.calls == 1
+    assert report["events"] == {"agent1.json_repair": 1}
+    assert report["durations"]["agent1.repair_seconds"] >= 0.0
+
+
+def test_trailing_commas_and_bare_words_are_repaired():
+    record, fake, report = analyze(
+        '{"problem": "Upload fails", "sentiment": Negative, "category": Bug, "priority": High,}'
+    )
+
+    assert (record.sentiment, record.category, record.priority) == ("Negative", "Bug", "High")
+    assert fake.calls == 1
+    assert report["events"] == {"agent1.json_repair": 1}
+
+
+def test_truncated_object_keeps_its_complete_fields():
+    record, fake, report = analyze(VALID_ANSWER[:-1])
+
+    assert record.priority == "High"
+    assert fake.calls == 1
+    assert report["events"] == {"agent1.json_repair": 1}
+
+
+def test_answer_cut_off_mid_field_is_retried_once():
+    record, fake, report = analyze(VALID_ANSWER[:VALID_ANSWER.index('"priority"') + 14], VALID_ANSWER)
+
+    assert record.priority == "High"
+    assert not record.failed
+    assert fake.calls == 2
+    assert report["events"] == {"agent1.json_repair": 1, "agent1.parse_retry": 1}
+
+
+def test_unusable_answers_fall_back_to_a_parsing_error():
+    record, fake, report = analyze("Sorry, I cannot help with that.", "Still no JSON.")
+
+    assert record.failed
+    assert record.problem == "Parsing Error"
+    assert fake.calls == 2
+    assert report["events"] == {
+        "agent1.parse_failure": 2,
+        "agent1.parse_retry": 1,
+        "agent1.parse_fallback": 1
+    }
+    assert report["llm_calls"]["agent1"]["parse_failure_rate"] == 1.0
+    assert report["durations"]["agent1.repair_seconds"] >= 0.0
+
+
+def test_parse_json_repairs_arrays():
+    with recording() as report:
+        parsed = parse_json("agent1_batch", '[{"index": 0, "problem": "Login slow",}, {"index": 1, "prob', list)
+
+    assert parsed == [{"index": 0, "problem": "Login slow"}, {"index": 1}]
+    assert report.to_dict()["events"] == {"agent1_batch.json_repair": 1}
+
+
+def test_wrong_type_is_a_parse_failure():
+    with recording() as report:
+        assert parse_json("agent2", "[1, 2, 3]", dict) is None
+
+    assert report.to_dict()["events"] == {"agent2.parse_failure": 1}
@@ -0,0 +1,45 @@
+from collections import Counter
+
+from agents.fake_llm import FakeLLM, installed
+from agents.theme_clustering import OTHER_THEME, cluster_problems, cluster_themes
+
+
+PROBLEMS = [
+    "Upload fails for large PDF files",
+    "Upload fails for large image files",
+    "Dashboard takes too long to load",
+    "Dashboard takes too long to open",
+    "Login session expires too quickly",
+    "Export to Excel is missing"
+]
+
+
+def test_similar_problems_share_a_cluster():
+    clusters = cluster_problems(PROBLEMS, embed_model=None)
+    cluster_of = {text: index for index, cluster in enumerate(clusters) for text in cluster}
+
+    assert cluster_of[PROBLEMS[0]] == cluster_of[PROBLEMS[1]]
+    assert cluster_of[PROBLEMS[2]] == cluster_of[PROBLEMS[3]]
+    assert cluster_of[PROBLEMS[0]] != cluster_of[PROBLEMS[2]]
+    assert sum(sum(cluster.values()) for cluster in clusters) == len(PROBLEMS)
+
+
+def test_only_the_largest_clusters_are_named():
+    with installed(FakeLLM()) as fake:
+        themes = cluster_themes(Counter(PROBLEMS), embed_model=None, max_named=2)
+
+    assert fake.calls == 2
+    assert themes[-1]["theme"] == OTHER_THEME
+    assert len(themes) == 3
+    assert sum(theme["problem_count"] for theme in themes) == len(PROBLEMS)
+
+
+def test_related_problems_are_capped(monkeypatch):
+    monkeypatch.setattr("agents.theme_clustering.MAX_RELATED_PROBLEMS", 3)
+    problems = Counter({f"Upload fails for file type {number}": number + 1 for number in range(10)})
+
+    with installed(FakeLLM()):
+        themes = cluster_themes(problems, embed_model=None)
+
+    assert all(len(theme["related_problems"]) <= 3 for theme in themes)
+    assert sum(theme["problem_count"] for theme in themes) == sum(problems.values())
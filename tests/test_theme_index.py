@@ -0,0 +1,36 @@
+from agents.fake_llm import FakeLLM, installed
+from agents.theme_index import ThemeIndex
+
+
+PROBLEMS = ["Upload fails for large files", "Upload fails on PDF files", "Dashboard loads slowly"]
+
+
+def test_known_problems_join_their_theme(tmp_path):
+    path = str(tmp_path / "index.npz")
+
+    with installed(FakeLLM()):
+        first = ThemeIndex(path, embed_model=None).update(PROBLEMS)
+        index = ThemeIndex(path, embed_model=None)
+        themes_before = len(index)
+        second = index.update(["Upload fails for large files"])
+
+    assert sum(theme["problem_count"] for theme in first) == 3
+    assert len(index) == themes_before
+    assert second[0]["theme"] in {theme["theme"] for theme in first}
+
+
+def test_embedder_mismatch_clusters_without_the_index(tmp_path):
+    path = str(tmp_path / "index.npz")
+
+    with installed(FakeLLM()):
+        ThemeIndex(path, embed_model=None).update(PROBLEMS)
+
+        # This run embeds with hashed vectors; pretend the index came from a model
+        index = ThemeIndex(path, embed_model=None)
+        index.embedder = "nomic-embed-text"
+        counts_before = index.counts.copy()
+        themes = index.update(PROBLEMS + ["Login session expires"])
+
+    assert sum(theme["problem_count"] for theme in themes) == 4
+    assert (index.counts == counts_before).all()
+    assert index.embedder == "nomic-embed-text"
@@ -0,0 +1,106 @@
+from agents.trend_store import DEFAULT_TREND_PATH, TrendStore, record_trends
+
+
+HOUR = 3600
+SERIES = "theme:Upload Issues"
+
+
+def store_with_history(tmp_path, counts, baseline_windows=7):
+    store = TrendStore(str(tmp_path / "trends.sqlite"), granularity="hour", baseline_windows=baseline_windows)
+    for window, count in enumerate(counts):
+        store.add({SERIES: count}, window * HOUR)
+    return store
+
+
+def test_spike_over_baseline_is_flagged(tmp_path):
+    store = store_with_history(tmp_path, [2, 2, 2, 2, 2])
+    store.add({SERIES: 12}, 5 * HOUR)
+
+    [spike] = store.spikes(5 * HOUR)
+    assert spike["series"] == SERIES
+    assert spike["count"] == 12
+    assert spike["baseline"] == 2.0
+    assert spike["ratio"] == 6.0
+    assert spike["z_score"] >= 3.0
+    assert store.flags(5 * HOUR) == ["Upload Issues up 6.0× vs 7-hour baseline (12 vs 2.0 per hour)"]
+    store.close()
+
+
+def test_counts_below_the_thresholds_are_not_flagged(tmp_path):
+    store = store_with_history(tmp_path, [4, 4, 4, 4, 4])
+    store.add({SERIES: 7, "theme:Login Issues": 4}, 5 * HOUR)
+
+    # 1.75× the baseline, and a new series under min_count
+    assert store.spikes(5 * HOUR) == []
+    assert store.spikes(5 * HOUR, ratio=1.5, z_score=0.0)[0]["series"] == SERIES
+    store.close()
+
+
+def test_no_flags_without_enough_history(tmp_path):
+    store = store_with_history(tmp_path, [1, 1])
+    store.add({SERIES: 20}, 2 * HOUR)
+
+    assert store.spikes(2 * HOUR) == []
+    assert store.spikes(2 * HOUR, min_history=2)[0]["ratio"] == 20.0
+    store.close()
+
+
+def test_new_series_has_no_ratio(tmp_path):
+    store = store_with_history(tmp_path, [3, 3, 3])
+    store.add({"category:Security": 6}, 3 * HOUR)
+
+    [spike] = store.spikes(3 * HOUR)
+    assert spike["ratio"] is None
+    assert store.flags(3 * HOUR) == ["Security category new this hour (6, none in 7-hour baseline)"]
+    store.close()
+
+
+def test_baseline_is_the_mean_of_the_rolling_windows(tmp_path):
+    counts = [9, 1, 2, 3, 0, 6]
+    store = store_with_history(tmp_path, counts, baseline_windows=3)
+    store.add({SERIES: 50}, len(counts) * HOUR)
+
+    [spike] = store.spikes(len(counts) * HOUR)
+    assert spike["baseline"] == round(sum(counts[-3:]) / 3, 2)
+    store.close()
+
+
+def test_empty_windows_count_as_zero(tmp_path):
+    store = store_with_history(tmp_path, [4])
+    store.add({SERIES: 4}, 3 * HOUR)
+    store.add({SERIES: 4}, 4 * HOUR)
+
+    # Windows 1 and 2 had no data: the baseline is (4 + 0 + 0 + 4) / 4
+    [spike] = store.spikes(4 * HOUR, ratio=1.0, z_score=0.0, min_count=1)
+    assert spike["baseline"] == 2.0
+    assert store.history(SERIES) == [(4 * HOUR, 4), (3 * HOUR, 4), (0, 4)]
+    store.close()
+
+
+def test_counts_of_a_repeated_run_replace_its_earlier_counts(tmp_path):
+    store = store_with_history(tmp_path, [2, 2, 2, 2, 2])
+    store.add({SERIES: 3, "category:Bug": 4}, 5 * HOUR, run_id="nightly")
+    store.add({SERIES: 3, "category:Bug": 4}, 5 * HOUR + 60, run_id="nightly")
+    store.add({SERIES: 5}, 5 * HOUR + 120, run_id="nightly")
+    store.add({SERIES: 1}, 5 * HOUR + 180, run_id="other")
+
+    assert store.history(SERIES, limit=1) == [(5 * HOUR, 6)]
+    assert store.history("category:Bug") == []
+    assert [spike["count"] for spike in store.spikes(5 * HOUR)] == [6]
+    store.close()
+
+
+def test_record_trends_is_idempotent_per_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pattern_output = {
+        "category_distribution": {"Bug": 6},
+        "detected_themes": [{"theme": "Upload Issues", "problem_count": 6}]
+    }
+
+    for _ in range(3):
+        record_trends(pattern_output, "hour", timestamp=HOUR, run_id="run-1")
+
+    store = TrendStore(DEFAULT_TREND_PATH, granularity="hour")
+    assert store.history("category:Bug") == [(HOUR, 6)]
+    assert store.history(SERIES) == [(HOUR, 6)]
+    store.close()